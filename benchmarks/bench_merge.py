@@ -0,0 +1,120 @@
+"""
+So sánh các bộ máy ghép PDF (tools/merge_backends.py).
+
+Tạo một bộ file giả lập (mặc định 500 file, mỗi file vài trang có ảnh scan
+giả), rồi ghép bằng từng backend trong một tiến trình con riêng để đo thời
+gian và bộ nhớ đỉnh (peak RSS) một cách độc lập.
+
+Cách chạy (từ thư mục gốc của repo):
+    python benchmarks/bench_merge.py [--files 500] [--pages 3] [--keep]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.merge_backends import BACKENDS, MERGE_CHUNK_PAGES, create_backend  # noqa: E402
+
+
+def make_corpus(folder, files, pages, seed=0):
+    """Mỗi trang có một dòng chữ và một ảnh xám nhiễu 600x800 (giống trang scan)."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(files):
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 60), f"File {i + 1} - trang {p + 1}")
+            noise = rng.integers(200, 256, (800, 600), dtype=np.uint8)
+            pix = fitz.Pixmap(fitz.csGRAY, 600, 800, noise.tobytes(), False)
+            page.insert_image(fitz.Rect(36, 80, 576, 800), pixmap=pix)
+        path = os.path.join(folder, f"{i + 1:04}.pdf")
+        doc.save(path, deflate=True)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_merge(backend_name, list_file, out_path):
+    """Ghép giống MergeWorker (lát MERGE_CHUNK_PAGES trang, đóng nguồn sau khi chép)."""
+    with open(list_file, encoding="utf-8") as f:
+        paths = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    backend = create_backend(backend_name)
+    try:
+        counts = [(path, backend.page_count(path)) for path in paths]
+        for path, page_count in counts:
+            src = backend.open_source(path)
+            try:
+                for first in range(0, page_count, MERGE_CHUNK_PAGES):
+                    end = min(first + MERGE_CHUNK_PAGES, page_count)
+                    backend.append(src, first, end, final=(end == page_count))
+            finally:
+                backend.close_source(src)
+        backend.save(out_path)
+    finally:
+        backend.close()
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.3f} {peak_rss_mb():.1f} {os.path.getsize(out_path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--keep", action="store_true", help="giữ lại thư mục dữ liệu giả lập")
+    parser.add_argument("--child", nargs=3, metavar=("BACKEND", "LIST", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_merge(*args.child)
+        return
+
+    folder = tempfile.mkdtemp(prefix="bench_merge_")
+    try:
+        print(f"Tạo {args.files} file x {args.pages} trang trong {folder} ...")
+        paths = make_corpus(folder, args.files, args.pages)
+        list_file = os.path.join(folder, "inputs.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(paths))
+
+        print(f"{'Backend':<10} {'Thời gian (s)':>14} {'Peak RSS (MB)':>14} {'Kích thước (MB)':>16}")
+        for name in args.backends:
+            out_path = os.path.join(folder, f"merged_{name}.pdf")
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", name, list_file, out_path],
+                capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{name:<10} lỗi: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            elapsed, rss, size = result.stdout.split()[-3:]
+            print(f"{name:<10} {float(elapsed):>14.2f} {float(rss):>14.1f} {int(size) / 1048576:>16.1f}")
+    finally:
+        if args.keep:
+            print(f"Giữ lại dữ liệu tại {folder}")
+        else:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
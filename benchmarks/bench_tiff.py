@@ -0,0 +1,128 @@
+"""
+Đo thời gian và bộ nhớ cấp phát khi ghi một trang PDF ra TIFF (tools/tiff_engine.py).
+
+So sánh hai cách dựng ảnh PIL từ pixmap 300 dpi:
+- ppm:        pix.tobytes("ppm") -> BytesIO -> Image.open (cách cũ)
+- frombytes:  Image.frombytes trên pix.samples_mv (cách hiện tại)
+
+Mỗi cách chạy trong một tiến trình con riêng. Với từng trang đo thời gian
+(render + dựng ảnh + ghi TIFF) và đỉnh cấp phát qua Python (tracemalloc);
+cuối cùng là peak RSS của tiến trình.
+
+Cách chạy (từ thư mục gốc của repo):
+    python benchmarks/bench_tiff.py [--pages 20] [--dpi 300] [--keep]
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.tiff_engine import pixmap_to_image  # noqa: E402
+
+
+def image_via_ppm(pix):
+    return Image.open(io.BytesIO(pix.tobytes("ppm")))
+
+
+METHODS = {
+    "ppm": image_via_ppm,
+    "frombytes": pixmap_to_image,
+}
+
+
+def make_document(path, pages, seed=0):
+    """Trang A4 có chữ và một ảnh màu nhiễu (giống trang scan màu)."""
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"Trang {p + 1}", fontsize=24)
+        noise = rng.integers(180, 256, (1000, 700, 3), dtype=np.uint8)
+        pix = fitz.Pixmap(fitz.csRGB, 700, 1000, noise.tobytes(), False)
+        page.insert_image(fitz.Rect(36, 80, 559, 800), pixmap=pix)
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_method(method, pdf_path, out_dir, dpi):
+    """In: thời gian TB/trang (s), thời gian trung vị (s), đỉnh cấp phát một trang (MB), peak RSS (MB)."""
+    to_image = METHODS[method]
+    times, peaks = [], []
+    with fitz.open(pdf_path) as doc:
+        for pno in range(doc.page_count):
+            tracemalloc.start()
+            start = time.perf_counter()
+            pix = doc[pno].get_pixmap(dpi=dpi)
+            to_image(pix).save(os.path.join(out_dir, f"{method}_{pno + 1:03d}.tiff"), format="TIFF")
+            times.append(time.perf_counter() - start)
+            # tracemalloc chỉ thấy vùng nhớ cấp qua Python (bytes PPM, BytesIO...),
+            # bộ đệm của MuPDF/PIL nằm ngoài nên được phản ánh qua peak RSS.
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            del pix
+    mb = 1048576
+    print(f"{statistics.mean(times):.4f} {statistics.median(times):.4f} {max(peaks) / mb:.2f} {peak_rss_mb():.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--methods", nargs="+", default=list(METHODS))
+    parser.add_argument("--keep", action="store_true", help="giữ lại thư mục dữ liệu giả lập")
+    parser.add_argument("--child", nargs=4, metavar=("METHOD", "PDF", "OUT", "DPI"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        method, pdf_path, out_dir, dpi = args.child
+        run_method(method, pdf_path, out_dir, int(dpi))
+        return
+
+    folder = tempfile.mkdtemp(prefix="bench_tiff_")
+    try:
+        pdf_path = os.path.join(folder, "input.pdf")
+        print(f"Tạo file {args.pages} trang A4 trong {folder} ...")
+        make_document(pdf_path, args.pages)
+
+        print(f"{'Cách':<11} {'TB/trang (s)':>13} {'Trung vị (s)':>13} {'Đỉnh cấp phát (MB)':>19} {'Peak RSS (MB)':>14}")
+        for method in args.methods:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", method, pdf_path, folder, str(args.dpi)],
+                capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{method:<11} lỗi: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            mean, median, peak, rss = (float(v) for v in result.stdout.split()[-4:])
+            print(f"{method:<11} {mean:>13.4f} {median:>13.4f} {peak:>19.2f} {rss:>14.1f}")
+    finally:
+        if args.keep:
+            print(f"Giữ lại dữ liệu tại {folder}")
+        else:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from tools.TKT_DashBoard import MainWindow
 
@@ -15,4 +16,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
+    # Cần cho các tiến trình con (tách PDF song song) khi đóng gói bằng PyInstaller
+    multiprocessing.freeze_support()
     main()
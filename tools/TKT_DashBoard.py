@@ -12,7 +12,9 @@ from tools.counter_files import Counter_File
 from tools.counter_pdf import PDFCounter
 from tools.pdf_resizer import PDFResizer
 from tools.pdf_split import PDFSplitterApp
+from tools.pdf_batch_split import PDFBatchSplitApp
 from tools.pdf_merger import PDFMergerTool
+from tools.pdf_batch_merge import PDFBatchMergeApp
 from tools.pdf_to_tiff import PDFtoTIFFApp
 from responsive_helper import ResponsiveHelper
 
@@ -91,7 +93,9 @@ class MainWindow(QMainWindow):
             ("Đếm Trang PDF", PDFCounter, asset_path("icon", "document.png")),
             ("Resize PDF", PDFResizer, asset_path("icon", "edition.png")),
             ("Tách PDF", PDFSplitterApp, asset_path("icon", "split.png")),
+            ("Tách PDF hàng loạt", PDFBatchSplitApp, asset_path("icon", "split.png")),
             ("Gộp PDF", PDFMergerTool, asset_path("icon", "merge.png")),
+            ("Gộp PDF theo thư mục", PDFBatchMergeApp, asset_path("icon", "merge.png")),
             ("PDF → TIFF", PDFtoTIFFApp, asset_path("icon", "convert.png")),
         ]
 
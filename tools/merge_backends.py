@@ -0,0 +1,304 @@
+"""
+Các bộ máy ghép PDF dùng cho PDFMergerTool.
+
+Mọi backend có cùng giao diện để MergeWorker không cần biết thư viện bên dưới:
+    page_count(path)            -> số trang (ném lỗi nếu file hỏng)
+    open_source(path)           -> nguồn đã mở
+    append(src, start, end, final)
+                                -> chép trang [start, end) của nguồn vào đầu ra; final=True ở
+                                   lần chép cuối cùng của nguồn đó (các khoảng trang được
+                                   chọn có thể không liền nhau, không theo thứ tự)
+    close_source(src)           -> đóng nguồn ngay khi chép xong
+    mark() / rollback(mark)     -> ghi nhớ trạng thái đầu ra trước một nguồn và bỏ mọi trang,
+                                   mục lục đã thêm sau đó (khi nguồn lỗi giữa chừng)
+    save(path)                  -> ghi file kết quả
+    close()
+
+Tuỳ chọn lưu SAVE_COMPACT bật bước thu gọn: garbage=4 của MuPDF so nội dung
+để gộp các đối tượng/stream giống hệt nhau (font, ICC profile, ảnh lặp lại
+giữa các file cùng máy scan), bỏ đối tượng không dùng và nén lại stream.
+
+- PyMuPDFBackend: chép trực tiếp bằng insert_pdf (mã C), mỗi file nguồn được
+  đóng ngay sau khi chép nên bộ nhớ không tăng theo số file.
+- PyPDF2Backend: thuần Python, giữ lại làm phương án dự phòng.
+- IncrementalAppendBackend: ghép nối vào một file PDF có sẵn bằng cập nhật
+  tăng dần (incremental update) - chỉ ghi thêm đối tượng mới và một bảng xref
+  mới vào cuối file, không ghi lại phần đã có. Sau nhiều lần ghép nối nên thu
+  gọn lại bằng compact_file (ghi lại toàn bộ).
+"""
+import os
+import re
+import time
+
+import fitz
+from PyPDF2 import PdfMerger, PdfReader
+
+DEFAULT_BACKEND = "pymupdf"
+
+# Tuỳ chọn khi lưu file ghép (tham số của fitz.Document.save)
+SAVE_PLAIN = {"garbage": 1, "deflate": False}
+SAVE_COMPACT = {"garbage": 4, "deflate": True, "deflate_images": True, "deflate_fonts": True}
+
+# Số trang mỗi lần append: đủ nhỏ để tiến trình mượt và lệnh hủy có hiệu lực nhanh
+MERGE_CHUNK_PAGES = 20
+
+
+class PyMuPDFBackend:
+    name = "pymupdf"
+    label = "PyMuPDF (nhanh)"
+
+    def __init__(self):
+        self.out = fitz.open()
+        self.toc = []
+        self._page_maps = {}  # id nguồn -> {trang nguồn: vị trí trong file kết quả}
+
+    def page_count(self, path):
+        with fitz.open(path) as doc:
+            if doc.needs_pass and not doc.authenticate(""):
+                raise ValueError("File được đặt mật khẩu")
+            return doc.page_count
+
+    def open_source(self, path):
+        doc = fitz.open(path)
+        if doc.needs_pass:
+            doc.authenticate("")
+        self._page_maps[id(doc)] = {}
+        return doc
+
+    def append(self, src, start, end, final=True):
+        # final=False giữ bảng ánh xạ đối tượng giữa các lát của cùng một nguồn,
+        # nên font/ảnh dùng chung chỉ được chép một lần.
+        page_map = self._page_maps[id(src)]
+        base = self.out.page_count
+        self.out.insert_pdf(src, from_page=start, to_page=end - 1, final=final)
+        for i, page in enumerate(range(start, end)):
+            page_map.setdefault(page, base + i)
+
+    def close_source(self, src):
+        page_map = self._page_maps.pop(id(src), None)
+        if page_map:
+            self.toc.extend(remap_toc(src.get_toc(simple=True), page_map))
+        src.close()
+
+    def mark(self):
+        return self.out.page_count, len(self.toc)
+
+    def rollback(self, mark):
+        page_count, toc_length = mark
+        if self.out.page_count > page_count:
+            self.out.delete_pages(from_page=page_count, to_page=self.out.page_count - 1)
+        del self.toc[toc_length:]
+
+    def save(self, path, options=SAVE_PLAIN):
+        if self.toc:
+            try:
+                self.out.set_toc(self.toc)
+            except ValueError:
+                pass  # mục lục nguồn sai cấu trúc: bỏ mục lục, vẫn ghi trang
+        self.out.save(path, **options)
+
+    def close(self):
+        """Đóng file kết quả; gọi nhiều lần được."""
+        if not self.out.is_closed:
+            self.out.close()
+
+
+class PyPDF2Backend:
+    name = "pypdf2"
+    label = "PyPDF2"
+
+    def __init__(self):
+        self.merger = PdfMerger()
+        self._readers = {}
+
+    def page_count(self, path):
+        reader = self._open_reader(path)
+        return len(reader.pages)
+
+    def _open_reader(self, path):
+        reader = self._readers.get(path)
+        if reader is None:
+            reader = PdfReader(path)
+            if reader.is_encrypted:
+                reader.decrypt("")
+            self._readers[path] = reader
+        return reader
+
+    def open_source(self, path):
+        return self._open_reader(path)
+
+    def append(self, src, start, end, final=True):
+        # Mỗi lát tự lấy các mục lục trỏ vào trang của nó
+        self.merger.append(src, pages=(start, end))
+
+    def close_source(self, src):
+        # PdfMerger còn đọc nguồn tới lúc write, không đóng sớm được
+        pass
+
+    def mark(self):
+        merger = self.merger
+        return len(merger.pages), len(merger.outline), len(merger.named_dests), merger.id_count
+
+    def rollback(self, mark):
+        pages, outline, named_dests, id_count = mark
+        del self.merger.pages[pages:]
+        del self.merger.outline[outline:]
+        del self.merger.named_dests[named_dests:]
+        # mục lục trỏ trang theo id_count, phải đánh số lại từ chỗ cũ
+        self.merger.id_count = id_count
+
+    def save(self, path, options=SAVE_PLAIN):
+        self.merger.write(path)
+        if options.get("garbage", 0) >= 3 or options.get("deflate"):
+            # PyPDF2 không tự gộp đối tượng trùng hay nén lại được: thu gọn bằng MuPDF sau khi ghi
+            compact_file(path, options)
+
+    def close(self):
+        self.merger.close()
+        self._readers.clear()
+
+
+class IncrementalAppendBackend(PyMuPDFBackend):
+    name = "pymupdf-incremental"
+    label = "PyMuPDF (ghép nối)"
+
+    def __init__(self, target_path):
+        self.target_path = target_path
+        self.original_size = os.path.getsize(target_path)
+        self.out = fitz.open(target_path)
+        if self.out.needs_pass and not self.out.authenticate(""):
+            self.out.close()
+            raise ValueError("File đích được đặt mật khẩu")
+        self.original_pages = self.out.page_count
+        self.toc = self.out.get_toc(simple=True)
+        self._toc_base = len(self.toc)
+        self._page_maps = {}
+
+    def can_save_incrementally(self):
+        # File phải sửa lỗi khi mở (xref hỏng...) thì không cập nhật tăng dần được
+        return self.out.can_save_incrementally()
+
+    def save_incremental(self):
+        """Ghi phần thêm vào cuối file đích. Lỗi giữa chừng thì cắt file về kích thước cũ."""
+        if len(self.toc) > self._toc_base:
+            try:
+                self.out.set_toc(self.toc)
+            except ValueError:
+                pass
+        try:
+            self.out.save(self.target_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        except Exception:
+            self.out.close()
+            with open(self.target_path, "r+b") as f:
+                f.truncate(self.original_size)
+            raise
+
+
+def remap_toc(toc, page_map):
+    """
+    Chuyển mục lục của nguồn sang file kết quả theo page_map (trang nguồn -> vị trí mới, từ 0).
+    Mục trỏ tới trang không được chép bị bỏ; cấp được hạ lại để không nhảy cóc.
+    """
+    result = []
+    prev_level = 0
+    for level, title, page in toc:
+        if page - 1 not in page_map:
+            continue
+        level = min(level, prev_level + 1)
+        result.append([level, title, page_map[page - 1] + 1])
+        prev_level = level
+    return result
+
+
+def compact_file(path, options=SAVE_COMPACT):
+    """Ghi lại path với tuỳ chọn thu gọn (qua file tạm rồi đổi tên)."""
+    tmp_path = path + ".compact"
+    try:
+        with fitz.open(path) as doc:
+            doc.save(tmp_path, **options)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+BACKENDS = {backend.name: backend for backend in (PyMuPDFBackend, PyPDF2Backend)}
+
+
+def create_backend(name=DEFAULT_BACKEND):
+    return BACKENDS.get(name, BACKENDS[DEFAULT_BACKEND])()
+
+
+def natural_key(name):
+    """Khóa sắp xếp tự nhiên: 'trang 2' đứng trước 'trang 10'."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def find_leaf_folders(root):
+    """
+    Các thư mục lá (không có thư mục con) chứa PDF, kèm danh sách PDF đã sắp xếp tự nhiên.
+    Trả về [(thư mục, [đường dẫn pdf])].
+    """
+    leaves = []
+    for folder, dirs, files in os.walk(root):
+        dirs.sort(key=natural_key)
+        if dirs:
+            continue
+        pdfs = sorted((f for f in files if f.lower().endswith(".pdf")), key=natural_key)
+        if pdfs:
+            leaves.append((folder, [os.path.join(folder, f) for f in pdfs]))
+    return leaves
+
+
+def folder_output_path(folder):
+    """File kết quả đặt cạnh thư mục và mang tên thư mục: <cha>/<tên thư mục>.pdf"""
+    folder = os.path.normpath(folder)
+    return os.path.join(os.path.dirname(folder), os.path.basename(folder) + ".pdf")
+
+
+def is_up_to_date(out_path, inputs):
+    """File kết quả đã có và mới hơn mọi file đầu vào."""
+    if not os.path.exists(out_path):
+        return False
+    out_mtime = os.path.getmtime(out_path)
+    return all(os.path.getmtime(path) < out_mtime for path in inputs)
+
+
+def merge_folder(folder, inputs, out_path, compact=False, backend=DEFAULT_BACKEND):
+    """
+    Ghép các file inputs (đã sắp xếp) thành out_path. Chạy được trong tiến trình con;
+    file lỗi được bỏ qua và ghi vào kết quả, lỗi chung được trả về thay vì ném ra.
+    Trả về dict: folder, out_path, files, pages, seconds, failures, error.
+    """
+    start = time.time()
+    result = {"folder": folder, "out_path": out_path, "files": 0, "pages": 0,
+              "seconds": 0.0, "failures": [], "error": ""}
+    merger = create_backend(backend)
+    tmp_path = out_path + ".part"
+    try:
+        for path in inputs:
+            mark = merger.mark()
+            try:
+                page_count = merger.page_count(path)
+                src = merger.open_source(path)
+                try:
+                    merger.append(src, 0, page_count)
+                finally:
+                    merger.close_source(src)
+                result["files"] += 1
+                result["pages"] += page_count
+            except Exception as e:
+                merger.rollback(mark)
+                result["failures"].append((path, str(e)))
+        if not result["files"]:
+            raise ValueError("Không có file nào đọc được")
+        merger.save(tmp_path, SAVE_COMPACT if compact else SAVE_PLAIN)
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        merger.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result["seconds"] = time.time() - start
+    return result
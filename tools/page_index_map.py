@@ -0,0 +1,105 @@
+"""
+Ánh xạ giữa chỉ số hiển thị và số trang gốc khi xóa trang trong PDFSplitterApp.
+
+Tài liệu gốc không bị sửa; các trang bị xóa chỉ được đánh dấu trên bitmap.
+Cây Fenwick trên bitmap đó cho phép đổi qua lại giữa hai cách đánh số
+trong O(log n), thay vì phải dựng lại danh sách sau mỗi lần xóa. Giao diện
+dùng nó để hiện vị trí trang trong tài liệu sau khi xóa (tiêu đề xem trước,
+chú thích thumbnail) và để chuyển trang trước/sau bỏ qua trang đã xóa.
+"""
+from itertools import compress
+
+
+class PageIndexMap:
+    """
+    Bitmap các trang còn giữ kèm cây Fenwick đếm số trang còn giữ.
+    - display_to_original: tìm trang còn giữ thứ k bằng nâng bậc nhị phân
+    - original_to_display: tổng tiền tố trước trang gốc
+    Xóa/phục hồi một trang chỉ đổi một bit và cập nhật O(log n) nút.
+    """
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.kept = bytearray(b"\x01") * page_count
+        self.count = page_count
+
+        # Dựng cây trong O(n): mỗi nút cộng dồn lên nút cha
+        self.tree = [0] * (page_count + 1)
+        for i in range(1, page_count + 1):
+            self.tree[i] += 1
+            parent = i + (i & -i)
+            if parent <= page_count:
+                self.tree[parent] += self.tree[i]
+
+        self._top_bit = 1
+        while self._top_bit * 2 <= page_count:
+            self._top_bit *= 2
+
+    def __len__(self):
+        return self.count
+
+    def _add(self, original, delta):
+        i = original + 1
+        while i <= self.page_count:
+            self.tree[i] += delta
+            i += i & -i
+
+    def is_kept(self, original):
+        return bool(self.kept[original])
+
+    def delete(self, original):
+        """Đánh dấu xóa trang gốc. Trả về False nếu trang đã bị xóa trước đó."""
+        if not self.kept[original]:
+            return False
+        self.kept[original] = 0
+        self.count -= 1
+        self._add(original, -1)
+        return True
+
+    def restore(self, original):
+        """Phục hồi trang gốc đã xóa. Trả về False nếu trang chưa bị xóa."""
+        if self.kept[original]:
+            return False
+        self.kept[original] = 1
+        self.count += 1
+        self._add(original, 1)
+        return True
+
+    def original_to_display(self, original):
+        """Số trang còn giữ đứng trước trang gốc (chính là chỉ số hiển thị nếu trang còn giữ)."""
+        total = 0
+        i = original
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def display_to_original(self, display):
+        """Trang gốc của trang còn giữ thứ display (tính từ 0)."""
+        if not 0 <= display < self.count:
+            raise IndexError(f"Chỉ số hiển thị {display} nằm ngoài 0..{self.count - 1}")
+        pos = 0
+        remaining = display + 1
+        step = self._top_bit
+        while step:
+            nxt = pos + step
+            if nxt <= self.page_count and self.tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self.tree[nxt]
+            step //= 2
+        return pos
+
+    def next_kept(self, original):
+        """Trang còn giữ đầu tiên có số gốc >= original, hoặc None nếu không còn."""
+        if original >= self.page_count:
+            return None
+        rank = self.original_to_display(original)
+        if rank >= self.count:
+            return None
+        return self.display_to_original(rank)
+
+    def kept_pages(self, start=0, end=None):
+        """Danh sách số trang gốc còn giữ trong [start, end], theo thứ tự tăng dần."""
+        if end is None:
+            end = self.page_count - 1
+        return list(compress(range(start, end + 1), self.kept[start:end + 1]))
@@ -0,0 +1,280 @@
+"""
+Khung xem trước một trang PDF ở độ phân giải cao, phóng to/thu nhỏ được.
+
+Không render cả trang ở mức zoom lớn (trang A0 sẽ tốn hàng trăm MB):
+- Trước hết vẽ một ảnh nền độ phân giải thấp của cả trang (hiện ngay).
+- Sau đó chỉ vùng đang nhìn thấy được render thành các ô TILE_SIZE px bằng
+  clip của fitz, lần lượt trong QTimer, ô gần tâm khung nhìn trước.
+- Các ô được giữ trong bộ nhớ đệm LRU giới hạn theo dung lượng, nên cuộn lại
+  hoặc quay về mức zoom cũ không phải render lại.
+"""
+import math
+import time
+from collections import OrderedDict
+
+import fitz
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QScrollArea
+from PyQt5.QtGui import QImage, QPainter, QColor
+from PyQt5.QtCore import Qt, QTimer, QRect, QRectF, pyqtSignal
+
+TILE_SIZE = 512                      # cạnh một ô (px)
+BASE_SIZE = 800                      # cạnh dài của ảnh nền độ phân giải thấp (px)
+CACHE_BYTES = 256 * 1024 * 1024      # dung lượng tối đa của bộ nhớ đệm ô
+MIN_ZOOM, MAX_ZOOM = 0.1, 8.0        # 1.0 = 72 dpi
+ZOOM_STEP = 2 ** 0.25                # mức zoom được lượng tử hoá để dùng lại ô đã đệm
+
+
+def pixmap_to_qimage(pix):
+    # copy() vì QImage không giữ tham chiếu tới bộ nhớ của pixmap
+    return QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+
+
+class TileCache:
+    """Bộ nhớ đệm LRU các QImage, giới hạn theo tổng số byte."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, key):
+        image = self.items.get(key)
+        if image is not None:
+            self.items.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old.byteCount()
+        self.items[key] = image
+        self.total_bytes += image.byteCount()
+        while self.total_bytes > self.max_bytes and len(self.items) > 1:
+            _, evicted = self.items.popitem(last=False)
+            self.total_bytes -= evicted.byteCount()
+
+    def clear(self):
+        self.items.clear()
+        self.total_bytes = 0
+
+
+class PreviewCanvas(QWidget):
+    """Vùng vẽ của trang ở mức zoom hiện tại; chỉ vẽ các ô đang lộ ra."""
+
+    def __init__(self, preview):
+        super().__init__()
+        self.preview = preview
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), QColor("white"))
+        self.preview.paint_page(painter, event.rect())
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            steps = event.angleDelta().y() / 120
+            self.preview.zoom_by(ZOOM_STEP ** steps, event.pos())
+            event.accept()
+        else:
+            super().wheelEvent(event)
+
+
+class PagePreview(QWidget):
+    step_requested = pyqtSignal(int)  # -1/+1: trang trước/sau (nơi dùng quyết định trang nào)
+
+    def __init__(self):
+        super().__init__()
+        self.doc = None
+        self.page_num = None
+        self.page_rect = None
+        self.zoom = 1.0
+        self.cache = TileCache()
+        self.tile_queue = []
+        self.tile_timer = QTimer(self)
+        self.tile_timer.timeout.connect(self._render_queued_tiles)
+
+        self.title_label = QLabel("Xem trước")
+        self.zoom_label = QLabel()
+        zoom_out_btn = QPushButton("－")
+        zoom_out_btn.setFixedWidth(30)
+        zoom_out_btn.setToolTip("Thu nhỏ (Ctrl + lăn chuột)")
+        zoom_out_btn.clicked.connect(lambda: self.zoom_by(1 / ZOOM_STEP))
+        zoom_in_btn = QPushButton("＋")
+        zoom_in_btn.setFixedWidth(30)
+        zoom_in_btn.setToolTip("Phóng to (Ctrl + lăn chuột)")
+        zoom_in_btn.clicked.connect(lambda: self.zoom_by(ZOOM_STEP))
+        fit_btn = QPushButton("Vừa khung")
+        fit_btn.clicked.connect(self.fit_width)
+        prev_btn = QPushButton("◀")
+        prev_btn.setFixedWidth(30)
+        prev_btn.setToolTip("Trang trước")
+        prev_btn.clicked.connect(lambda: self.step_requested.emit(-1))
+        next_btn = QPushButton("▶")
+        next_btn.setFixedWidth(30)
+        next_btn.setToolTip("Trang sau")
+        next_btn.clicked.connect(lambda: self.step_requested.emit(1))
+        close_btn = QPushButton("✖")
+        close_btn.setFixedWidth(30)
+        close_btn.setToolTip("Đóng khung xem trước")
+        close_btn.clicked.connect(self.close_preview)
+
+        header = QHBoxLayout()
+        header.addWidget(prev_btn)
+        header.addWidget(next_btn)
+        header.addWidget(self.title_label)
+        header.addStretch()
+        header.addWidget(zoom_out_btn)
+        header.addWidget(self.zoom_label)
+        header.addWidget(zoom_in_btn)
+        header.addWidget(fit_btn)
+        header.addWidget(close_btn)
+
+        self.canvas = PreviewCanvas(self)
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setAlignment(Qt.AlignCenter)
+        self.scroll_area.setWidget(self.canvas)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(header)
+        layout.addWidget(self.scroll_area)
+
+    def set_document(self, doc):
+        """Đổi tài liệu: bỏ toàn bộ ô đã đệm của tài liệu cũ."""
+        self.doc = doc
+        self.page_num = None
+        self.tile_queue = []
+        self.cache.clear()
+        self.hide()
+
+    def show_page(self, page_num, title=None):
+        if self.doc is None:
+            return
+        self.page_num = page_num
+        self.page_rect = self.doc[page_num].rect
+        self.tile_queue = []
+        self.set_title(title)
+        self.show()
+        self.fit_width()
+
+    def set_title(self, title=None):
+        self.title_label.setText(title or f"Trang gốc {self.page_num + 1}")
+
+    def close_preview(self):
+        self.tile_queue = []
+        self.tile_timer.stop()
+        self.hide()
+
+    # --- Zoom ---
+    def fit_width(self):
+        if self.page_rect is None:
+            return
+        available = max(50, self.scroll_area.viewport().width() - 4)
+        self.set_zoom(available / self.page_rect.width)
+
+    def zoom_by(self, factor, anchor=None):
+        self.set_zoom(self.zoom * factor, anchor)
+
+    def set_zoom(self, zoom, anchor=None):
+        """Đặt mức zoom (làm tròn theo ZOOM_STEP), giữ nguyên điểm anchor (hoặc tâm khung nhìn)."""
+        if self.page_rect is None:
+            return
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+        zoom = ZOOM_STEP ** round(math.log(zoom, ZOOM_STEP))
+        h_bar = self.scroll_area.horizontalScrollBar()
+        v_bar = self.scroll_area.verticalScrollBar()
+        if anchor is None:
+            viewport = self.scroll_area.viewport()
+            anchor_view = (viewport.width() / 2, viewport.height() / 2)
+            anchor = (h_bar.value() + anchor_view[0], v_bar.value() + anchor_view[1])
+        else:
+            anchor_view = (anchor.x() - h_bar.value(), anchor.y() - v_bar.value())
+            anchor = (anchor.x(), anchor.y())
+        ratio = zoom / self.zoom
+
+        self.zoom = zoom
+        self.tile_queue = []  # các ô của mức zoom cũ không còn cần
+        self.zoom_label.setText(f"{zoom * 100:.0f}%")
+        self.canvas.resize(int(self.page_rect.width * zoom), int(self.page_rect.height * zoom))
+        h_bar.setValue(int(anchor[0] * ratio - anchor_view[0]))
+        v_bar.setValue(int(anchor[1] * ratio - anchor_view[1]))
+        self.canvas.update()
+
+    # --- Vẽ ---
+    def _base_image(self):
+        """Ảnh nền độ phân giải thấp của cả trang, render đồng bộ vì rất nhanh."""
+        key = (self.page_num, "base")
+        image = self.cache.get(key)
+        if image is None:
+            page = self.doc[self.page_num]
+            scale = BASE_SIZE / max(self.page_rect.width, self.page_rect.height)
+            image = pixmap_to_qimage(page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False))
+            self.cache.put(key, image)
+        return image
+
+    def _tile_key(self, tx, ty):
+        return (self.page_num, round(self.zoom, 4), tx, ty)
+
+    def paint_page(self, painter, rect):
+        if self.doc is None or self.page_num is None:
+            return
+        width, height = self.canvas.width(), self.canvas.height()
+
+        # Mức 1: ảnh nền kéo giãn, có ngay
+        base = self._base_image()
+        painter.drawImage(QRect(0, 0, width, height), base)
+        if max(width, height) <= BASE_SIZE:
+            return  # ảnh nền đã đủ nét
+
+        # Mức 2: các ô độ phân giải đầy đủ đã có trong bộ nhớ đệm; ô thiếu thì xếp hàng
+        missing = []
+        for ty in range(rect.top() // TILE_SIZE, min(rect.bottom(), height - 1) // TILE_SIZE + 1):
+            for tx in range(rect.left() // TILE_SIZE, min(rect.right(), width - 1) // TILE_SIZE + 1):
+                image = self.cache.get(self._tile_key(tx, ty))
+                if image is not None:
+                    painter.drawImage(tx * TILE_SIZE, ty * TILE_SIZE, image)
+                else:
+                    missing.append((tx, ty))
+        if missing:
+            self._queue_tiles()
+
+    def _queue_tiles(self):
+        """Xếp hàng các ô còn thiếu trong vùng nhìn thấy, ô gần tâm khung nhìn trước."""
+        visible = self.canvas.visibleRegion().boundingRect()
+        if visible.isEmpty():
+            return
+        cx, cy = visible.center().x(), visible.center().y()
+        width, height = self.canvas.width(), self.canvas.height()
+        wanted = []
+        for ty in range(visible.top() // TILE_SIZE, min(visible.bottom(), height - 1) // TILE_SIZE + 1):
+            for tx in range(visible.left() // TILE_SIZE, min(visible.right(), width - 1) // TILE_SIZE + 1):
+                if self.cache.get(self._tile_key(tx, ty)) is None:
+                    dist = abs((tx + 0.5) * TILE_SIZE - cx) + abs((ty + 0.5) * TILE_SIZE - cy)
+                    wanted.append((dist, tx, ty))
+        wanted.sort()
+        # Thay cả hàng đợi: ô đã cuộn ra khỏi khung nhìn không render nữa
+        self.tile_queue = [(self.page_num, self.zoom, tx, ty) for _, tx, ty in wanted]
+        if self.tile_queue:
+            self.tile_timer.start(0)
+
+    def _render_queued_tiles(self):
+        """Render ô trong hàng đợi, mỗi lượt tối đa ~20 ms."""
+        deadline = time.perf_counter() + 0.02
+        while self.tile_queue and time.perf_counter() < deadline:
+            page_num, zoom, tx, ty = self.tile_queue.pop(0)
+            if page_num != self.page_num or zoom != self.zoom:
+                continue
+            key = self._tile_key(tx, ty)
+            if self.cache.get(key) is not None:
+                continue
+            # Ô (tx, ty) tính theo px ở mức zoom hiện tại -> hình chữ nhật trên trang (pt)
+            x0 = self.page_rect.x0 + tx * TILE_SIZE / zoom
+            y0 = self.page_rect.y0 + ty * TILE_SIZE / zoom
+            clip = fitz.Rect(x0, y0, x0 + TILE_SIZE / zoom, y0 + TILE_SIZE / zoom) & self.page_rect
+            if clip.is_empty:
+                continue
+            pix = self.doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+            self.cache.put(key, pixmap_to_qimage(pix))
+            self.canvas.update(QRectF(tx * TILE_SIZE, ty * TILE_SIZE, pix.width, pix.height).toAlignedRect())
+        if not self.tile_queue:
+            self.tile_timer.stop()
@@ -0,0 +1,289 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PyQt5.QtWidgets import (
+    QWidget, QPushButton, QTextEdit, QVBoxLayout, QTableWidgetItem, QAbstractItemView,
+    QHBoxLayout, QFileDialog, QLabel, QProgressBar, QMessageBox, QGroupBox, QSizePolicy,
+    QTableWidget, QHeaderView, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QFont
+import pandas as pd
+
+from tools.merge_backends import find_leaf_folders, folder_output_path, is_up_to_date, merge_folder
+from tools.split_engine import default_workers, process_context
+
+
+class BatchMergeWorker(QThread):
+    """
+    Ghép PDF trong từng thư mục lá của cây thư mục thành <thư mục>.pdf.
+    Mỗi thư mục là một việc độc lập trong ProcessPoolExecutor. Thư mục có file
+    kết quả mới hơn mọi file đầu vào thì bỏ qua (trừ khi force=True).
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int, float)  # thư mục xong, tổng thư mục, giây còn lại
+    folder_done_signal = pyqtSignal(dict)
+    done_signal = pyqtSignal(list, bool)  # (kết quả từng thư mục, bị hủy hay không)
+
+    def __init__(self, root, compact=False, force=False, max_workers=None):
+        super().__init__()
+        self.root = root
+        self.compact = compact
+        self.force = force
+        self.max_workers = max_workers or default_workers()
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self):
+        results = []
+        try:
+            self._merge_all(results)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi: {e}")
+        finally:
+            self.done_signal.emit(results, not self.is_running)
+
+    def _merge_all(self, results):
+        jobs = []
+        for folder, inputs in find_leaf_folders(self.root):
+            out_path = folder_output_path(folder)
+            if not self.force and is_up_to_date(out_path, inputs):
+                result = {"folder": folder, "out_path": out_path, "files": len(inputs), "pages": 0,
+                          "seconds": 0.0, "failures": [], "error": "", "skipped": True}
+                results.append(result)
+                self.folder_done_signal.emit(result)
+                continue
+            jobs.append((folder, inputs, out_path))
+
+        total = len(results) + len(jobs)
+        self.log_signal.emit(f"📂 Tìm thấy {total} thư mục, {len(results)} thư mục đã mới nhất (bỏ qua).")
+        if not jobs:
+            return
+
+        start_time = time.time()
+        done_jobs = 0
+        pool = ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs)), mp_context=process_context())
+        try:
+            futures = {pool.submit(merge_folder, folder, inputs, out_path, self.compact): (folder, inputs, out_path)
+                       for folder, inputs, out_path in jobs}
+            for future in as_completed(futures):
+                if not self.is_running:
+                    break
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # tiến trình con chết: ghi nhận thư mục lỗi, các thư mục khác vẫn tiếp tục
+                    folder, inputs, out_path = futures[future]
+                    result = {"folder": folder, "out_path": out_path, "files": len(inputs), "pages": 0,
+                              "seconds": 0.0, "failures": [], "error": str(e) or type(e).__name__}
+                result["skipped"] = False
+                results.append(result)
+                name = os.path.relpath(result["folder"], self.root)
+                if result["error"]:
+                    self.log_signal.emit(f"✖ Lỗi: {name} - {result['error']}")
+                else:
+                    self.log_signal.emit(f"✔ {name}: {result['files']} file, {result['pages']} trang "
+                                         f"({result['seconds']:.1f}s)")
+                for path, error in result["failures"]:
+                    self.log_signal.emit(f"   ⚠️ Bỏ qua {os.path.basename(path)}: {error}")
+                self.folder_done_signal.emit(result)
+
+                done_jobs += 1
+                elapsed = time.time() - start_time
+                est_remain = (len(jobs) - done_jobs) * elapsed / done_jobs
+                self.progress_signal.emit(len(results), total, est_remain)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class PDFBatchMergeApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.result_data = []
+        self.worker = None
+        self.current_folder = ""
+        self.start_time = None
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Gộp PDF theo thư mục")
+        self.resize(850, 500)
+
+        layout = QVBoxLayout()
+        self.setFont(QFont("Arial", 9))
+
+        # --- Chọn thư mục ---
+        folder_group = QGroupBox("Thư mục gốc")
+        folder_layout = QHBoxLayout()
+        self.folder_label = QLabel("Chưa chọn thư mục")
+        self.folder_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        self.select_btn = QPushButton("Chọn thư mục")
+        folder_layout.addWidget(self.folder_label)
+        folder_layout.addWidget(self.select_btn)
+        folder_group.setLayout(folder_layout)
+        layout.addWidget(folder_group)
+        self.select_btn.clicked.connect(self.select_folder)
+
+        # --- Tuỳ chọn ---
+        option_layout = QHBoxLayout()
+        self.compact_check = QCheckBox("Thu gọn file kết quả")
+        self.force_check = QCheckBox("Ghép lại cả thư mục đã mới nhất")
+        self.force_check.setToolTip("Mặc định bỏ qua thư mục có file kết quả mới hơn mọi file PDF bên trong.")
+        option_layout.addWidget(QLabel("Mỗi thư mục lá → <thư mục>.pdf đặt cạnh thư mục."))
+        option_layout.addStretch()
+        option_layout.addWidget(self.compact_check)
+        option_layout.addWidget(self.force_check)
+        layout.addLayout(option_layout)
+
+        # --- Nút chức năng ---
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        self.start_btn = QPushButton("Bắt đầu")
+        self.stop_btn = QPushButton("Dừng")
+        self.export_btn = QPushButton("Xuất báo cáo")
+        for btn in (self.start_btn, self.stop_btn, self.export_btn):
+            btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+            btn_layout.addWidget(btn)
+        self.stop_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        layout.addLayout(btn_layout)
+
+        self.start_btn.clicked.connect(self.start_merge)
+        self.stop_btn.clicked.connect(self.stop_merge)
+        self.export_btn.clicked.connect(self.export_excel)
+
+        # --- Bảng kết quả ---
+        self.result_table = QTableWidget()
+        self.result_table.verticalHeader().setVisible(False)
+        self.result_table.setColumnCount(6)
+        self.result_table.setHorizontalHeaderLabels(
+            ["STT", "Thư mục", "Số file", "Số trang", "Thời gian (s)", "Kết quả"])
+        header = self.result_table.horizontalHeader()
+        for i in range(6):
+            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.result_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.result_table)
+
+        # --- Log ---
+        self.log_box = QTextEdit()
+        self.log_box.setReadOnly(True)
+        self.log_box.setFont(QFont("Consolas", 9))
+        layout.addWidget(self.log_box)
+
+        # --- Tiến trình ---
+        self.progress = QProgressBar()
+        self.progress_label = QLabel("Đã ghép: 0/0 thư mục | Ước tính còn lại: --")
+        self.progress.hide()
+        self.progress_label.hide()
+        layout.addWidget(self.progress)
+        layout.addWidget(self.progress_label)
+
+        self.setLayout(layout)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Chọn thư mục gốc")
+        if folder:
+            self.folder_label.setText(folder)
+            self.current_folder = folder
+
+    def start_merge(self):
+        folder = self.current_folder.strip()
+        if not os.path.isdir(folder):
+            QMessageBox.warning(self, "Lỗi", "Vui lòng chọn đúng thư mục!")
+            return
+
+        self.log_box.clear()
+        self.result_data = []
+        self.result_table.setRowCount(0)
+        self.progress.setValue(0)
+        self.progress_label.setText("Đã ghép: 0/0 thư mục | Ước tính còn lại: --")
+        self.progress.show()
+        self.progress_label.show()
+        self._set_running(True)
+        self.start_time = time.time()
+
+        self.worker = BatchMergeWorker(folder, self.compact_check.isChecked(), self.force_check.isChecked())
+        self.worker.log_signal.connect(self.log_box.append)
+        self.worker.progress_signal.connect(self.update_progress)
+        self.worker.folder_done_signal.connect(self.add_result_row)
+        self.worker.done_signal.connect(self.on_done)
+        self.worker.start()
+
+    def _set_running(self, running):
+        for widget in (self.select_btn, self.start_btn, self.compact_check, self.force_check):
+            widget.setEnabled(not running)
+        self.stop_btn.setEnabled(running)
+        self.export_btn.setEnabled(not running and bool(self.result_data))
+
+    def stop_merge(self):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.stop_btn.setEnabled(False)
+            self.log_box.append("⏹ Đang dừng, chờ các thư mục đang ghép hoàn tất...")
+
+    def add_result_row(self, result):
+        self.result_data.append(result)
+        row = self.result_table.rowCount()
+        self.result_table.insertRow(row)
+        if result["skipped"]:
+            status = "⏭ Đã mới nhất, bỏ qua"
+        elif result["error"]:
+            status = f"✖ {result['error']}"
+        elif result["failures"]:
+            status = f"⚠️ {result['out_path']} (bỏ qua {len(result['failures'])} file lỗi)"
+        else:
+            status = result["out_path"]
+        values = [row + 1, os.path.relpath(result["folder"], self.current_folder),
+                  result["files"], result["pages"], f"{result['seconds']:.1f}", status]
+        for col, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            if col in (0, 2, 3, 4):
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.result_table.setItem(row, col, item)
+        self.result_table.item(row, 1).setToolTip(result["folder"])
+        self.result_table.scrollToBottom()
+
+    def update_progress(self, done, total, est_remain):
+        self.progress.setMaximum(total)
+        self.progress.setValue(done)
+        self.progress_label.setText(
+            f"Đã ghép: {done}/{total} thư mục | Ước tính còn lại: {int(est_remain)} giây")
+
+    def on_done(self, results, cancelled):
+        self.progress.hide()
+        self.progress_label.hide()
+        self._set_running(False)
+
+        merged = [r for r in results if not r["skipped"] and not r["error"]]
+        skipped = sum(1 for r in results if r["skipped"])
+        failed = sum(1 for r in results if r["error"])
+        summary = (f"{len(merged)} thư mục đã ghép, {skipped} bỏ qua, {failed} lỗi, "
+                   f"{sum(r['pages'] for r in merged)} trang trong {time.time() - self.start_time:.1f} giây")
+        if cancelled:
+            self.log_box.append(f"⛔ Đã dừng. {summary}.")
+            return
+        self.log_box.append(f"----- Hoàn thành: {summary} -----")
+        QMessageBox.information(self, "Hoàn tất", f"Đã ghép xong.\n{summary}.")
+
+    def export_excel(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Lưu báo cáo", "", "Excel File (*.xlsx)")
+        if not path:
+            return
+        rows = []
+        for idx, r in enumerate(self.result_data, 1):
+            failures = "; ".join(f"{os.path.basename(p)}: {e}" for p, e in r["failures"])
+            rows.append([idx, r["folder"], r["files"], r["pages"], round(r["seconds"], 2),
+                         "" if r["skipped"] or r["error"] else r["out_path"],
+                         "Bỏ qua (đã mới nhất)" if r["skipped"] else r["error"], failures])
+        columns = ["STT", "Thư mục", "Số file", "Số trang", "Thời gian (s)", "File kết quả", "Lỗi", "File bị bỏ qua"]
+        pd.DataFrame(rows, columns=columns).to_excel(path, index=False)
+        QMessageBox.information(self, "Hoàn tất", "Đã xuất báo cáo ra Excel!")
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        event.accept()
@@ -0,0 +1,297 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PyQt5.QtWidgets import (
+    QWidget, QPushButton, QLineEdit, QTextEdit, QVBoxLayout, QTableWidgetItem, QAbstractItemView,
+    QHBoxLayout, QFileDialog, QLabel, QProgressBar, QMessageBox, QGroupBox, QSizePolicy,
+    QTableWidget, QHeaderView, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QFont
+import pandas as pd
+
+from tools.split_engine import (
+    SAVE_COMPACT, SAVE_PLAIN, default_workers, process_context, split_file, split_output_dirs
+)
+from utilities.page_ranges import parse_expression
+
+
+class BatchSplitWorker(QThread):
+    """
+    Tách mọi file PDF trong cây thư mục theo cùng một spec khoảng trang.
+    Mỗi file là một việc trong ProcessPoolExecutor; kết quả được đẩy về giao diện
+    ngay khi từng file xong.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int, int, float)  # file xong, tổng file, tổng trang, giây còn lại
+    file_done_signal = pyqtSignal(dict)
+    done_signal = pyqtSignal(list, bool)  # (kết quả từng file, bị hủy hay không)
+
+    def __init__(self, folder, spec, save_options=None, max_workers=None):
+        super().__init__()
+        self.folder = folder
+        self.spec = spec
+        self.save_options = save_options or SAVE_PLAIN
+        self.max_workers = max_workers or default_workers()
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self):
+        results = []
+        try:
+            self._split_all(results)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi: {e}")
+        finally:
+            self.done_signal.emit(results, not self.is_running)
+
+    def _list_files(self):
+        """
+        Liệt kê trước khi tách để không gặp lại các file vừa ghi ra; bỏ qua thư mục
+        kết quả của các lần tách trước (<tên>/<tên>_001.pdf cạnh <tên>.pdf).
+        """
+        files = []
+        skipped_dirs = 0
+        for root, dirs, fs in os.walk(self.folder):
+            outputs = set(split_output_dirs(root, dirs))
+            skipped_dirs += len(outputs)
+            dirs[:] = sorted(d for d in dirs if d not in outputs)
+            for file in sorted(fs):
+                if file.lower().endswith('.pdf'):
+                    files.append(os.path.join(root, file))
+        if skipped_dirs:
+            self.log_signal.emit(f"⏭ Bỏ qua {skipped_dirs} thư mục kết quả của lần tách trước.")
+        return files
+
+    def _split_all(self, results):
+        files = self._list_files()
+        total_files = len(files)
+        total_pages = 0
+        self.log_signal.emit(f"📂 Tìm thấy {total_files} file PDF.")
+        if not files:
+            return
+
+        start_time = time.time()
+        workers = min(self.max_workers, total_files)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context())
+        try:
+            futures = {pool.submit(split_file, path, self.spec, **self.save_options): path for path in files}
+            for future in as_completed(futures):
+                if not self.is_running:
+                    break
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # tiến trình con chết: ghi nhận file lỗi, các file khác vẫn tiếp tục
+                    result = {"src": futures[future], "out_dir": "", "parts": 0, "pages": 0,
+                              "seconds": 0.0, "error": str(e) or type(e).__name__}
+                results.append(result)
+                total_pages += result["pages"]
+                name = os.path.relpath(result["src"], self.folder)
+                if result["error"]:
+                    self.log_signal.emit(f"✖ Lỗi: {name} - {result['error']}")
+                else:
+                    self.log_signal.emit(f"✔ {name}: {result['parts']} phần, {result['pages']} trang "
+                                         f"({result['seconds']:.1f}s)")
+                self.file_done_signal.emit(result)
+
+                done = len(results)
+                elapsed = time.time() - start_time
+                est_remain = (total_files - done) * elapsed / done
+                self.progress_signal.emit(done, total_files, total_pages, est_remain)
+        finally:
+            # Hủy các file chưa bắt đầu; file đang ghi dở được hoàn tất (ghi qua file .part)
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class PDFBatchSplitApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.result_data = []
+        self.worker = None
+        self.current_folder = ""
+        self.start_time = None
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Tách PDF hàng loạt")
+        self.resize(850, 500)
+
+        layout = QVBoxLayout()
+        self.setFont(QFont("Arial", 9))
+
+        # --- Chọn thư mục ---
+        folder_group = QGroupBox("Thư mục")
+        folder_layout = QHBoxLayout()
+        self.folder_label = QLabel("Chưa chọn thư mục")
+        self.folder_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
+        self.select_btn = QPushButton("Chọn thư mục")
+        folder_layout.addWidget(self.folder_label)
+        folder_layout.addWidget(self.select_btn)
+        folder_group.setLayout(folder_layout)
+        layout.addWidget(folder_group)
+        self.select_btn.clicked.connect(self.select_folder)
+
+        # --- Quy tắc tách ---
+        rule_group = QGroupBox("Quy tắc tách (áp dụng cho mọi file)")
+        rule_layout = QHBoxLayout()
+        self.expr_input = QLineEdit()
+        self.expr_input.setPlaceholderText("VD: every 2  |  1-3,4-end  |  1,2-5,6-")
+        self.expr_input.setToolTip(
+            "Các khoảng cách nhau bằng dấu phẩy, 'end' là trang cuối.\n"
+            "'every N' (hoặc 'mỗi N') tách cứ N trang một file.\n"
+            "Kết quả lưu vào <thư mục file>/<tên file>/<tên file>_001.pdf ...")
+        self.compact_check = QCheckBox("Nén file đầu ra (garbage/deflate)")
+        rule_layout.addWidget(self.expr_input)
+        rule_layout.addWidget(self.compact_check)
+        rule_group.setLayout(rule_layout)
+        layout.addWidget(rule_group)
+
+        # --- Nút chức năng ---
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        self.start_btn = QPushButton("Bắt đầu")
+        self.stop_btn = QPushButton("Dừng")
+        self.export_btn = QPushButton("Xuất báo cáo")
+        for btn in (self.start_btn, self.stop_btn, self.export_btn):
+            btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+            btn_layout.addWidget(btn)
+        self.stop_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        layout.addLayout(btn_layout)
+
+        self.start_btn.clicked.connect(self.start_split)
+        self.stop_btn.clicked.connect(self.stop_split)
+        self.export_btn.clicked.connect(self.export_excel)
+
+        # --- Bảng kết quả (cập nhật ngay khi từng file xong) ---
+        self.result_table = QTableWidget()
+        self.result_table.verticalHeader().setVisible(False)
+        self.result_table.setColumnCount(6)
+        self.result_table.setHorizontalHeaderLabels(
+            ["STT", "File", "Số phần", "Số trang", "Thời gian (s)", "Kết quả"])
+        header = self.result_table.horizontalHeader()
+        for i in range(6):
+            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.result_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.result_table)
+
+        # --- Log ---
+        self.log_box = QTextEdit()
+        self.log_box.setReadOnly(True)
+        self.log_box.setFont(QFont("Consolas", 9))
+        layout.addWidget(self.log_box)
+
+        # --- Tiến trình ---
+        self.progress = QProgressBar()
+        self.progress_label = QLabel("Đã tách: 0/0 file | Ước tính còn lại: --")
+        self.progress.hide()
+        self.progress_label.hide()
+        layout.addWidget(self.progress)
+        layout.addWidget(self.progress_label)
+
+        self.setLayout(layout)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Chọn thư mục chứa file PDF")
+        if folder:
+            self.folder_label.setText(folder)
+            self.current_folder = folder
+
+    def start_split(self):
+        folder = self.current_folder.strip()
+        if not os.path.isdir(folder):
+            QMessageBox.warning(self, "Lỗi", "Vui lòng chọn đúng thư mục!")
+            return
+        try:
+            spec = parse_expression(self.expr_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Lỗi", f"Quy tắc tách không hợp lệ:\n{e}")
+            return
+
+        self.log_box.clear()
+        self.result_data = []
+        self.result_table.setRowCount(0)
+        self.progress.setValue(0)
+        self.progress_label.setText("Đã tách: 0/0 file | Ước tính còn lại: --")
+        self.progress.show()
+        self.progress_label.show()
+        self._set_running(True)
+        self.start_time = time.time()
+
+        save_options = SAVE_COMPACT if self.compact_check.isChecked() else SAVE_PLAIN
+        self.worker = BatchSplitWorker(folder, spec, save_options)
+        self.worker.log_signal.connect(self.log_box.append)
+        self.worker.progress_signal.connect(self.update_progress)
+        self.worker.file_done_signal.connect(self.add_result_row)
+        self.worker.done_signal.connect(self.on_done)
+        self.worker.start()
+
+    def _set_running(self, running):
+        for widget in (self.select_btn, self.start_btn, self.expr_input, self.compact_check):
+            widget.setEnabled(not running)
+        self.stop_btn.setEnabled(running)
+        self.export_btn.setEnabled(not running and bool(self.result_data))
+
+    def stop_split(self):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.stop_btn.setEnabled(False)
+            self.log_box.append("⏹ Đang dừng, chờ các file đang tách hoàn tất...")
+
+    def add_result_row(self, result):
+        self.result_data.append(result)
+        row = self.result_table.rowCount()
+        self.result_table.insertRow(row)
+        status = f"✖ {result['error']}" if result["error"] else result["out_dir"]
+        values = [row + 1, os.path.relpath(result["src"], self.current_folder),
+                  result["parts"], result["pages"], f"{result['seconds']:.1f}", status]
+        for col, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            if col in (0, 2, 3, 4):
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.result_table.setItem(row, col, item)
+        self.result_table.item(row, 1).setToolTip(result["src"])
+        self.result_table.scrollToBottom()
+
+    def update_progress(self, files_done, total_files, total_pages, est_remain):
+        self.progress.setMaximum(total_files)
+        self.progress.setValue(files_done)
+        self.progress_label.setText(
+            f"Đã tách: {files_done}/{total_files} file, {total_pages} trang | "
+            f"Ước tính còn lại: {int(est_remain)} giây")
+
+    def on_done(self, results, cancelled):
+        self.progress.hide()
+        self.progress_label.hide()
+        self._set_running(False)
+
+        ok = [r for r in results if not r["error"]]
+        failed = len(results) - len(ok)
+        summary = (f"{len(ok)} file thành công, {failed} file lỗi, "
+                   f"{sum(r['parts'] for r in ok)} phần, {sum(r['pages'] for r in ok)} trang "
+                   f"trong {time.time() - self.start_time:.1f} giây")
+        if cancelled:
+            self.log_box.append(f"⛔ Đã dừng. {summary}.")
+            return
+        self.log_box.append(f"----- Hoàn thành: {summary} -----")
+        QMessageBox.information(self, "Hoàn tất", f"Đã tách xong.\n{summary}.")
+
+    def export_excel(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Lưu báo cáo", "", "Excel File (*.xlsx)")
+        if not path:
+            return
+        rows = [[idx, r["src"], r["parts"], r["pages"], round(r["seconds"], 2), r["out_dir"], r["error"]]
+                for idx, r in enumerate(self.result_data, 1)]
+        columns = ["STT", "File nguồn", "Số phần", "Số trang", "Thời gian (s)", "Thư mục kết quả", "Lỗi"]
+        pd.DataFrame(rows, columns=columns).to_excel(path, index=False)
+        QMessageBox.information(self, "Hoàn tất", "Đã xuất báo cáo ra Excel!")
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        event.accept()
@@ -1,15 +1,419 @@
 import os
+import time
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-    QListWidget, QFileDialog, QMessageBox, QProgressBar, QTextEdit, 
-    QGroupBox, QSplitter, QScrollArea
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+    QTableView, QFileDialog, QMessageBox, QProgressBar, QTextEdit, 
+    QGroupBox, QScrollArea, QLabel, QComboBox, QCheckBox,
+    QAbstractItemView, QHeaderView
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QDragEnterEvent, QDropEvent
-from PyPDF2 import PdfMerger
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QColor
+from tools.merge_backends import (
+    BACKENDS, DEFAULT_BACKEND, MERGE_CHUNK_PAGES, SAVE_COMPACT, SAVE_PLAIN,
+    IncrementalAppendBackend, compact_file, create_backend
+)
+from tools.pdf_probe import probe_pdf
+from tools.split_engine import default_workers, process_context
+from utilities.page_ranges import parse_expression, resolve_ranges
+
+
+class MergeWorker(QThread):
+    """
+    Ghép các file PDF trong luồng nền, báo tiến trình theo trang.
+    File lỗi được gom lại thành báo cáo, không làm dừng cả quá trình.
+    append=True: save_path là file PDF có sẵn, các file được ghép nối vào cuối
+    bằng cập nhật tăng dần (luôn dùng PyMuPDF).
+    page_specs: {file: spec khoảng trang (utilities.page_ranges)}; chỉ các trang được
+    chọn của file đó được chép thẳng từ nguồn, không qua file trung gian.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)  # (số trang đã ghép, tổng số trang)
+    speed_signal = pyqtSignal(float, str)   # (trang/giây, thời gian còn lại)
+    status_signal = pyqtSignal(str)
+    done_signal = pyqtSignal(str, list, bool)  # (file kết quả hoặc "", [(file, lỗi)], bị hủy hay không)
+
+    def __init__(self, file_paths, save_path, backend=DEFAULT_BACKEND, compact=False, append=False,
+                 page_specs=None):
+        super().__init__()
+        self.file_paths = file_paths
+        self.page_specs = page_specs or {}
+        self.save_path = save_path
+        self.backend_name = IncrementalAppendBackend.name if append else backend
+        self.compact = compact and not append
+        self.append = append
+        self._is_running = True
+        self.failures = []
+
+    def stop(self):
+        self._is_running = False
+
+    def run(self):
+        start_time = time.time()
+        try:
+            backend = IncrementalAppendBackend(self.save_path) if self.append else create_backend(self.backend_name)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Không mở được file đích: {e}")
+            self.done_signal.emit("", [(self.save_path, str(e))], False)
+            return
+        written = ""
+        try:
+            # Lượt 1: đọc số trang từng file (cần cho ETA) và loại file hỏng sớm
+            self.status_signal.emit("Đang đọc danh sách file...")
+            sources = []
+            for path in self.file_paths:
+                if not self._is_running:
+                    break
+                try:
+                    spans = self._spans(path, backend.page_count(path))
+                    if not spans:
+                        raise ValueError("Không có trang nào trong khoảng đã chọn")
+                    sources.append((path, spans))
+                except Exception as e:
+                    self._fail(path, e)
+
+            # Lượt 2: chép theo từng lát trang, đóng mỗi nguồn ngay khi xong
+            total_pages = sum(end - start for _, spans in sources for start, end in spans)
+            pages_done = 0
+            self.status_signal.emit("Đang ghép...")
+            for path, spans in sources:
+                if not self._is_running:
+                    break
+                chunks = [(start, min(start + MERGE_CHUNK_PAGES, end))
+                          for first, end in spans for start in range(first, end, MERGE_CHUNK_PAGES)]
+                mark = backend.mark()
+                source_pages = 0
+                try:
+                    src = backend.open_source(path)
+                    try:
+                        for i, (start, end) in enumerate(chunks):
+                            if not self._is_running:
+                                break
+                            backend.append(src, start, end, final=(i == len(chunks) - 1))
+                            pages_done += end - start
+                            source_pages += end - start
+                            self._emit_progress(pages_done, total_pages, start_time)
+                        else:
+                            selected = sum(end - start for start, end in spans)
+                            self.log_signal.emit(f"📎 Đã thêm: {path}"
+                                                 + (f" ({selected} trang đã chọn)" if path in self.page_specs else ""))
+                    finally:
+                        backend.close_source(src)
+                except Exception as e:
+                    # Bỏ các lát đã chép của file lỗi để kết quả không chứa một phần file
+                    backend.rollback(mark)
+                    pages_done -= source_pages
+                    self._emit_progress(pages_done, total_pages, start_time)
+                    self._fail(path, e)
+
+            if self._is_running and pages_done and self.append and backend.can_save_incrementally():
+                self.status_signal.emit("Đang ghi nối vào file đích...")
+                save_start = time.time()
+                backend.save_incremental()
+                written = self.save_path
+                self._report_append(backend, pages_done, time.time() - save_start)
+            elif self._is_running and pages_done:
+                if self.append:
+                    self.log_signal.emit(f"⚠️ File đích phải sửa lỗi khi mở nên không ghi nối được. "
+                                         f"File gốc {self.save_path} sẽ bị GHI ĐÈ bằng bản ghi lại toàn bộ.")
+                self.status_signal.emit("Đang thu gọn và ghi file kết quả..." if self.compact
+                                        else "Đang ghi file kết quả...")
+                tmp_path = self.save_path + ".part"
+                save_start = time.time()
+                try:
+                    backend.save(tmp_path, SAVE_COMPACT if self.compact else SAVE_PLAIN)
+                    backend.close()  # khi ghép nối, file đích đang mở; Windows không cho thay file đang mở
+                    os.replace(tmp_path, self.save_path)
+                    written = self.save_path
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._report_size(sources, time.time() - save_start)
+            self.log_signal.emit(f"⏱ Thời gian ghép ({self.backend_name}): {time.time() - start_time:.1f} giây")
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi khi ghép: {e}")
+        finally:
+            backend.close()
+        self.done_signal.emit(written, self.failures, not self._is_running)
+
+    def _spans(self, path, page_count):
+        """Các khoảng trang [start, end) cần chép của file, theo thứ tự trong biểu thức."""
+        spec = self.page_specs.get(path)
+        if spec is None:
+            return [(0, page_count)]
+        return [(start, end + 1) for start, end in resolve_ranges(spec, page_count)]
+
+    def _report_size(self, sources, save_seconds):
+        """So dung lượng file kết quả với tổng dung lượng các file đầu vào đã ghép."""
+        input_bytes = sum(os.path.getsize(path) for path, _ in sources)
+        output_bytes = os.path.getsize(self.save_path)
+        saved = input_bytes - output_bytes
+        percent = saved * 100 / input_bytes if input_bytes else 0
+        stage = "Thu gọn + ghi" if self.compact else "Ghi"
+        self.log_signal.emit(
+            f"🗜 Dung lượng: đầu vào {input_bytes / 1048576:.1f} MB → kết quả {output_bytes / 1048576:.1f} MB "
+            f"({'giảm' if saved >= 0 else 'tăng'} {abs(saved) / 1048576:.1f} MB, {abs(percent):.1f}%). "
+            f"{stage} mất {save_seconds:.1f} giây.")
+
+    def _report_append(self, backend, pages_added, save_seconds):
+        added_bytes = os.path.getsize(self.save_path) - backend.original_size
+        self.log_signal.emit(
+            f"📈 Đã ghi nối {pages_added} trang vào file đích ({backend.original_pages} → "
+            f"{backend.original_pages + pages_added} trang), ghi thêm {added_bytes / 1048576:.1f} MB "
+            f"trong {save_seconds:.1f} giây.")
+
+    def _fail(self, path, error):
+        self.failures.append((path, str(error)))
+        self.log_signal.emit(f"⚠️ Bỏ qua file lỗi: {path} ({error})")
+
+    def _emit_progress(self, pages_done, total_pages, start_time):
+        self.progress_signal.emit(pages_done, total_pages)
+        elapsed = max(time.time() - start_time, 1e-6)
+        rate = pages_done / elapsed
+        remaining = (total_pages - pages_done) / rate if rate else 0
+        self.speed_signal.emit(rate, str(datetime.timedelta(seconds=int(remaining))))
+
+
+class CompactWorker(QThread):
+    """Ghi lại toàn bộ một file PDF để thu gọn (sau nhiều lần ghép nối tăng dần)."""
+    done_signal = pyqtSignal(str, float, float, str)  # (file, MB trước, MB sau, lỗi)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def run(self):
+        before = os.path.getsize(self.path) / 1048576
+        try:
+            compact_file(self.path, SAVE_COMPACT)
+        except Exception as e:
+            self.done_signal.emit(self.path, before, before, str(e))
+            return
+        self.done_signal.emit(self.path, before, os.path.getsize(self.path) / 1048576, "")
+
+
+# Trạng thái kiểm tra của từng file trong danh sách ghép
+STATUS_PENDING = "pending"
+STATUS_OK = "ok"
+STATUS_BAD = "bad"
+STATUS_DAMAGED = "damaged"  # mở và ghép được nhưng MuPDF phải sửa hoặc có dữ liệu hỏng
+
+PROBE_MIN_PROCESSES = 2  # kiểm tra còn chờ đọc đĩa/mạng nên dùng ít nhất 2 tiến trình
+
+
+def normalize_path(path):
+    """Khóa so trùng: đường dẫn tuyệt đối, chuẩn hoá dấu phân cách và hoa/thường (Windows)."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ProbeWorker(QThread):
+    """
+    Kiểm tra song song một lô file vừa thêm, trả kết quả ngay khi từng file xong.
+    Mỗi file được mở trong một tiến trình con (tools/pdf_probe.py) vì MuPDF
+    không chạy song song được giữa các luồng.
+    """
+    probed_signal = pyqtSignal(str, dict)
+
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+        self._is_running = True
+
+    def stop(self):
+        self._is_running = False
+
+    def run(self):
+        workers = min(len(self.paths), max(PROBE_MIN_PROCESSES, default_workers()))
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context())
+        try:
+            futures = {pool.submit(probe_pdf, path): path for path in self.paths}
+            for future in as_completed(futures):
+                if not self._is_running:
+                    break
+                try:
+                    info = future.result()
+                except Exception as e:
+                    info = {"pages": None, "size": None, "encrypted": False,
+                            "error": str(e) or type(e).__name__, "damage": ""}
+                self.probed_signal.emit(futures[future], info)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class MergeListModel(QAbstractTableModel):
+    """
+    Danh sách file chờ ghép (theo thứ tự ghép) kèm thông tin kiểm tra.
+    Tập khóa đường dẫn đã chuẩn hoá giúp kiểm tra trùng trong O(1) khi thêm file.
+    Cột "Trang chọn" sửa trực tiếp được: biểu thức khoảng trang, để trống là lấy cả file.
+    """
+    HEADERS = ["File", "Số trang", "Trang chọn", "Dung lượng", "Mã hoá", "Trạng thái"]
+    RANGE_COLUMN = 2
+    range_error = pyqtSignal(str, str)  # (file, lỗi) khi biểu thức khoảng trang không hợp lệ
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []       # mỗi dòng là dict: path, key, pages, size, encrypted, status, error, ranges, spec
+        self.by_key = {}     # khóa chuẩn hoá -> dòng
+        self.positions = {}  # khóa chuẩn hoá -> vị trí dòng, cập nhật khi thêm/xoá/đổi chỗ
+
+    # --- Giao diện model của Qt ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return row["path"]
+            if col == 1:
+                if row["pages"] is None:
+                    return ""
+                if row["spec"] is None:
+                    return str(row["pages"])
+                selected = sum(end - start + 1 for start, end in resolve_ranges(row["spec"], row["pages"]))
+                return f"{selected}/{row['pages']}"
+            if col == self.RANGE_COLUMN:
+                return row["ranges"] or "Tất cả"
+            if col == 3:
+                return "" if row["size"] is None else f"{row['size'] / 1048576:.2f} MB"
+            if col == 4:
+                return "Có" if row["encrypted"] else ""
+            if col == 5:
+                if row["status"] == STATUS_PENDING:
+                    return "⏳ Đang kiểm tra"
+                if row["status"] == STATUS_DAMAGED:
+                    return f"⚠ {row['damage']}"
+                return f"✖ {row['error']}" if row["status"] == STATUS_BAD else "✔ OK"
+        elif role == Qt.EditRole and col == self.RANGE_COLUMN:
+            return row["ranges"]
+        elif role == Qt.ToolTipRole and col == self.RANGE_COLUMN:
+            return "Nhấp đúp để chọn trang cần ghép, ví dụ: 1-3,5,8-end. Để trống: cả file."
+        elif role == Qt.ToolTipRole and col in (0, 5):
+            return row["error"] or row["damage"] or row["path"]
+        elif role == Qt.BackgroundRole:
+            if row["status"] == STATUS_BAD:
+                return QColor("#f4cccc")
+            if row["status"] == STATUS_DAMAGED:
+                return QColor("#fce5cd")
+            if row["encrypted"]:
+                return QColor("#fff2cc")
+        elif role == Qt.TextAlignmentRole and col in (1, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.RANGE_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() != self.RANGE_COLUMN:
+            return False
+        row = self.rows[index.row()]
+        text = str(value).strip()
+        spec = None
+        if text:
+            try:
+                spec = parse_expression(text)
+                if spec[0] == "every":
+                    raise ValueError("Khi ghép chỉ dùng danh sách khoảng trang, ví dụ 1-3,5,8-end")
+                if row["pages"] is not None and not resolve_ranges(spec, row["pages"]):
+                    raise ValueError(f"Không có trang nào trong khoảng đã chọn (file có {row['pages']} trang)")
+            except ValueError as e:
+                self.range_error.emit(row["path"], str(e))
+                return False
+        row["ranges"] = text
+        row["spec"] = spec
+        self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), len(self.HEADERS) - 1))
+        return True
+
+    # --- Thao tác trên danh sách ---
+    def add_paths(self, paths):
+        """Thêm các file chưa có trong danh sách. Trả về danh sách đường dẫn thực sự được thêm."""
+        new_rows = []
+        for path in paths:
+            key = normalize_path(path)
+            if key in self.by_key:
+                continue
+            row = {"path": path, "key": key, "pages": None, "size": None,
+                   "encrypted": False, "status": STATUS_PENDING, "error": "", "damage": "", "ranges": "", "spec": None}
+            self.by_key[key] = row
+            new_rows.append(row)
+        if new_rows:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            self.rows.extend(new_rows)
+            for r, row in enumerate(new_rows, first):
+                self.positions[row["key"]] = r
+            self.endInsertRows()
+        return [row["path"] for row in new_rows]
+
+    def set_probe_result(self, path, info):
+        row = self.by_key.get(normalize_path(path))
+        if row is None:
+            return  # file đã bị xoá khỏi danh sách trong lúc kiểm tra
+        row.update(pages=info["pages"], size=info["size"], encrypted=info["encrypted"], error=info["error"],
+                   damage=info["damage"])
+        if info["error"]:
+            row["status"] = STATUS_BAD
+        else:
+            row["status"] = STATUS_DAMAGED if info["damage"] else STATUS_OK
+        r = self.positions[row["key"]]
+        self.dataChanged.emit(self.index(r, 0), self.index(r, len(self.HEADERS) - 1))
+
+    def remove_row(self, r):
+        self.beginRemoveRows(QModelIndex(), r, r)
+        row = self.rows.pop(r)
+        del self.by_key[row["key"]]
+        del self.positions[row["key"]]
+        for i in range(r, len(self.rows)):
+            self.positions[self.rows[i]["key"]] = i
+        self.endRemoveRows()
+        return row
+
+    def move_row(self, r, delta):
+        target = r + delta
+        if not (0 <= r < len(self.rows) and 0 <= target < len(self.rows)):
+            return False
+        # beginMoveRows cần chỉ số đích tính trước khi bỏ dòng nguồn
+        self.beginMoveRows(QModelIndex(), r, r, QModelIndex(), target + 1 if delta > 0 else target)
+        self.rows.insert(target, self.rows.pop(r))
+        for i in range(min(r, target), max(r, target) + 1):
+            self.positions[self.rows[i]["key"]] = i
+        self.endMoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.by_key = {}
+        self.positions = {}
+        self.endResetModel()
+
+    def count_by_status(self, status):
+        return sum(1 for row in self.rows if row["status"] == status)
+
+    def page_specs(self):
+        """{file: spec} của các file chỉ ghép một phần trang."""
+        return {row["path"]: row["spec"] for row in self.rows if row["spec"] is not None}
 
 
 class PDFMergerTool(QWidget):
+    EDIT_TRIGGERS = QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("📎 TKT - Ghép File PDF")
@@ -19,19 +423,49 @@ class PDFMergerTool(QWidget):
         toolbar = QHBoxLayout()
         self.add_button = QPushButton("➕ Thêm file")
         self.merge_button = QPushButton("📎 Ghép PDF")
+        self.append_button = QPushButton("📥 Ghép nối vào file có sẵn")
+        self.append_button.setToolTip(
+            "Thêm các file trong danh sách vào cuối một file PDF đã có.\n"
+            "Chỉ ghi thêm phần mới vào cuối file nên nhanh với file lớn.")
+        self.compact_button = QPushButton("🗜 Thu gọn file PDF")
+        self.compact_button.setToolTip("Ghi lại toàn bộ một file PDF (ví dụ sau nhiều lần ghép nối) cho gọn nhất.")
         self.clear_button = QPushButton("🗑 Xoá danh sách")
         toolbar.addWidget(self.add_button)
         toolbar.addWidget(self.merge_button)
+        toolbar.addWidget(self.append_button)
+        toolbar.addWidget(self.compact_button)
         toolbar.addWidget(self.clear_button)
         toolbar.addStretch()
+        self.backend_combo = QComboBox()
+        for name, backend in BACKENDS.items():
+            self.backend_combo.addItem(backend.label, name)
+        self.backend_combo.setCurrentIndex(self.backend_combo.findData(DEFAULT_BACKEND))
+        self.backend_combo.setToolTip("Thư viện dùng để ghép. PyPDF2 chỉ nên dùng khi PyMuPDF gặp lỗi với file nguồn.")
+        toolbar.addWidget(QLabel("Bộ máy ghép:"))
+        toolbar.addWidget(self.backend_combo)
+        self.compact_check = QCheckBox("Thu gọn file kết quả")
+        self.compact_check.setToolTip(
+            "Gộp font/ảnh/ICC giống hệt nhau giữa các file, bỏ đối tượng thừa và nén lại stream.\n"
+            "File nhỏ hơn nhiều khi ghép các file scan cùng máy, nhưng ghi chậm hơn.")
+        toolbar.addWidget(self.compact_check)
 
         # === File list (trái) với ScrollArea ===
         self.file_list_widget = QWidget()
         self.file_list_layout = QVBoxLayout(self.file_list_widget)
         self.file_list_layout.setAlignment(Qt.AlignTop)
 
-        self.file_list = QListWidget()
-        self.file_list.setAcceptDrops(True)
+        self.file_model = MergeListModel()
+        self.file_model.range_error.connect(self._on_range_error)
+        self.file_list = QTableView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.file_list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.file_list.setEditTriggers(self.EDIT_TRIGGERS)
+        self.file_list.verticalHeader().setVisible(False)
+        header = self.file_list.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        for col in range(1, self.file_model.columnCount()):
+            header.setSectionResizeMode(col, QHeaderView.ResizeToContents)
         self.file_list_layout.addWidget(self.file_list)
 
         self.scroll_area = QScrollArea()
@@ -46,6 +480,10 @@ class PDFMergerTool(QWidget):
         self.progress = QProgressBar()
         self.progress.setValue(0)
         self.progress.setAlignment(Qt.AlignCenter)
+        self.speed_label = QLabel()
+        self.speed_label.hide()
+        self.cancel_button = QPushButton("⛔ Hủy ghép")
+        self.cancel_button.hide()
 
         # Log box
         self.log_box = QTextEdit()
@@ -62,6 +500,8 @@ class PDFMergerTool(QWidget):
         right_panel.addWidget(self.delete_button)
         right_panel.addStretch()
         right_panel.addWidget(self.progress)
+        right_panel.addWidget(self.speed_label)
+        right_panel.addWidget(self.cancel_button)
         right_panel.addWidget(log_group)
 
         # === Nội dung chính ===
@@ -82,6 +522,12 @@ class PDFMergerTool(QWidget):
         self.down_button.clicked.connect(self.move_down)
         self.delete_button.clicked.connect(self.delete_selected)
         self.merge_button.clicked.connect(self.merge_files)
+        self.append_button.clicked.connect(self.append_files)
+        self.compact_button.clicked.connect(self.compact_pdf)
+        self.cancel_button.clicked.connect(self.cancel_merge)
+        self.merge_worker = None
+        self.compact_worker = None
+        self.probe_workers = []
 
         self.file_list.keyPressEvent = self.keyPressEventOverride
         self.setAcceptDrops(True)
@@ -97,96 +543,279 @@ class PDFMergerTool(QWidget):
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
-        for url in event.mimeData().urls():
-            file_path = url.toLocalFile()
-            if file_path.lower().endswith(".pdf"):
-                self.add_file_if_not_exists(file_path)
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        self.add_paths([p for p in paths if p.lower().endswith(".pdf")])
 
     def add_file_if_not_exists(self, file_path):
-        current_files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
-        if file_path not in current_files:
-            self.file_list.addItem(file_path)
-            self.log(f"➕ Đã thêm file: {file_path}")
+        self.add_paths([file_path])
+
+    def add_paths(self, paths):
+        """Thêm một lô file (bỏ qua file trùng) rồi kiểm tra chúng trong nền."""
+        added = self.file_model.add_paths(paths)
+        skipped = len(paths) - len(added)
+        if not added:
+            if skipped:
+                self.log(f"⚠️ {skipped} file đã có trong danh sách.")
+            return
+        if len(added) == 1:
+            self.log(f"➕ Đã thêm file: {added[0]}")
+        else:
+            self.log(f"➕ Đã thêm {len(added)} file" + (f", bỏ qua {skipped} file trùng." if skipped else "."))
+
+        worker = ProbeWorker(added)
+        worker.probed_signal.connect(self._on_probed)
+        worker.finished.connect(lambda w=worker: self._on_probe_finished(w))
+        self.probe_workers.append(worker)
+        worker.start()
+
+    def _on_probed(self, path, info):
+        self.file_model.set_probe_result(path, info)
+        if info["error"]:
+            self.log(f"⚠️ File lỗi: {path} ({info['error']})")
+        elif info["damage"]:
+            self.log(f"⚠️ File hỏng một phần, vẫn ghép được nhưng có thể thiếu nội dung: {path} ({info['damage']})")
+
+    def _on_probe_finished(self, worker):
+        if worker in self.probe_workers:
+            self.probe_workers.remove(worker)
+        if not self.probe_workers:
+            bad = self.file_model.count_by_status(STATUS_BAD)
+            damaged = self.file_model.count_by_status(STATUS_DAMAGED)
+            self.log(f"🔍 Đã kiểm tra xong {len(self.file_model.rows)} file"
+                     + (f", {bad} file lỗi (tô đỏ)" if bad else "")
+                     + (f", {damaged} file hỏng một phần (tô cam)" if damaged else "") + ".")
+
+    def _on_range_error(self, path, error):
+        self.log(f"⚠️ Khoảng trang không hợp lệ cho {os.path.basename(path)}: {error}")
+        QMessageBox.warning(self, "Khoảng trang không hợp lệ", error)
+
+    def is_probing(self):
+        return bool(self.probe_workers)
 
     def add_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Chọn các file PDF", "", "PDF Files (*.pdf)")
-        for file in files:
-            self.add_file_if_not_exists(file)
+        if files:
+            self.add_paths(files)
 
     def clear_files(self):
-        self.file_list.clear()
+        for worker in self.probe_workers:
+            worker.stop()
+        self.file_model.clear()
         self.progress.setValue(0)
         self.log("🗑 Đã xoá toàn bộ danh sách.")
 
+    def _current_row(self):
+        index = self.file_list.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def _select_row(self, row):
+        self.file_list.selectRow(row)
+
     def move_up(self):
-        current_row = self.file_list.currentRow()
-        if current_row > 0:
-            current_item = self.file_list.takeItem(current_row)
-            self.file_list.insertItem(current_row - 1, current_item)
-            self.file_list.setCurrentRow(current_row - 1)
+        current_row = self._current_row()
+        if current_row > 0 and self.file_model.move_row(current_row, -1):
+            self._select_row(current_row - 1)
             self.log("⬆️ Di chuyển file lên.")
 
     def move_down(self):
-        current_row = self.file_list.currentRow()
-        if current_row < self.file_list.count() - 1:
-            current_item = self.file_list.takeItem(current_row)
-            self.file_list.insertItem(current_row + 1, current_item)
-            self.file_list.setCurrentRow(current_row + 1)
+        current_row = self._current_row()
+        if current_row != -1 and self.file_model.move_row(current_row, 1):
+            self._select_row(current_row + 1)
             self.log("⬇️ Di chuyển file xuống.")
 
     def delete_selected(self):
-        row = self.file_list.currentRow()
-        if row != -1:
-            file_name = self.file_list.item(row).text()
-            self.file_list.takeItem(row)
-            self.log(f"❌ Đã xoá: {file_name}")
+        row = self._current_row()
+        if row != -1 and not self.is_merging():
+            removed = self.file_model.remove_row(row)
+            self.log(f"❌ Đã xoá: {removed['path']}")
 
     def keyPressEventOverride(self, event):
         if event.key() == Qt.Key_Delete:
             self.delete_selected()
         else:
-            QListWidget.keyPressEvent(self.file_list, event)
+            QTableView.keyPressEvent(self.file_list, event)
 
-    def merge_files(self):
-        count = self.file_list.count()
+    def _files_to_merge(self, min_count):
+        """Kiểm tra danh sách trước khi ghép; trả về các file hợp lệ hoặc None nếu không ghép."""
+        count = len(self.file_model.rows)
         if count == 0:
             QMessageBox.warning(self, "Lỗi", "Bạn chưa chọn file nào!")
+            return None
+        if count < min_count:
+            QMessageBox.warning(self, "Lỗi", f"Cần ít nhất {min_count} file để ghép!")
+            return None
+
+        if self.is_merging():
+            return None
+        if self.is_probing():
+            QMessageBox.information(self, "Đang kiểm tra", "Vui lòng chờ kiểm tra xong các file vừa thêm.")
+            return None
+
+        # File lỗi được phát hiện từ lúc thêm: hỏi một lần rồi bỏ qua chúng
+        bad_rows = [row for row in self.file_model.rows if row["status"] == STATUS_BAD]
+        if bad_rows:
+            report = "\n".join(f"{row['path']}: {row['error']}" for row in bad_rows)
+            box = QMessageBox(QMessageBox.Warning, "File lỗi",
+                              f"Có {len(bad_rows)} file không đọc được và sẽ bị bỏ qua. Tiếp tục ghép?",
+                              QMessageBox.Yes | QMessageBox.No, self)
+            box.setDetailedText(report)
+            if box.exec_() != QMessageBox.Yes:
+                return None
+        file_paths = [row["path"] for row in self.file_model.rows if row["status"] != STATUS_BAD]
+        if len(file_paths) < min_count:
+            QMessageBox.warning(self, "Lỗi", f"Cần ít nhất {min_count} file hợp lệ để ghép!")
+            return None
+        return file_paths
+
+    def merge_files(self):
+        if self.is_merging() or self.is_compacting():
             return
-        if count < 2:
-            QMessageBox.warning(self, "Lỗi", "Cần ít nhất 2 file để ghép!")
+        file_paths = self._files_to_merge(2)
+        if not file_paths:
             return
 
-        merger = PdfMerger()
-        file_paths = [self.file_list.item(i).text() for i in range(count)]
+        base_name = os.path.splitext(os.path.basename(file_paths[0]))[0]
+        folder_hint = os.path.dirname(file_paths[0])
 
-        self.progress.setMaximum(count)
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Lưu file PDF đã ghép",
+            os.path.join(folder_hint, f"{base_name}_merged.pdf"),
+            "PDF Files (*.pdf)"
+        )
+        if not save_path:
+            return
+        self._start_merge(MergeWorker(file_paths, save_path, self.backend_combo.currentData(),
+                                      self.compact_check.isChecked(), page_specs=self.file_model.page_specs()))
+
+    def append_files(self):
+        if self.is_merging() or self.is_compacting():
+            return
+        file_paths = self._files_to_merge(1)
+        if not file_paths:
+            return
+        target, _ = QFileDialog.getOpenFileName(
+            self, "Chọn file PDF để ghép nối vào", os.path.dirname(file_paths[0]), "PDF Files (*.pdf)")
+        if not target:
+            return
+        if normalize_path(target) in self.file_model.by_key:
+            QMessageBox.warning(self, "Lỗi", "File đích đang nằm trong danh sách ghép, hãy xoá nó khỏi danh sách.")
+            return
+        self.log(f"📥 Ghép nối {len(file_paths)} file vào: {target}")
+        self._start_merge(MergeWorker(file_paths, target, append=True, page_specs=self.file_model.page_specs()))
+
+    def _start_merge(self, worker):
         self.progress.setValue(0)
+        self.speed_label.setText("⚡ -- trang/giây | Còn lại: --:--:--")
 
-        try:
-            for i, file in enumerate(file_paths, 1):
-                try:
-                    merger.append(file)
-                    self.log(f"📎 Đã thêm: {file}")
-                except Exception as e:
-                    QMessageBox.warning(self, "Lỗi", f"Không thể thêm file:\n{file}\n{e}")
-                self.progress.setValue(i)
-
-            base_name = os.path.splitext(os.path.basename(file_paths[0]))[0]
-            folder_hint = os.path.dirname(file_paths[0])
-
-            save_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Lưu file PDF đã ghép",
-                os.path.join(folder_hint, f"{base_name}_merged.pdf"),
-                "PDF Files (*.pdf)"
-            )
-            if save_path:
-                merger.write(save_path)
-                merger.close()
-                self.progress.setValue(count)
-                self.log(f"✅ Đã ghép và lưu file: {save_path}")
-                QMessageBox.information(self, "Thành công", f"Đã lưu file:\n{save_path}")
+        self.merge_worker = worker
+        self.merge_worker.log_signal.connect(self.log)
+        self.merge_worker.progress_signal.connect(self._on_merge_progress)
+        self.merge_worker.speed_signal.connect(self._on_merge_speed)
+        self.merge_worker.status_signal.connect(self.progress.setFormat)
+        self.merge_worker.done_signal.connect(self._on_merge_done)
+        self.merge_worker.start()
+        self._set_merge_controls(True)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Đã xảy ra lỗi:\n{str(e)}")
+    def is_merging(self):
+        return self.merge_worker is not None and self.merge_worker.isRunning()
+
+    def is_compacting(self):
+        return self.compact_worker is not None and self.compact_worker.isRunning()
+
+    def _set_merge_controls(self, running):
+        for btn in (self.add_button, self.merge_button, self.append_button, self.compact_button, self.clear_button,
+                    self.up_button, self.down_button, self.delete_button, self.backend_combo,
+                    self.compact_check):
+            btn.setEnabled(not running)
+        self.setAcceptDrops(not running)
+        if self.is_compacting():
+            self._set_compact_controls(True)
+        self.file_list.setEditTriggers(QAbstractItemView.NoEditTriggers if running else self.EDIT_TRIGGERS)
+        self.speed_label.setVisible(running)
+        self.cancel_button.setVisible(running)
+        self.cancel_button.setEnabled(running)
+        if not running:
+            self.progress.setFormat("%p%")
+
+    def _set_compact_controls(self, running):
+        """
+        Trong lúc thu gọn không cho ghép/ghép nối: tránh hai luồng MuPDF chạy cùng
+        lúc và tránh ghép nối vào chính file đang bị thu gọn rồi thay thế.
+        """
+        for btn in (self.merge_button, self.append_button, self.compact_button):
+            btn.setEnabled(not running)
+        self.setAcceptDrops(not running)
+
+    def compact_pdf(self):
+        if self.is_merging() or self.is_compacting():
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Chọn file PDF cần thu gọn", "", "PDF Files (*.pdf)")
+        if not path:
+            return
+        self.log(f"🗜 Đang thu gọn: {path}")
+        self.compact_worker = CompactWorker(path)
+        self.compact_worker.done_signal.connect(self._on_compact_done)
+        self.compact_worker.start()
+        self._set_compact_controls(True)
+
+    def _on_compact_done(self, path, before, after, error):
+        self.compact_worker.wait()  # done_signal phát ngay trước khi luồng kết thúc
+        self._set_compact_controls(self.is_merging())
+        if error:
+            self.log(f"❌ Không thu gọn được {path}: {error}")
+            QMessageBox.critical(self, "Lỗi", f"Không thu gọn được file:\n{error}")
+            return
+        self.log(f"🗜 Đã thu gọn {path}: {before:.1f} MB → {after:.1f} MB")
+        QMessageBox.information(self, "Thành công", f"Đã thu gọn file:\n{path}\n{before:.1f} MB → {after:.1f} MB")
+
+    def cancel_merge(self):
+        if self.is_merging():
+            self.merge_worker.stop()
+            self.cancel_button.setEnabled(False)
+            self.log("⛔ Đang hủy ghép...")
+
+    def _on_merge_progress(self, done, total):
+        self.progress.setMaximum(max(total, 1))
+        self.progress.setValue(done)
+
+    def _on_merge_speed(self, rate, remaining):
+        self.speed_label.setText(f"⚡ {rate:.1f} trang/giây | Còn lại: {remaining}")
+
+    def _on_merge_done(self, save_path, failures, cancelled):
+        self._set_merge_controls(False)
+        if cancelled:
             self.progress.setValue(0)
+            self.log("⛔ Đã hủy ghép, không ghi file kết quả.")
+            return
+
+        # Một báo cáo duy nhất cho mọi file lỗi thay vì một hộp thoại mỗi file
+        report = "\n".join(f"{path}: {error}" for path, error in failures)
+        if not save_path:
+            box = QMessageBox(QMessageBox.Critical, "Lỗi", "Không ghép được file nào.", parent=self)
+            if report:
+                box.setDetailedText(report)
+            box.exec_()
+            self.progress.setValue(0)
+            return
+
+        self.log(f"✅ Đã ghép và lưu file: {save_path}")
+        if failures:
+            box = QMessageBox(QMessageBox.Warning, "Hoàn tất (có lỗi)",
+                              f"Đã lưu file:\n{save_path}\n\nBỏ qua {len(failures)} file lỗi (xem chi tiết).",
+                              parent=self)
+            box.setDetailedText(report)
+            box.exec_()
+        else:
+            QMessageBox.information(self, "Thành công", f"Đã lưu file:\n{save_path}")
+
+    def closeEvent(self, event):
+        if self.is_merging():
+            self.merge_worker.stop()
+            self.merge_worker.wait()
+        if self.compact_worker and self.compact_worker.isRunning():
+            self.compact_worker.wait()
+        for worker in list(self.probe_workers):
+            worker.stop()
+            worker.wait()
+        event.accept()
@@ -0,0 +1,53 @@
+"""
+Kiểm tra nhanh file PDF trước khi ghép, dùng cho PDFMergerTool.
+
+Không phụ thuộc Qt để chạy được trong tiến trình con (ProcessPoolExecutor):
+MuPDF không an toàn khi nhiều luồng cùng gọi, nên muốn kiểm tra song song thật
+thì mỗi tiến trình mở một file.
+
+Ngoài số trang và mã hoá, probe_pdf đọc luồng nội dung của từng trang và thu
+cảnh báo của MuPDF để phát hiện file hỏng mà MuPDF vẫn tự sửa được khi mở (file
+bị cắt cụt, bảng xref hỏng, luồng nén hỏng) - các file này vẫn ghép được nhưng
+có thể thiếu nội dung.
+"""
+import os
+
+import fitz
+
+
+def _damage(doc, warnings):
+    """Mô tả hỏng hóc từ cờ sửa xref và cảnh báo của MuPDF, "" nếu file lành."""
+    if doc.is_repaired:
+        return "Cấu trúc file hỏng (xref), MuPDF đã tự sửa khi mở"
+    for line in warnings.splitlines():
+        line = line.strip()
+        if line:
+            return f"Dữ liệu hỏng: {line}"
+    return ""
+
+
+def probe_pdf(path):
+    """
+    Đọc thông tin một file PDF (chạy trong tiến trình con).
+    Trả về dict: pages, size, encrypted, error ("" nếu đọc được),
+    damage ("" nếu không phát hiện hỏng hóc).
+    """
+    info = {"pages": None, "size": None, "encrypted": False, "error": "", "damage": ""}
+    try:
+        info["size"] = os.path.getsize(path)
+        fitz.TOOLS.mupdf_display_errors(False)  # lỗi được thu qua mupdf_warnings thay vì in ra stderr
+        fitz.TOOLS.mupdf_warnings(reset=True)
+        with fitz.open(path) as doc:
+            info["encrypted"] = bool(doc.needs_pass or doc.is_encrypted)
+            if doc.needs_pass and not doc.authenticate(""):
+                raise ValueError("Cần mật khẩu để mở")
+            info["encrypted"] = info["encrypted"] or bool((doc.metadata or {}).get("encryption"))
+            info["pages"] = doc.page_count
+            if not info["pages"]:
+                raise ValueError("File không có trang nào")
+            for page in doc:
+                page.read_contents()  # giải nén luồng nội dung: lộ ra luồng hỏng
+            info["damage"] = _damage(doc, fitz.TOOLS.mupdf_warnings(reset=True))
+    except Exception as e:
+        info["error"] = str(e) or type(e).__name__
+    return info
@@ -1,38 +1,283 @@
 import os
+import time
+import datetime
 import fitz
 import tempfile
 import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
-    QFileDialog, QMessageBox, QScrollArea, QLineEdit, QFrame,
-    QInputDialog, QTextEdit, QGroupBox, QGridLayout
+    QFileDialog, QMessageBox, QScrollArea, QLineEdit,
+    QTextEdit, QGroupBox, QGridLayout, QProgressBar, QCheckBox,
+    QShortcut, QDoubleSpinBox, QSpinBox
 )
-from PyQt5.QtGui import QPixmap, QImage, QCursor
-from PyQt5.QtCore import Qt, QSize, QTimer
+from PyQt5.QtGui import QPixmap, QImage, QCursor, QKeySequence
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
+
+from tools.split_engine import (
+    CHUNK_PAGES, SAVE_COMPACT, SAVE_PLAIN, SplitManifest, SplitPart, build_spans,
+    ranges_to_spans, span_page_count, chunk_parts, make_unique_dir, default_workers,
+    process_context, _init_worker, write_part, write_parts
+)
+from tools.split_analyzer import BLANK_INK_RATIO, analyse_chunk, outline_starts, propose_ranges
+from tools.split_by_size import iter_size_parts
+from tools.page_index_map import PageIndexMap
+from tools.page_preview import PagePreview
+from tools.thumb_prefetch import DEFAULT_ROWS_AHEAD, PrefetchScheduler
+from tools.split_edit_log import EditLog, DeletePagesOp, SplitOp, ReplacePartsOp, CompoundOp
+
+
+class ChunkPoolWorker(QThread):
+    """
+    Khung chung cho các worker của trình tách: việc được chia thành từng lát,
+    chạy trong các tiến trình con (mỗi tiến trình mở file nguồn một lần).
+    Việc ít thì chạy ngay trong luồng này để tránh chi phí khởi động tiến trình.
+    """
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)
+    speed_signal = pyqtSignal(float, str)  # (trang/giây, thời gian còn lại)
+
+    def __init__(self, src_path, max_workers=None):
+        super().__init__()
+        self.src_path = src_path
+        self.max_workers = max_workers or default_workers()
+        self._is_running = True
+        self.start_time = None
+        self.results = []  # kết quả các lát theo thứ tự xong, nếu lớp con không xử lý riêng
+
+    def stop(self):
+        self._is_running = False
+
+    def run_chunks(self, func, chunks, **kwargs):
+        """
+        Chạy func(chunk, **kwargs) cho từng lát, gọi chunk_finished với kết quả.
+        Lát nào lỗi (kể cả tiến trình con chết) thì gọi chunk_failed, các lát khác vẫn chạy tiếp.
+        """
+        workers = min(self.max_workers, len(chunks))
+        if workers <= 1:
+            src = fitz.open(self.src_path)
+            try:
+                for chunk in chunks:
+                    if not self._is_running:
+                        break
+                    try:
+                        result = func(chunk, doc=src, **kwargs)
+                    except Exception as e:
+                        self.chunk_failed(chunk, str(e))
+                        continue
+                    self.chunk_finished(result)
+            finally:
+                src.close()
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context(),
+                                 initializer=_init_worker, initargs=(self.src_path,)) as pool:
+            futures = {pool.submit(func, chunk, **kwargs): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                if not self._is_running:
+                    for f in futures:
+                        f.cancel()
+                    break
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.chunk_failed(futures[future], str(e) or type(e).__name__)
+                    continue
+                self.chunk_finished(result)
+
+    def chunk_finished(self, result):
+        """Mặc định chỉ gom kết quả; lớp con ghi đè để báo tiến trình ngay khi từng lát xong."""
+        self.results.append(result)
+
+    def chunk_failed(self, chunk, error):
+        self.log_signal.emit(f"❌ Lỗi khi xử lý một lát: {error}")
+
+    def emit_speed(self, pages_done, total_pages):
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        rate = pages_done / elapsed
+        remaining = (total_pages - pages_done) / rate if rate else 0
+        self.speed_signal.emit(rate, str(datetime.timedelta(seconds=int(remaining))))
+
+
+class SplitWorker(ChunkPoolWorker):
+    """
+    Ghi các phần đã tách ra file trong các tiến trình con.
+    parts: danh sách (out_path, spans) theo thứ tự đầu ra. Các phần được gom
+    thành từng lát; mỗi tiến trình con mở file nguồn một lần rồi ghi các lát
+    được giao.
+    """
+    done_signal = pyqtSignal(list, bool)  # (các out_path đã ghi, bị hủy hay không)
+
+    def __init__(self, src_path, parts, save_options=None, max_workers=None):
+        super().__init__(src_path, max_workers)
+        self.parts = parts
+        self.save_options = save_options or SAVE_PLAIN
+        self.total_pages = 0
+        self.pages_done = 0
+        self.files_done = 0
+        self.written = []
+
+    def run(self):
+        self.start_time = time.time()
+        self.total_pages = sum(span_page_count(spans) for _, spans in self.parts)
+        try:
+            self.run_chunks(write_parts, chunk_parts(self.parts), **self.save_options)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi khi ghi file tách: {e}")
+        self.done_signal.emit(self.written, not self._is_running)
+
+    def chunk_finished(self, result):
+        done, errors = result
+        for out_path, page_count in done:
+            self.written.append(out_path)
+            self.pages_done += page_count
+        for out_path, error in errors:
+            self.log_signal.emit(f"❌ Lỗi khi ghi {os.path.basename(out_path)}: {error}")
+        self.files_done += len(done) + len(errors)
+        self.progress_signal.emit(self.files_done, len(self.parts))
+        self.emit_speed(self.pages_done, self.total_pages)
+
+    def chunk_failed(self, chunk, error):
+        # Mọi phần của lát coi như ghi lỗi
+        self.chunk_finished(([], [(out_path, error) for out_path, _ in chunk]))
+
+
+class SplitAnalysisWorker(ChunkPoolWorker):
+    """
+    Đo các trang (tỉ lệ mực, kích thước) trong tiến trình con rồi dựng các
+    khoảng tách gợi ý từ trang trắng, đổi khổ giấy và mục lục.
+    """
+    done_signal = pyqtSignal(list, bool)  # ([(start, end, lý do)], bị hủy hay không)
+
+    def __init__(self, src_path, kept_pages, use_blank, use_size, use_outline,
+                 blank_ratio=BLANK_INK_RATIO, max_workers=None):
+        super().__init__(src_path, max_workers)
+        self.kept_pages = kept_pages
+        self.blank_ratio = blank_ratio
+        self.use_blank = use_blank
+        self.use_size = use_size
+        self.use_outline = use_outline
+        self.page_info = {}
+
+    def run(self):
+        self.start_time = time.time()
+        ranges = []
+        try:
+            chunks = [self.kept_pages[i:i + CHUNK_PAGES] for i in range(0, len(self.kept_pages), CHUNK_PAGES)]
+            if self.use_blank:
+                self.run_chunks(analyse_chunk, chunks)
+            else:
+                # Không cần render, chỉ đọc kích thước trang
+                self._read_sizes()
+
+            toc_starts = set()
+            if self.use_outline:
+                with fitz.open(self.src_path) as doc:
+                    toc_starts = outline_starts(doc)
+
+            if self._is_running:
+                ranges = propose_ranges(self.kept_pages, self.page_info, toc_starts,
+                                        self.use_blank, self.use_size, self.use_outline,
+                                        self.blank_ratio)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi khi phân tích điểm tách: {e}")
+        self.done_signal.emit(ranges, not self._is_running)
+
+    def _read_sizes(self, pages=None):
+        with fitz.open(self.src_path) as doc:
+            for pno in self.kept_pages if pages is None else pages:
+                if not self._is_running:
+                    break
+                rect = doc[pno].rect
+                self.page_info[pno] = (1.0, rect.width, rect.height)
+        self.progress_signal.emit(len(self.page_info), len(self.kept_pages))
+
+    def chunk_finished(self, result):
+        for pno, ink, width, height in result:
+            self.page_info[pno] = (ink, width, height)
+        self.progress_signal.emit(len(self.page_info), len(self.kept_pages))
+        self.emit_speed(len(self.page_info), len(self.kept_pages))
+
+    def chunk_failed(self, chunk, error):
+        # Không đo được mực: coi các trang là không trắng, vẫn tách theo khổ giấy/mục lục
+        self.log_signal.emit(f"❌ Không phân tích được trang {chunk[0] + 1}–{chunk[-1] + 1}: {error}")
+        self._read_sizes(chunk)
+
+
+class SizeSplitWorker(ChunkPoolWorker):
+    """
+    Chia các trang còn giữ thành các phần không vượt quá max_bytes.
+    Mỗi phần phụ thuộc điểm kết thúc của phần trước nên chạy tuần tự trong luồng
+    này; ước lượng chỉ đọc metadata, việc lưu thử diễn ra trong bộ nhớ.
+    """
+    done_signal = pyqtSignal(list, bool)  # ([(start, end, dung lượng thật)], bị hủy hay không)
+
+    def __init__(self, src_path, kept_pages, max_bytes, save_options=None):
+        super().__init__(src_path, 1)
+        self.kept_pages = kept_pages
+        self.max_bytes = max_bytes
+        self.save_options = save_options or SAVE_PLAIN
+
+    def run(self):
+        self.start_time = time.time()
+        ranges = []
+        pages_done = 0
+        try:
+            with fitz.open(self.src_path) as doc:
+                for part, estimated, actual in iter_size_parts(doc, self.kept_pages, self.max_bytes,
+                                                               **self.save_options):
+                    if not self._is_running:
+                        break
+                    ranges.append((part[0], part[-1], actual))
+                    pages_done += len(part)
+                    self.log_signal.emit(
+                        f"📦 Trang gốc {part[0] + 1} → {part[-1] + 1}: ước lượng "
+                        f"{estimated / 1048576:.2f} MB, thực tế {actual / 1048576:.2f} MB")
+                    self.progress_signal.emit(pages_done, len(self.kept_pages))
+                    self.emit_speed(pages_done, len(self.kept_pages))
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi khi chia theo dung lượng: {e}")
+        self.done_signal.emit(ranges, not self._is_running)
+
 
 class PDFSplitterApp(QWidget):
     def __init__(self):
         super().__init__()
         self.doc = None
         self.pdf_path = None
-        self.original_page_map = []
-        self.next_start_page_index = 0
-        self.page_labels = {}
+        # Trang xóa chỉ được đánh dấu trong page_map, self.doc luôn là bản gốc
+        self.page_map = PageIndexMap(0)
+        self.next_start_page = None
+        self.page_labels = {}  # số trang gốc -> QLabel
 
         self.manual_mode = False
         self.delete_mode = False
         self.temp_dir = tempfile.mkdtemp()
         self.split_count = 1
+        self.manifest = SplitManifest()
+        self.edit_log = EditLog()
+        self.split_label = ""
+        self.save_target_dir = None
         self.last_dir = os.path.expanduser("~")
         self.loaded_pages = 0
         self.resize_timer = QTimer(self)
         self.resize_timer.setSingleShot(True)
         self.resize_timer.timeout.connect(self._on_resize_timer)
-        self.used_pages = set()
+        self.used_pages = bytearray()  # bitmap theo số trang gốc
         self.page_load_iterator = None
         self.is_loading_more = False
+        # Thumbnail chỉ được render khi sắp cuộn tới (xem PrefetchScheduler)
+        self.prefetcher = PrefetchScheduler()
+        self.thumb_queue = deque()
+        self.thumb_rendered = set()
+        self.grid_pages = []  # số trang gốc theo thứ tự trong lưới
+        self.grid_cols = 1
+        self.thumb_timer = QTimer(self)
+        self.thumb_timer.timeout.connect(self._render_queued_thumbnails)
         self.thumb_width = 280
         self.thumb_height = 360
+        self.split_worker = None
 
         self.initUI()
         self.setWindowTitle("PDF Splitter - TKT")
@@ -52,10 +297,23 @@ class PDFSplitterApp(QWidget):
         self.delete_btn.clicked.connect(self.toggle_delete_mode)
         
         self.reset_delete_btn = QPushButton("↩️ Phục hồi trang")
-        self.reset_delete_btn.setToolTip("Tải lại file PDF gốc, hủy mọi thay đổi (xóa trang, tách dở dang).")
+        self.reset_delete_btn.setToolTip("Phục hồi mọi trang đã xóa và hủy tiến trình tách dở dang (có thể hoàn tác).")
         self.reset_delete_btn.clicked.connect(self.revert_deletions)
         self.reset_delete_btn.setEnabled(False)
 
+        self.undo_btn = QPushButton("↶ Hoàn tác")
+        self.undo_btn.setToolTip("Hoàn tác thao tác xóa/tách gần nhất (Ctrl+Z).")
+        self.undo_btn.clicked.connect(self.undo_edit)
+        self.undo_btn.setEnabled(False)
+
+        self.redo_btn = QPushButton("↷ Làm lại")
+        self.redo_btn.setToolTip("Làm lại thao tác vừa hoàn tác (Ctrl+Y).")
+        self.redo_btn.clicked.connect(self.redo_edit)
+        self.redo_btn.setEnabled(False)
+
+        QShortcut(QKeySequence.Undo, self, self.undo_edit)
+        QShortcut(QKeySequence.Redo, self, self.redo_edit)
+
         self.reset_manual_btn = QPushButton("🔄 Reset Tách")
         self.reset_manual_btn.setToolTip("Xóa tiến trình tách thủ công, không phục hồi trang đã xóa.")
         self.reset_manual_btn.clicked.connect(self.reset_manual_split)
@@ -69,16 +327,28 @@ class PDFSplitterApp(QWidget):
         toolbar.addWidget(self.manual_btn)
         toolbar.addWidget(self.delete_btn)
         toolbar.addWidget(self.reset_delete_btn)
+        toolbar.addWidget(self.undo_btn)
+        toolbar.addWidget(self.redo_btn)
         toolbar.addWidget(self.reset_manual_btn)
         toolbar.addWidget(self.save_btn)
         toolbar.addStretch()
 
+        self.rows_ahead_spin = QSpinBox()
+        self.rows_ahead_spin.setRange(0, 20)
+        self.rows_ahead_spin.setValue(DEFAULT_ROWS_AHEAD)
+        self.rows_ahead_spin.setSuffix(" hàng")
+        self.rows_ahead_spin.setToolTip("Số hàng thumbnail được tải trước theo hướng cuộn. Cuộn nhanh sẽ tải thêm.")
+        self.rows_ahead_spin.valueChanged.connect(self._on_rows_ahead_changed)
+        toolbar.addWidget(QLabel("Tải trước:"))
+        toolbar.addWidget(self.rows_ahead_spin)
+
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidgetResizable(True)
         self.page_container = QWidget()
         self.page_layout = QGridLayout(self.page_container)
         self.page_layout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
         self.scroll_area.setWidget(self.page_container)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.check_scroll_position)
 
         # --- Bảng điều khiển bên phải ---
         self.range_container = QWidget()
@@ -90,20 +360,76 @@ class PDFSplitterApp(QWidget):
         self.range_scroll.setWidget(self.range_container)
         self.add_btn = QPushButton("+ Thêm khoảng")
         self.add_btn.setToolTip("Thêm một dòng mới để nhập khoảng trang cần tách.")
-        self.add_btn.clicked.connect(self.add_split_row)
+        self.add_btn.clicked.connect(lambda: self.add_split_row())
         self.start_btn = QPushButton("🚀 Tách PDF")
         self.start_btn.setToolTip("Bắt đầu tách PDF theo các khoảng trang đã nhập ở trên.")
         self.start_btn.clicked.connect(self.start_auto_split)
         self.split_single_btn = QPushButton("⚡ Tách từng trang")
         self.split_single_btn.setToolTip("Tách tất cả các trang trong file thành các file PDF riêng lẻ.")
         self.split_single_btn.clicked.connect(self.split_single_pages)
+        self.compact_check = QCheckBox("Nén file đầu ra (garbage/deflate)")
+        self.compact_check.setToolTip("Dọn đối tượng thừa và nén stream khi lưu. Chậm hơn nhưng file nhỏ hơn.")
+        self.direct_check = QCheckBox("Ghi thẳng vào thư mục đích")
+        self.direct_check.setToolTip("Chỉ ghi nhận các phần khi tách; file được ghi một lần duy nhất vào thư mục kết quả khi bấm Lưu.")
+        self.direct_check.setChecked(True)
+        self.split_progress = QProgressBar()
+        self.split_progress.setAlignment(Qt.AlignCenter)
+        self.split_progress.hide()
+        self.split_speed_label = QLabel()
+        self.split_speed_label.hide()
+        self.cancel_split_btn = QPushButton("⛔ Hủy tách")
+        self.cancel_split_btn.setToolTip("Dừng quá trình ghi file đang chạy.")
+        self.cancel_split_btn.clicked.connect(self.cancel_split)
+        self.cancel_split_btn.hide()
         range_group = QGroupBox("📑 Tách tự động theo khoảng")
         range_group_layout = QVBoxLayout()
         range_group_layout.addWidget(self.range_scroll)
         range_group_layout.addWidget(self.add_btn)
         range_group_layout.addWidget(self.start_btn)
         range_group_layout.addWidget(self.split_single_btn)
+        range_group_layout.addWidget(self.compact_check)
+        range_group_layout.addWidget(self.direct_check)
+        range_group_layout.addWidget(self.split_progress)
+        range_group_layout.addWidget(self.split_speed_label)
+        range_group_layout.addWidget(self.cancel_split_btn)
         range_group.setLayout(range_group_layout)
+
+        self.detect_blank_check = QCheckBox("Trang trắng (tờ phân cách)")
+        self.detect_blank_check.setChecked(True)
+        self.blank_ratio_spin = QDoubleSpinBox()
+        self.blank_ratio_spin.setDecimals(3)
+        self.blank_ratio_spin.setRange(0.001, 5.0)
+        self.blank_ratio_spin.setSingleStep(0.01)
+        self.blank_ratio_spin.setSuffix(" % mực")
+        self.blank_ratio_spin.setValue(BLANK_INK_RATIO * 100)
+        self.blank_ratio_spin.setToolTip("Trang có tỉ lệ điểm ảnh có mực dưới ngưỡng này được coi là trang trắng.")
+        self.detect_size_check = QCheckBox("Đổi khổ / hướng giấy")
+        self.detect_size_check.setChecked(True)
+        self.detect_outline_check = QCheckBox("Mục lục (outline) của PDF")
+        self.detect_outline_check.setChecked(True)
+        self.analyse_btn = QPushButton("🔍 Phân tích điểm tách")
+        self.analyse_btn.setToolTip("Gợi ý các khoảng trang và điền vào bảng khoảng ở trên. Có thể sửa trước khi tách.")
+        self.analyse_btn.clicked.connect(self.analyse_split_points)
+        self.max_size_spin = QDoubleSpinBox()
+        self.max_size_spin.setDecimals(1)
+        self.max_size_spin.setRange(0.1, 2048.0)
+        self.max_size_spin.setValue(10.0)
+        self.max_size_spin.setSuffix(" MB")
+        self.max_size_spin.setToolTip("Mỗi phần sau khi lưu (theo tuỳ chọn nén hiện tại) không vượt quá dung lượng này.")
+        self.size_split_btn = QPushButton("📦 Chia theo dung lượng")
+        self.size_split_btn.setToolTip("Gom các trang liên tiếp thành từng phần dưới dung lượng tối đa và điền vào bảng khoảng.")
+        self.size_split_btn.clicked.connect(self.split_by_size)
+        analyse_group = QGroupBox("🔍 Gợi ý điểm tách")
+        analyse_group_layout = QVBoxLayout()
+        analyse_group_layout.addWidget(self.detect_blank_check)
+        analyse_group_layout.addWidget(self.blank_ratio_spin)
+        analyse_group_layout.addWidget(self.detect_size_check)
+        analyse_group_layout.addWidget(self.detect_outline_check)
+        analyse_group_layout.addWidget(self.analyse_btn)
+        analyse_group_layout.addWidget(QLabel("Dung lượng tối đa mỗi phần:"))
+        analyse_group_layout.addWidget(self.max_size_spin)
+        analyse_group_layout.addWidget(self.size_split_btn)
+        analyse_group.setLayout(analyse_group_layout)
         
         self.log_box = QTextEdit()
         self.log_box.setReadOnly(True)
@@ -116,11 +442,18 @@ class PDFSplitterApp(QWidget):
         
         right_panel = QVBoxLayout()
         right_panel.addWidget(range_group)
+        right_panel.addWidget(analyse_group)
         right_panel.addStretch()
         right_panel.addWidget(log_group)
         
+        # Khung xem trước trang được nhấp (ngoài chế độ tách/xóa), ẩn cho tới khi dùng
+        self.preview = PagePreview()
+        self.preview.step_requested.connect(self._preview_step)
+        self.preview.hide()
+
         content_layout = QHBoxLayout()
         content_layout.addWidget(self.scroll_area, 4)
+        content_layout.addWidget(self.preview, 3)
         content_layout.addLayout(right_panel, 1)
         
         main_layout = QVBoxLayout()
@@ -135,70 +468,128 @@ class PDFSplitterApp(QWidget):
             if child.widget():
                 child.widget().deleteLater()
         self.page_labels.clear()
+        self.grid_pages = []
+        self.thumb_rendered.clear()
+        self.thumb_queue.clear()
+        self.thumb_timer.stop()
 
     def _load_page_chunk(self):
-        # Lấy số cột hiện tại để thêm widget cho đúng
+        """
+        Tạo ô giữ chỗ cho các trang, mỗi lượt 200 ô để không chặn giao diện.
+        Ô giữ chỗ chưa có ảnh; thumbnail được render dần theo vị trí cuộn.
+        """
         cols = max(1, (self.scroll_area.width() - 30) // (self.thumb_width + 20))
-        
-        # Mỗi lần chỉ xử lý 5 trang để tránh chặn giao diện
-        for _ in range(5):
+        self.grid_cols = cols
+
+        for _ in range(200):
             try:
-                # Lấy trang tiếp theo từ danh sách cần tải
-                i = next(self.page_load_iterator)
+                # Lấy trang gốc tiếp theo từ danh sách cần tải
+                original_num = next(self.page_load_iterator)
             except StopIteration:
                 # Nếu không còn trang nào, quá trình tải đã xong
                 self.is_loading_more = False
                 self.setEnabled(True)
                 QApplication.restoreOverrideCursor()
                 self.log("✅ Tải trang hoàn tất.")
+                self._schedule_prefetch()
                 return # Kết thúc
 
-            original_num = self.original_page_map[i]
-            if original_num in self.used_pages:
+            self.loaded_pages = original_num + 1
+            if self.used_pages[original_num] or not self.page_map.is_kept(original_num):
                 continue
 
-            page = self.doc[i]
-            pix = page.get_pixmap()
-            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-            scaled_pixmap = QPixmap.fromImage(image).scaled(
-                self.thumb_width, self.thumb_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            
-            label = QLabel()
-            label.setPixmap(scaled_pixmap)
+            label = QLabel(str(original_num + 1))
             label.setAlignment(Qt.AlignCenter)
             label.setFixedSize(self.thumb_width + 10, self.thumb_height + 10)
             label.setCursor(Qt.PointingHandCursor)
-            label.mousePressEvent = lambda e, num=i: self.page_clicked(num)
+            label.mousePressEvent = lambda e, num=original_num: self.page_clicked(num)
+            # Chú thích tính lúc rê chuột vì vị trí sau khi xóa đổi theo mỗi lần xóa/hoàn tác
+            label.enterEvent = lambda e, num=original_num, lbl=label: lbl.setToolTip(self._page_caption(num))
 
-            current_item_count = len(self.page_labels)
+            current_item_count = len(self.grid_pages)
             row = current_item_count // cols
             col = current_item_count % cols
             
-            self.page_labels[i] = label
+            self.page_labels[original_num] = label
+            self.grid_pages.append(original_num)
             self.page_layout.addWidget(label, row, col)
-            self.loaded_pages += 1
 
+        self._schedule_prefetch()
         QTimer.singleShot(0, self._load_page_chunk)
+
+    def _visible_rows(self):
+        """(hàng đầu, hàng cuối, chiều cao một hàng) của vùng đang nhìn thấy trong lưới."""
+        if not self.grid_pages:
+            return 0, -1, 0
+        first_label = self.page_labels.get(self.grid_pages[0])
+        row_pitch = (first_label.height() if first_label else self.thumb_height + 10) + self.page_layout.verticalSpacing()
+        top = self.page_layout.contentsMargins().top()
+        value = self.scroll_area.verticalScrollBar().value()
+        height = self.scroll_area.viewport().height()
+        first_row = max(0, (value - top) // row_pitch)
+        last_row = max(first_row, (value + height - top) // row_pitch)
+        return first_row, last_row, row_pitch
+
+    def _schedule_prefetch(self):
+        """Dựng lại hàng đợi render: trang đã cuộn qua bị bỏ, trang sắp tới được ưu tiên."""
+        if not self.doc:
+            return
+        first_row, last_row, row_pitch = self._visible_rows()
+        queue = self.prefetcher.plan(self.grid_pages, self.grid_cols, first_row, last_row,
+                                     row_pitch, self.thumb_rendered)
+        self.thumb_queue = deque(queue)
+        if self.thumb_queue:
+            self.thumb_timer.start(0)
+        else:
+            self.thumb_timer.stop()
+
+    def _render_queued_thumbnails(self):
+        """Render thumbnail trong hàng đợi, mỗi lượt tối đa ~15 ms để giao diện vẫn mượt."""
+        deadline = time.perf_counter() + 0.015
+        while self.thumb_queue and time.perf_counter() < deadline:
+            original_num = self.thumb_queue.popleft()
+            label = self.page_labels.get(original_num)
+            if label is None or original_num in self.thumb_rendered:
+                continue
+
+            page = self.doc[original_num]
+            # Render thẳng ở kích thước thumbnail thay vì render 72 dpi rồi thu nhỏ
+            width = label.width() - 10
+            height = label.height() - 10
+            zoom = min(width / page.rect.width, height / page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
+            label.setPixmap(QPixmap.fromImage(image))
+            self.thumb_rendered.add(original_num)
+
+        if not self.thumb_queue:
+            self.thumb_timer.stop()
+
+    def _on_rows_ahead_changed(self, value):
+        self.prefetcher.rows_ahead = value
+        self._schedule_prefetch()
         
     def _load_pdf_data(self, file_path):
         """Hàm helper để tải và hiển thị dữ liệu từ một file PDF."""
         try:
             self.doc = fitz.open(file_path)
             self.pdf_path = file_path
-            self.original_page_map = list(range(len(self.doc)))
+            self.page_map = PageIndexMap(self.doc.page_count)
+            self.preview.set_document(self.doc)
             
             self.reset_temp_dir()
             self.loaded_pages = 0
-            self.used_pages.clear()
+            self.used_pages = bytearray(self.doc.page_count)
             self.page_labels.clear()
-            self.next_start_page_index = 0
+            self.next_start_page = self.page_map.next_kept(0)
+            self.edit_log.clear()
+            self._update_undo_buttons()
             
             if self.manual_mode: self.toggle_manual_mode()
             if self.delete_mode: self.toggle_delete_mode()
             self.reset_delete_btn.setEnabled(True)
 
             self.show_pages()
-            self.scroll_area.verticalScrollBar().valueChanged.connect(self.check_scroll_position)
             self.log(f"✅ Đã tải lại PDF: {file_path} ({len(self.doc)} trang)")
 
         except Exception as e:
@@ -219,10 +610,12 @@ class PDFSplitterApp(QWidget):
         try:
             # 1. Lấy danh sách các widget đang hiển thị
             visible_widgets = []
+            self.grid_pages = []
             for i in sorted(self.page_labels.keys()):
                 label = self.page_labels[i]
-                if label.isVisible():
+                if not label.isHidden():
                     visible_widgets.append(label)
+                    self.grid_pages.append(i)
 
             # 2. Xóa chúng khỏi layout (nhưng không xóa widget)
             for widget in visible_widgets:
@@ -230,6 +623,7 @@ class PDFSplitterApp(QWidget):
 
             # 3. Tính toán lại số cột và thêm lại widget vào grid
             cols = max(1, (self.scroll_area.width() - 30) // (self.thumb_width + 20))
+            self.grid_cols = cols
             row, col = 0, 0
             for widget in visible_widgets:
                 self.page_layout.addWidget(widget, row, col)
@@ -240,6 +634,7 @@ class PDFSplitterApp(QWidget):
         finally:
             self.setEnabled(True)
             QApplication.restoreOverrideCursor()
+        self._schedule_prefetch()
             
     def log(self, msg):
         self.log_box.append(msg)
@@ -261,15 +656,12 @@ class PDFSplitterApp(QWidget):
             QApplication.restoreOverrideCursor()
 
     def check_scroll_position(self, value):
-        if self.is_loading_more:
+        if not self.doc:
             return
-    
-        scrollbar = self.scroll_area.verticalScrollBar()
-        if value >= scrollbar.maximum() - 600: 
-            if self.loaded_pages < len(self.doc):
-                self.show_pages(more=True)
+        self.prefetcher.on_scroll(value, time.perf_counter())
+        self._schedule_prefetch()
 
-    def show_pages(self, more=False):
+    def show_pages(self):
         if not self.doc or self.is_loading_more:
             return
 
@@ -278,13 +670,14 @@ class PDFSplitterApp(QWidget):
         QApplication.setOverrideCursor(Qt.WaitCursor)
         self.log("🔄 Bắt đầu tải trang...")
 
-        if not more:
-            self._clear_grid_layout()
-            self.loaded_pages = 0
+        self._clear_grid_layout()
+        self.loaded_pages = 0
+        self.prefetcher.reset()
 
-        # Tạo một "danh sách" các chỉ số trang cần được tải
+        # Tạo một "danh sách" các trang gốc cần được tải
+        # (loaded_pages là vị trí đã duyệt tới theo số trang gốc)
         start_scan_index = self.loaded_pages
-        pages_to_load = range(start_scan_index, len(self.doc))
+        pages_to_load = range(start_scan_index, self.doc.page_count)
         self.page_load_iterator = iter(pages_to_load)
 
         # Bắt đầu quá trình tải cụm đầu tiên
@@ -299,9 +692,8 @@ class PDFSplitterApp(QWidget):
             self.setCursor(QCursor(Qt.CrossCursor))
             self.reset_manual_btn.setEnabled(True)
             start_page_log = ""
-            if self.doc and self.next_start_page_index < len(self.original_page_map):
-                original_start_num = self.original_page_map[self.next_start_page_index]
-                start_page_log = f" Bắt đầu từ trang gốc: {original_start_num + 1}"
+            if self.doc and self.next_start_page is not None:
+                start_page_log = f" Bắt đầu từ trang gốc: {self.next_start_page + 1}"
             
             self.log(f"✂ Bật chế độ tách thủ công.{start_page_log}")
         else:
@@ -312,104 +704,189 @@ class PDFSplitterApp(QWidget):
     
     def revert_deletions(self):
         if not self.doc: return
+        if self.is_splitting(): return
 
         reply = QMessageBox.question(self, "Xác nhận phục hồi",
                                      "Bạn có chắc muốn hủy tất cả các trang đã xóa và reset lại tiến trình không?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            self.setEnabled(False)
-            QApplication.setOverrideCursor(Qt.WaitCursor)
-            try:
-                self._load_pdf_data(self.pdf_path)
-            finally:
-                self.setEnabled(True)
-                QApplication.restoreOverrideCursor()
+            # Không mở lại file: phục hồi bằng một thao tác gộp, vẫn hoàn tác được
+            deleted = [p for p in range(self.doc.page_count) if not self.page_map.is_kept(p)]
+            ops = [ReplacePartsOp(self.manifest.parts, [], self.used_pages, self.next_start_page, "reset tách")]
+            if deleted:
+                ops.append(DeletePagesOp(deleted, restore=True))
+            self._record(CompoundOp(ops, "phục hồi toàn bộ"))
+            self.log(f"↩️ Đã phục hồi {len(deleted)} trang đã xóa và reset tiến trình tách.")
 
     def reset_manual_split(self):
         if not self.doc: return
+        if self.is_splitting(): return
 
-        self.setEnabled(False)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            self.next_start_page_index = 0
-            self.used_pages.clear()
-            
-            # Hiện lại tất cả các trang đã bị ẩn
-            for label in self.page_labels.values():
-                if not label.isVisible():
-                    label.show()
-            
-            self._reflow_grid_on_resize() # Sắp xếp lại toàn bộ lưới
-            self.reset_temp_dir() 
-            self.log(f"🔄 Đã reset. Bắt đầu tách lại từ đầu.")
-        finally:
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
+        self._record(ReplacePartsOp(self.manifest.parts, [], self.used_pages, self.next_start_page, "reset tách"))
+        self.log(f"🔄 Đã reset. Bắt đầu tách lại từ đầu.")
+
+    def _clear_split_state(self):
+        """Sau khi lưu: bỏ các phần đã ghi, giữ nguyên các trang đã xóa."""
+        self._restore_used(bytearray(self.doc.page_count))
+        self.next_start_page = self.page_map.next_kept(0)
+        self.reset_temp_dir()
+        self.edit_log.clear()
+        self._update_undo_buttons()
+        self._reflow_grid_on_resize()
+        self.log(f"🔄 Đã reset. Bắt đầu tách lại từ đầu.")
+
+    # --- Nhật ký thao tác (undo/redo) ---
+    def _record(self, op):
+        """Áp dụng một thao tác mới và ghi vào nhật ký."""
+        self._apply_op(op)
+        self.edit_log.push(op)
+        self._update_undo_buttons()
+
+    def undo_edit(self):
+        if not self.doc or self.is_splitting() or self.is_loading_more:
+            return
+        op = self.edit_log.undo()
+        if op is None:
+            return
+        self._revert_op(op)
+        self.log(f"↶ Hoàn tác: {op.describe()}.")
+        self._update_undo_buttons()
+
+    def redo_edit(self):
+        if not self.doc or self.is_splitting() or self.is_loading_more:
+            return
+        op = self.edit_log.redo()
+        if op is None:
+            return
+        self._apply_op(op)
+        self.log(f"↷ Làm lại: {op.describe()}.")
+        self._update_undo_buttons()
+
+    def _update_undo_buttons(self):
+        idle = not self.is_splitting()
+        self.undo_btn.setEnabled(idle and self.edit_log.can_undo())
+        self.redo_btn.setEnabled(idle and self.edit_log.can_redo())
+
+    def _apply_op(self, op):
+        if isinstance(op, CompoundOp):
+            for sub_op in op.ops:
+                self._apply_op(sub_op)
+            return
+        if isinstance(op, DeletePagesOp):
+            self._set_pages_deleted(op.pages, not op.restore)
+        elif isinstance(op, SplitOp):
+            self.manifest.parts.append(op.part)
+            self._set_pages_used(op.pages, True)
+            self.next_start_page = self.page_map.next_kept(op.pages[-1] + 1)
+        elif isinstance(op, ReplacePartsOp):
+            self.manifest.parts = list(op.new_parts)
+            self._restore_used(bytearray(self.doc.page_count))
+            self.next_start_page = self.page_map.next_kept(0)
+        # Gộp nhiều thao tác liên tiếp vào một lần sắp xếp lại lưới
+        self.resize_timer.start(100)
+
+    def _revert_op(self, op):
+        if isinstance(op, CompoundOp):
+            for sub_op in reversed(op.ops):
+                self._revert_op(sub_op)
+            return
+        if isinstance(op, DeletePagesOp):
+            self._set_pages_deleted(op.pages, op.restore)
+        elif isinstance(op, SplitOp):
+            self.manifest.parts.remove(op.part)
+            self._set_pages_used(op.pages, False)
+            self.next_start_page = op.prev_start
+        elif isinstance(op, ReplacePartsOp):
+            self.manifest.parts = list(op.old_parts)
+            self._restore_used(bytearray(op.old_used))
+            self.next_start_page = op.old_next_start
+        self.resize_timer.start(100)
+
+    def _set_pages_deleted(self, pages, deleted):
+        for page in pages:
+            if deleted:
+                self.page_map.delete(page)
+            else:
+                self.page_map.restore(page)
+            label = self.page_labels.get(page)
+            if label:
+                label.setVisible(not deleted and not self.used_pages[page])
+        if not self.preview.isHidden() and self.preview.page_num is not None:
+            self.preview.set_title(self._page_caption(self.preview.page_num))
+
+        # Giữ bất biến: next_start_page là trang còn giữ, chưa tách, nhỏ nhất
+        if deleted:
+            start = self.next_start_page
+            if start is not None and not self.page_map.is_kept(start):
+                self.next_start_page = self.page_map.next_kept(start + 1)
+        else:
+            for page in pages:
+                if not self.used_pages[page] and (self.next_start_page is None or page < self.next_start_page):
+                    self.next_start_page = page
+
+    def _set_pages_used(self, pages, used):
+        for page in pages:
+            self.used_pages[page] = 1 if used else 0
+            label = self.page_labels.get(page)
+            if label:
+                label.setVisible(not used)
+
+    def _restore_used(self, used_pages):
+        self.used_pages = used_pages
+        for page, label in self.page_labels.items():
+            label.setVisible(self.page_map.is_kept(page) and not used_pages[page])
 
     def page_clicked(self, page_num):
+        """page_num là số trang gốc của thumbnail được nhấp."""
         if self.is_loading_more:
             self.log("⚠️ Vui lòng chờ quá trình tải trang hoàn tất trước khi tương tác.")
             return
+        if not self.manual_mode and not self.delete_mode and self.doc:
+            self.preview.show_page(page_num, self._page_caption(page_num))
+            return
+        if self.is_splitting():
+            self.log("⚠️ Vui lòng chờ quá trình ghi file tách hoàn tất.")
+            return
         
         if self.delete_mode:
             self.delete_page(page_num)
             return
 
-        if not self.manual_mode or not self.doc:
+        if not self.manual_mode or not self.doc or self.next_start_page is None:
             return
 
-        start = self.next_start_page_index
+        start = self.next_start_page
         end = page_num
 
         if start > end:
-            original_start_num = self.original_page_map[start]
-            QMessageBox.warning(self, "Lỗi", f"Vui lòng chọn trang kết thúc sau trang bắt đầu hiện tại (Trang gốc {original_start_num + 1}).")
+            QMessageBox.warning(self, "Lỗi", f"Vui lòng chọn trang kết thúc sau trang bắt đầu hiện tại (Trang gốc {start + 1}).")
             return
         
         self.setEnabled(False)
         QApplication.setOverrideCursor(Qt.WaitCursor)
         try:
-            # --- Phần 1: Tách file và lưu tạm ---
-            new_doc = fitz.open()
-            for i in range(start, end + 1):
-                new_doc.insert_pdf(self.doc, from_page=i, to_page=i)
-            
-            new_path = os.path.join(self.temp_dir, f"split_{self.split_count}.pdf")
-            new_doc.save(new_path)
-            self.split_count += 1
+            pages = self.page_map.kept_pages(start, end)
+            spans = build_spans(pages)
+
+            # --- Phần 1: Ghi nhận phần mới, chỉ lưu tạm khi không ghi thẳng ---
+            new_path = None
+            if not self.direct_check.isChecked():
+                new_path = os.path.join(self.temp_dir, f"split_{self.split_count}.pdf")
+                write_part(spans, new_path, doc=self.doc, **self._save_options())
+                self.split_count += 1
             
-            # --- Phần 2: Cập nhật trạng thái và giao diện ---
-            for i in range(start, end + 1):
-                original_num = self.original_page_map[i]
-                self.used_pages.add(original_num)
-                
-                label_to_hide = self.page_labels.get(i)
-                if label_to_hide:
-                    label_to_hide.hide()
-            
-            self.next_start_page_index = end + 1
-            
-            self._reflow_grid_on_resize()
-            QTimer.singleShot(50, self.check_if_more_pages_needed)
+            # --- Phần 2: Cập nhật trạng thái và giao diện qua nhật ký thao tác ---
+            self._record(SplitOp(SplitPart(spans, new_path), pages, start))
 
             # --- Phần 3: Ghi log ---
-            original_start = self.original_page_map[start]
-            original_end = self.original_page_map[end]
-            self.log(f"✂ Đã tách trang gốc {original_start+1} → {original_end+1}.")
+            self.log(f"✂ Đã tách trang gốc {start+1} → {end+1}.")
 
-            if self.next_start_page_index >= len(self.doc):
+            if self.next_start_page is None:
                 self.log("✅ Đã tách tất cả các trang.")
                 QMessageBox.information(self, "Hoàn tất", "Đã tách tất cả các trang!")
             else:
-                next_visible_index = self.next_start_page_index
-                while next_visible_index < len(self.doc) and self.original_page_map[next_visible_index] in self.used_pages:
-                    next_visible_index += 1
-                
-                if next_visible_index < len(self.doc):
-                    self.next_start_page_index = next_visible_index
-                    next_original_start = self.original_page_map[self.next_start_page_index]
-                    self.log(f"Trang bắt đầu tiếp theo là trang gốc: {next_original_start + 1}")
+                self.log(f"Trang bắt đầu tiếp theo là trang gốc: {self.next_start_page + 1}")
 
             self.scroll_area.verticalScrollBar().setValue(0)
 
@@ -420,81 +897,65 @@ class PDFSplitterApp(QWidget):
             self.setEnabled(True)
             QApplication.restoreOverrideCursor()
 
-    def check_if_more_pages_needed(self): 
-        scrollbar = self.scroll_area.verticalScrollBar()
-        if scrollbar.maximum() == 0 and self.loaded_pages < len(self.doc):
-             self.show_pages(more=True)
-             
     def save_results(self):
-        if not os.listdir(self.temp_dir):
+        if not len(self.manifest):
             QMessageBox.warning(self, "Lỗi", "Chưa có file nào được tách để lưu.")
             return
 
         if not self.pdf_path:
             QMessageBox.warning(self, "Lỗi", "Không tìm thấy đường dẫn file PDF gốc.")
             return
+        if self.is_splitting():
+            return
 
         dir_path = os.path.dirname(self.pdf_path)
         
         base_name = os.path.splitext(os.path.basename(self.pdf_path))[0]
-        save_dir = os.path.join(dir_path, base_name)
-        
-        counter = 1
-        final_save_dir = save_dir
-        while os.path.exists(final_save_dir):
-            final_save_dir = f"{save_dir} ({counter})"
-            counter += 1
-        os.makedirs(final_save_dir)
-
-        files = [f for f in os.listdir(self.temp_dir) if f.endswith(".pdf")]
-        try:
-            files.sort(key=lambda f: int(f.replace("split_", "").replace("page_", "").replace(".pdf", "")))
-        except ValueError:
-            files.sort()
+        final_save_dir = make_unique_dir(os.path.join(dir_path, base_name))
+        self.save_target_dir = final_save_dir
 
-        for idx, f in enumerate(files, 1):
-            src = os.path.join(self.temp_dir, f)
+        # Duyệt theo đúng thứ tự trong manifest: phần đã lưu tạm thì chuyển sang,
+        # phần chưa ghi thì giao cho SplitWorker ghi thẳng vào thư mục đích.
+        pending = []
+        for idx, part in enumerate(self.manifest, 1):
             dst = os.path.join(final_save_dir, f"{base_name}_{idx:03}.pdf")
-            shutil.copy(src, dst)
+            if part.path:
+                shutil.move(part.path, dst)
+                part.path = None
+                self.log(f"💾 Đã lưu file: {dst}")
+            else:
+                pending.append((dst, part.spans))
+
+        if pending:
+            self._start_split_worker(pending, self._on_save_done)
+        else:
+            self._finish_save()
+
+    def _on_save_done(self, written, cancelled):
+        self._set_split_controls(False)
+        for dst in sorted(written):
             self.log(f"💾 Đã lưu file: {dst}")
+        if cancelled:
+            self.log(f"⛔ Đã hủy lưu. Các file đã ghi xong vẫn nằm trong: {self.save_target_dir}")
+            return
+        if len(written) < len(self.split_worker.parts):
+            self.log(f"⚠️ Chỉ lưu được {len(written)}/{len(self.split_worker.parts)} file đang chờ.")
+            return
+        self._finish_save()
 
+    def _finish_save(self):
         QMessageBox.information(
-            self, "Hoàn tất", f"Đã lưu {len(files)} file vào thư mục:\n{final_save_dir}")
+            self, "Hoàn tất", f"Đã lưu {len(self.manifest)} file vào thư mục:\n{self.save_target_dir}")
         
-        self.reset_manual_split()
+        self._clear_split_state()
 
     def reset_temp_dir(self):
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
         self.temp_dir = tempfile.mkdtemp()
         self.split_count = 1
+        self.manifest.clear()
     
-    def _update_ui_after_deletion(self, deleted_page_num):
-        """
-        Cập nhật UI hiệu quả sau khi xóa trang mà không cần tải lại toàn bộ.
-        """
-        if deleted_page_num in self.page_labels:
-            label_to_remove = self.page_labels.pop(deleted_page_num)
-            self.page_layout.removeWidget(label_to_remove)
-            label_to_remove.deleteLater()
-
-        new_page_labels = {}
-        sorted_keys = sorted(self.page_labels.keys())
-
-        for old_index in sorted_keys:
-            label = self.page_labels[old_index]
-            
-            if old_index > deleted_page_num:
-                new_index = old_index - 1
-                label.mousePressEvent = lambda e, num=new_index: self.page_clicked(num)
-                new_page_labels[new_index] = label
-            else:
-                new_page_labels[old_index] = label
-        
-        self.page_labels = new_page_labels
-
-        self._reflow_grid_on_resize()
-
     def toggle_delete_mode(self):
         self.delete_mode = not self.delete_mode
         if self.delete_mode:
@@ -510,25 +971,40 @@ class PDFSplitterApp(QWidget):
             self.log("🗑️ Tắt chế độ xóa trang.")
 
     def delete_page(self, page_num):
+        """
+        Đánh dấu xóa trang gốc page_num. Tài liệu đang mở không bị sửa;
+        trang xóa chỉ bị loại khi ghi kết quả.
+        """
         if not self.doc: return
-        
-        try:
-            label_to_hide = self.page_labels.get(page_num)
-            
-            original_page_number = self.original_page_map[page_num]
-            self.doc.delete_page(page_num)
-            self.original_page_map.pop(page_num)
-
-            if label_to_hide:
-                label_to_hide.hide() 
-            
-            if page_num < self.next_start_page_index:
-                self.next_start_page_index -= 1
+        if self.is_splitting():
+            self.log("⚠️ Vui lòng chờ quá trình ghi file tách hoàn tất.")
+            return
+        if not self.page_map.is_kept(page_num):
+            return
 
-            self.log(f"✅ Đã xóa trang gốc {original_page_number + 1}. Tổng số trang còn lại: {len(self.doc)}.")
-            self._update_ui_after_deletion(page_num)
-        except Exception as e:
-            self.log(f"❌ Lỗi khi xóa trang: {e}")
+        display = self.page_map.original_to_display(page_num)
+        self._record(DeletePagesOp([page_num]))
+        self.log(f"✅ Đã xóa trang gốc {page_num + 1} (trang thứ {display + 1} trước khi xóa). "
+                 f"Tổng số trang còn lại: {len(self.page_map)}.")
+
+    def _page_caption(self, original):
+        """Vị trí của trang gốc trong tài liệu sau khi xóa (O(log n) qua PageIndexMap)."""
+        if not self.page_map.is_kept(original):
+            return f"Trang gốc {original + 1} (đã xóa)"
+        display = self.page_map.original_to_display(original)
+        return f"Trang {display + 1}/{len(self.page_map)} (gốc {original + 1})"
+
+    def _preview_step(self, delta):
+        """Xem trang còn giữ trước/sau trang đang xem, bỏ qua các trang đã xóa."""
+        current = self.preview.page_num
+        if not self.doc or current is None:
+            return
+        target = self.page_map.original_to_display(current) + delta
+        if delta > 0 and not self.page_map.is_kept(current):
+            target -= 1  # trang đang xem đã bị xóa: trang sau chính là trang còn giữ ở vị trí của nó
+        if 0 <= target < len(self.page_map):
+            original = self.page_map.display_to_original(target)
+            self.preview.show_page(original, self._page_caption(original))
 
     def resizeEvent(self, event):
         self.thumb_width = max(150, self.scroll_area.width() // 3 - 30) 
@@ -537,16 +1013,23 @@ class PDFSplitterApp(QWidget):
         super().resizeEvent(event)
 
     def closeEvent(self, event):
+        if self.is_splitting():
+            self.split_worker.stop()
+            self.split_worker.wait()
         self.reset_temp_dir()
         event.accept()
     
-    def add_split_row(self):
+    def add_split_row(self, start=None, end=None):
         row_widget = QWidget()
         row_layout = QHBoxLayout(row_widget)
         from_input = QLineEdit()
         from_input.setPlaceholderText("Từ trang")
         to_input = QLineEdit()
         to_input.setPlaceholderText("Đến trang")
+        if start is not None:
+            from_input.setText(str(start))
+        if end is not None:
+            to_input.setText(str(end))
         del_btn = QPushButton("🗑")
         del_btn.setFixedWidth(30)
         del_btn.clicked.connect(lambda: row_widget.deleteLater())
@@ -555,81 +1038,245 @@ class PDFSplitterApp(QWidget):
         row_layout.addWidget(del_btn)
         row_layout.setContentsMargins(0,0,0,0)
         self.range_layout.addWidget(row_widget)
+        return row_widget
+
+    def _clear_split_rows(self):
+        while self.range_layout.count():
+            child = self.range_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+
+    def analyse_split_points(self):
+        if not self.doc:
+            QMessageBox.warning(self, "Lỗi", "Chưa mở PDF")
+            return
+        if self.is_splitting():
+            return
+        use_blank = self.detect_blank_check.isChecked()
+        use_size = self.detect_size_check.isChecked()
+        use_outline = self.detect_outline_check.isChecked()
+        if not (use_blank or use_size or use_outline):
+            QMessageBox.warning(self, "Lỗi", "Chọn ít nhất một tiêu chí để phân tích.")
+            return
+
+        kept = self.page_map.kept_pages()
+        self.log(f"🔍 Đang phân tích {len(kept)} trang để gợi ý điểm tách...")
+        worker = SplitAnalysisWorker(self.pdf_path, kept, use_blank, use_size, use_outline,
+                                     self.blank_ratio_spin.value() / 100)
+        self._run_worker(worker, len(kept), self._on_analysis_done)
+
+    def _on_analysis_done(self, ranges, cancelled):
+        self._set_split_controls(False)
+        if cancelled:
+            self.log("⛔ Đã hủy phân tích.")
+            return
+        if not ranges:
+            self.log("⚠️ Không tìm thấy khoảng trang nào để gợi ý.")
+            return
+
+        self._clear_split_rows()
+        reasons = {}
+        for start, end, reason in ranges:
+            row = self.add_split_row(start + 1, end + 1)
+            row.setToolTip(f"Bắt đầu: {reason}")
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+        summary = ", ".join(f"{reason}: {count}" for reason, count in reasons.items())
+        self.log(f"✅ Gợi ý {len(ranges)} khoảng ({summary}). Kiểm tra lại rồi bấm '🚀 Tách PDF'.")
+
+    def split_by_size(self):
+        if not self.doc:
+            QMessageBox.warning(self, "Lỗi", "Chưa mở PDF")
+            return
+        if self.is_splitting():
+            return
+
+        kept = self.page_map.kept_pages()
+        if not kept:
+            QMessageBox.warning(self, "Lỗi", "Không còn trang nào để chia.")
+            return
+        max_bytes = int(self.max_size_spin.value() * 1048576)
+        self.log(f"📦 Đang chia {len(kept)} trang thành các phần tối đa {self.max_size_spin.value():.1f} MB...")
+        worker = SizeSplitWorker(self.pdf_path, kept, max_bytes, self._save_options())
+        self._run_worker(worker, len(kept), self._on_size_split_done)
+
+    def _on_size_split_done(self, ranges, cancelled):
+        self._set_split_controls(False)
+        if cancelled:
+            self.log("⛔ Đã hủy chia theo dung lượng.")
+            return
+        if not ranges:
+            return
+
+        max_bytes = int(self.max_size_spin.value() * 1048576)
+        self._clear_split_rows()
+        for start, end, actual in ranges:
+            row = self.add_split_row(start + 1, end + 1)
+            row.setToolTip(f"{actual / 1048576:.2f} MB")
+            if actual > max_bytes:
+                self.log(f"⚠️ Trang gốc {start + 1} một mình đã {actual / 1048576:.2f} MB, vượt giới hạn.")
+        self.log(f"✅ Gợi ý {len(ranges)} phần theo dung lượng. Giữ nguyên tuỳ chọn nén rồi bấm '🚀 Tách PDF'.")
 
     def start_auto_split(self):
         if not self.doc:
             QMessageBox.warning(self, "Lỗi", "Chưa mở PDF")
             return
+        if self.is_splitting():
+            return
 
-        self.reset_temp_dir()
-        count = 1
-        
-        self.setEnabled(False)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            total_original_pages = len(self.original_page_map)
-            for i in range(self.range_layout.count()):
-                widget = self.range_layout.itemAt(i).widget()
-                if not widget: continue
-
-                from_input = widget.layout().itemAt(0).widget()
-                to_input = widget.layout().itemAt(1).widget()
-                
-                try:
-                    start_orig = int(from_input.text().strip()) - 1
-                    end_orig = int(to_input.text().strip()) - 1
-                    
-                    if not (0 <= start_orig <= end_orig < total_original_pages):
-                        raise ValueError(f"Số trang phải nằm trong khoảng từ 1 đến {total_original_pages}")
-
-                    new_doc = fitz.open()
-                    
-                    pages_to_insert_indices = []
-                    for current_page_index, original_page_number in enumerate(self.original_page_map):
-                        if start_orig <= original_page_number <= end_orig:
-                            pages_to_insert_indices.append(current_page_index)
-                    for page_idx in pages_to_insert_indices:
-                        new_doc.insert_pdf(self.doc, from_page=page_idx, to_page=page_idx)
-
-                    out_path = os.path.join(self.temp_dir, f"split_{count}.pdf")
-                    new_doc.save(out_path)
-                    self.log(f"✅ Tách khoảng gốc {start_orig+1} → {end_orig+1} thành file {os.path.basename(out_path)}")
-                    count += 1
-                except ValueError as e:
-                    QMessageBox.warning(self, "Lỗi", f"Khoảng trang không hợp lệ: '{from_input.text()}' - '{to_input.text()}'.\n{e}")
-                    self.log(f"⚠️ Khoảng trang không hợp lệ: {from_input.text()} - {to_input.text()}")
-                    break
+        total_original_pages = self.doc.page_count
+        ranges = []
+        for i in range(self.range_layout.count()):
+            widget = self.range_layout.itemAt(i).widget()
+            if not widget: continue
+
+            from_input = widget.layout().itemAt(0).widget()
+            to_input = widget.layout().itemAt(1).widget()
+
+            try:
+                start_orig = int(from_input.text().strip()) - 1
+                end_orig = int(to_input.text().strip()) - 1
+
+                if not (0 <= start_orig <= end_orig < total_original_pages):
+                    raise ValueError(f"Số trang phải nằm trong khoảng từ 1 đến {total_original_pages}")
+            except ValueError as e:
+                QMessageBox.warning(self, "Lỗi", f"Khoảng trang không hợp lệ: '{from_input.text()}' - '{to_input.text()}'.\n{e}")
+                self.log(f"⚠️ Khoảng trang không hợp lệ: {from_input.text()} - {to_input.text()}")
+                return
+            ranges.append((start_orig, end_orig))
+
+        if not ranges:
+            QMessageBox.warning(self, "Lỗi", "Chưa nhập khoảng trang nào.")
+            return
+
+        # Chuyển khoảng trang gốc thành các đoạn trang liên tục của file gốc trên đĩa
+        spans_per_range = ranges_to_spans(ranges, self.page_map.kept_pages())
+
+        parts = []
+        for (start_orig, end_orig), spans in zip(ranges, spans_per_range):
+            if not spans:
+                self.log(f"⚠️ Khoảng gốc {start_orig+1} → {end_orig+1} không còn trang nào, bỏ qua.")
+                continue
+            self.log(f"📄 Khoảng gốc {start_orig+1} → {end_orig+1}: {span_page_count(spans)} trang, {len(spans)} đoạn.")
+            parts.append(spans)
+
+        self._replace_parts(parts, "tách theo khoảng", "split_{n}.pdf")
+
+    def _replace_parts(self, spans_list, label, temp_name):
+        """
+        Thay danh sách phần chờ lưu bằng spans_list (thao tác hoàn tác được).
+        Ở chế độ ghi thẳng chỉ ghi nhận; ngược lại ghi file tạm trước rồi mới ghi nhận.
+        temp_name nhận {n} (số thứ tự file tạm) và {page} (trang gốc đầu tiên, đánh số từ 1).
+        """
+        if self.direct_check.isChecked():
+            new_parts = [SplitPart(spans) for spans in spans_list]
+            self._record(ReplacePartsOp(self.manifest.parts, new_parts, self.used_pages, self.next_start_page, label))
+            self._report_pending_parts()
+            return
+
+        # File tạm đánh số tiếp, không đè lên file của các phần cũ (vẫn cần cho hoàn tác)
+        parts = []
+        for spans in spans_list:
+            name = temp_name.format(n=self.split_count, page=spans[0][0] + 1)
+            parts.append((os.path.join(self.temp_dir, name), spans))
+            self.split_count += 1
+        self.split_label = label
+        self._start_split_worker(parts, self._on_split_done)
+
+    def _report_pending_parts(self):
+        count = len(self.manifest)
+        if not count:
+            QMessageBox.warning(self, "Lỗi", "Không có phần nào để tách.")
+            return
+        self.log(f"✅ Đã ghi nhận {count} phần. Bấm '💾 Lưu kết quả' để ghi vào thư mục đích.")
+        QMessageBox.information(self, "Hoàn tất", f"Đã ghi nhận {count} phần, sẵn sàng lưu.")
+
+    def is_splitting(self):
+        return self.split_worker is not None and self.split_worker.isRunning()
+
+    def _save_options(self):
+        return SAVE_COMPACT if self.compact_check.isChecked() else SAVE_PLAIN
+
+    def _set_split_controls(self, running):
+        """Khóa các thao tác làm thay đổi tài liệu khi đang ghi file tách."""
+        for btn in (self.open_btn, self.manual_btn, self.delete_btn, self.reset_delete_btn,
+                    self.save_btn, self.add_btn, self.start_btn, self.split_single_btn,
+                    self.compact_check, self.analyse_btn, self.blank_ratio_spin,
+                    self.size_split_btn, self.max_size_spin):
+            btn.setEnabled(not running)
+        self.direct_check.setEnabled(not running)
+        if not running:
+            self.reset_delete_btn.setEnabled(self.doc is not None)
+        self.reset_manual_btn.setEnabled(not running and self.manual_mode)
+        self._update_undo_buttons()
+        self.split_progress.setVisible(running)
+        self.split_speed_label.setVisible(running)
+        self.cancel_split_btn.setVisible(running)
+        self.cancel_split_btn.setEnabled(running)
+
+    def _start_split_worker(self, parts, on_done):
+        if not parts:
+            QMessageBox.warning(self, "Lỗi", "Không có phần nào để tách.")
+            return
+        self._run_worker(SplitWorker(self.pdf_path, parts, self._save_options()), len(parts), on_done)
+
+    def _run_worker(self, worker, total, on_done):
+        """Chạy một ChunkPoolWorker, khóa giao diện và hiện tiến trình/nút hủy."""
+        self.split_progress.setMaximum(total)
+        self.split_progress.setValue(0)
+        self.split_speed_label.setText("⚡ -- trang/giây | Còn lại: --:--:--")
+
+        self.split_worker = worker
+        self.split_worker.log_signal.connect(self.log)
+        self.split_worker.progress_signal.connect(self._on_split_progress)
+        self.split_worker.speed_signal.connect(self._on_split_speed)
+        self.split_worker.done_signal.connect(on_done)
+        self.split_worker.start()
+        self._set_split_controls(True)
+
+    def cancel_split(self):
+        if self.is_splitting():
+            self.split_worker.stop()
+            self.cancel_split_btn.setEnabled(False)
+            self.log("⛔ Đang hủy, chờ các tiến trình con dừng lại...")
+
+    def _on_split_progress(self, done, total):
+        self.split_progress.setMaximum(total)
+        self.split_progress.setValue(done)
+
+    def _on_split_speed(self, rate, remaining):
+        self.split_speed_label.setText(f"⚡ {rate:.1f} trang/giây | Còn lại: {remaining}")
+
+    def _on_split_done(self, written, cancelled):
+        self._set_split_controls(False)
+        if cancelled:
+            # Kết quả dở dang không có ý nghĩa, bỏ các file của lần tách này
+            for out_path in written:
+                if os.path.exists(out_path):
+                    os.remove(out_path)
+            self.log(f"⛔ Đã hủy tách. Đã bỏ {len(written)} file ghi dở.")
+            return
+
+        done = set(written)
+        new_parts = [SplitPart(spans, out_path) for out_path, spans in self.split_worker.parts if out_path in done]
+        self._record(ReplacePartsOp(self.manifest.parts, new_parts, self.used_pages, self.next_start_page, self.split_label))
+
+        total = len(self.split_worker.parts)
+        if len(written) == total:
+            self.log(f"✅ Đã tách thành công {total} file.")
+            QMessageBox.information(self, "Hoàn tất", f"Đã tách thành công {total} file.")
+        else:
+            self.log(f"⚠️ Chỉ ghi được {len(written)}/{total} file.")
 
-            if count > 1:
-                QMessageBox.information(self, "Hoàn tất", f"Đã tách thành công {count-1} file.")
-        finally:
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
-            
     def split_single_pages(self):
         if not self.doc:
             QMessageBox.warning(self, "Lỗi", "Chưa mở PDF")
             return
-            
-        self.reset_temp_dir()
-        
-        self.setEnabled(False)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            total_pages = len(self.doc)
-            for i in range(total_pages):
-                new_doc = fitz.open()
-                new_doc.insert_pdf(self.doc, from_page=i, to_page=i)
-                
-                original_num = self.original_page_map[i]
-                out_path = os.path.join(self.temp_dir, f"page_{original_num+1}.pdf")
-                new_doc.save(out_path)
-
-            self.log(f"✅ Đã tách {total_pages} trang thành các file riêng lẻ (đặt tên theo số trang gốc).")
-            QMessageBox.information(self, "Hoàn tất", f"Đã tách {total_pages} trang thành công.")
-        except Exception as e:
-            self.log(f"❌ Lỗi khi tách từng trang: {e}")
-            QMessageBox.critical(self, "Lỗi", f"Xảy ra lỗi: {e}")
-        finally:
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
\ No newline at end of file
+        if self.is_splitting():
+            return
+
+        # Tên file tạm vẫn theo số trang gốc; các tiến trình con ghi song song
+        pages = self.page_map.kept_pages()
+        if not self.direct_check.isChecked():
+            self.log(f"⚡ Bắt đầu tách {len(pages)} trang thành các file riêng lẻ...")
+        self._replace_parts([[(p, p)] for p in pages], "tách từng trang", "page_{page}_{n}.pdf")
@@ -1,65 +1,206 @@
 import time
-import io
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog,
-    QProgressBar, QTextEdit, QHBoxLayout
+    QProgressBar, QTextEdit, QHBoxLayout, QSpinBox, QComboBox, QMessageBox, QCheckBox
 )
 from PyQt5.QtCore import QThread, pyqtSignal
 from pathlib import Path
-import fitz  # PyMuPDF
-from PIL import Image
 import datetime
 
+from tools.split_engine import default_workers, process_context
+from tools.tiff_engine import (
+    COLOR_MODES, COMPRESSIONS, DEFAULT_OPTIONS, DPI, OUTPUT_MODES, iter_chunks, multipage_path, outputs_exist,
+    plan_files, render_chunk, render_multipage, validate_options
+)
+from tools.tiff_manifest import ManifestSet, conversion_settings, remove_page_files
+from tools.tiff_memory import MemoryAdmission, default_memory_budget, sizes_page_memory, task_memory
+from tools.tiff_pipeline import WRITER_THREADS, stage_utilisation
+
 
 class ConvertWorker(QThread):
+    """
+    Chuyển mọi PDF trong cây thư mục sang TIFF. Các lát trang của mọi file được
+    render song song trong ProcessPoolExecutor; tiến trình báo theo trang và theo file.
+    output_mode="multipage": mỗi PDF thành một TIFF nhiều trang, mỗi file là một việc.
+    Trong mỗi tiến trình render và ghi là hai giai đoạn (writers luồng ghi, hàng đợi
+    giới hạn theo bộ nhớ); stage_signal báo mức bận của từng giai đoạn.
+    Việc chỉ được giao khi bộ nhớ ước lượng của các việc đang chạy còn dưới
+    memory_budget byte (mặc định theo bộ nhớ còn trống của máy).
+    File có mục trong manifest khớp (không đổi, cùng tuỳ chọn, cùng số thứ tự) được bỏ qua,
+    trừ khi force=True.
+    """
     log_signal = pyqtSignal(str)
-    progress_signal = pyqtSignal(int, int)
+    progress_signal = pyqtSignal(int, int)       # (số file xong, tổng số file)
+    page_progress_signal = pyqtSignal(int, int)  # (số trang xong, tổng số trang)
     time_remaining_signal = pyqtSignal(str)
+    stage_signal = pyqtSignal(float, float, str)  # (% bận render, % bận ghi, giai đoạn nghẽn)
+    done_signal = pyqtSignal(bool)               # bị hủy hay không
 
-    def __init__(self, input_folder, output_folder):
+    def __init__(self, input_folder, output_folder, max_workers=None, options=None, output_mode="pages",
+                 force=False, writers=WRITER_THREADS, memory_budget=None):
         super().__init__()
+        self.writers = writers
+        self.memory_budget = memory_budget or default_memory_budget()
+        self.output_mode = output_mode
+        self.force = force
         self.input_folder = Path(input_folder)
         self.output_folder = Path(output_folder)
+        self.max_workers = max_workers or default_workers()
+        self.options = options or DEFAULT_OPTIONS
         self.start_time = None
+        self._is_running = True
+
+    def stop(self):
+        self._is_running = False
+
+    def _tasks(self, jobs):
+        """Sinh (chỉ số file, hàm, tham số, bộ nhớ giữ chỗ) của từng việc, theo thứ tự giao."""
+        for idx, job in enumerate(jobs):
+            pages = sizes_page_memory(job["page_sizes"], DPI, self.options["color"])
+            if self.output_mode == "multipage":
+                reserve, queue_bytes = task_memory(max(pages, default=0), 1)
+                yield idx, render_multipage, (job["pdf_path"], multipage_path(job), DPI, self.options,
+                                              queue_bytes), reserve
+                continue
+            for start, end in iter_chunks(job):
+                reserve, queue_bytes = task_memory(max(pages[start:end], default=0), self.writers)
+                yield idx, render_chunk, (job["pdf_path"], job["target_folder"], job["first_number"], start, end,
+                                          DPI, self.options, self.writers, queue_bytes), reserve
 
     def run(self):
-        all_pdf_paths = sorted(list(self.input_folder.rglob("*.pdf")))
-        total_pdfs = len(all_pdf_paths)
-        processed_pdfs = 0
-        self.start_time = time.time()
+        try:
+            self._convert_all()
+        except Exception as e:
+            self.log_signal.emit(f"❌ Lỗi: {e}")
+        finally:
+            self.done_signal.emit(not self._is_running)
 
-        all_subdirs = sorted(set(p.parent for p in all_pdf_paths))
+    def _convert_all(self):
+        self.start_time = time.time()
+        self.log_signal.emit("🔍 Đang đọc danh sách file PDF...")
+        manifests = ManifestSet()
+        settings = conversion_settings(DPI, self.options, self.output_mode)
+        all_jobs, errors = plan_files(self.input_folder, self.output_folder, manifests)
+        for pdf_path, error in errors:
+            self.log_signal.emit(f"❌ Lỗi với {pdf_path}: {error}")
 
-        for subdir in all_subdirs:
-            counter = 1
-            pdf_files = sorted(list(subdir.glob("*.pdf")))
-            relative_path = subdir.relative_to(self.input_folder)
+        jobs = []
+        skipped = 0
+        for job in all_jobs:
+            manifest = manifests.for_folder(job["output_dir"])
+            if (not self.force and manifest.is_current(job, settings)
+                    and outputs_exist(job, self.output_mode)):
+                manifest.backfill_layout(job)  # lần sau lập kế hoạch khỏi mở lại file
+                skipped += 1
+                continue
+            # Chuyển lại: bỏ mục cũ cho tới khi xong, xoá ảnh cũ để không lẫn số thứ tự cũ
+            manifest.forget(job["name"])
+            if self.output_mode == "pages":
+                remove_page_files(job["target_folder"])
+            jobs.append(job)
+        manifests.save_all()
 
-            for pdf_path in pdf_files:
-                pdf_stem = pdf_path.stem
-                target_folder = self.output_folder / relative_path / pdf_stem
-                target_folder.mkdir(parents=True, exist_ok=True)
+        total_files = len(all_jobs) + len(errors)
+        total_pages = sum(job["page_count"] for job in jobs)
+        processed_files = len(errors) + skipped
+        pages_done = 0
+        stats = Counter()
+        admission = MemoryAdmission(self.memory_budget)
+        if skipped:
+            self.log_signal.emit(f"⏭ Bỏ qua {skipped} file đã chuyển trước đó (không thay đổi).")
+        self.log_signal.emit(f"📄 {len(jobs)} file, {total_pages} trang, {self.max_workers} tiến trình, "
+                             f"ngân sách bộ nhớ {self.memory_budget / 1048576:.0f} MB.")
+        self.progress_signal.emit(processed_files, total_files)
+        self.page_progress_signal.emit(0, total_pages)
 
-                try:
-                    doc = fitz.open(str(pdf_path))
-                    for page in doc:
-                        pix = page.get_pixmap(dpi=300)
-                        img_data = pix.tobytes("ppm")
-                        image = Image.open(io.BytesIO(img_data))
-                        tiff_filename = f"{counter:03d}.tiff"
-                        image.save(str(target_folder / tiff_filename), format="TIFF")
-                        counter += 1
-                    processed_pdfs += 1
-                    self.progress_signal.emit(processed_pdfs, total_pdfs)
+        if jobs and self._is_running:
+            pending = {}      # chỉ số file -> số lát chưa xong
+            file_errors = {}  # chỉ số file -> lỗi đầu tiên
+            pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=process_context())
+            try:
+                for idx, job in enumerate(jobs):
+                    pending[idx] = 1 if self.output_mode == "multipage" else len(list(iter_chunks(job)))
+                tasks = self._tasks(jobs)
+                next_task = next(tasks, None)
+                futures = {}  # future -> (chỉ số file, bộ nhớ giữ chỗ)
+                while self._is_running and (next_task or futures):
+                    try:
+                        # Giao việc khi còn tiến trình rảnh và còn ngân sách bộ nhớ
+                        while next_task and len(futures) < self.max_workers:
+                            idx, fn, args, reserve = next_task
+                            if not admission.can_admit(reserve):
+                                admission.deferred += 1
+                                break
+                            admission.admit(reserve)
+                            try:
+                                futures[pool.submit(fn, *args)] = (idx, reserve)
+                            except Exception:
+                                admission.release(reserve)
+                                raise
+                            next_task = next(tasks, None)
+                        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    except Exception as e:
+                        # Thường là BrokenProcessPool: một tiến trình con bị dừng đột ngột
+                        # (hệ điều hành diệt khi thiếu RAM...), pool không giao thêm việc được nữa
+                        for idx, reserve in futures.values():
+                            admission.release(reserve)
+                        futures.clear()
+                        for idx in sorted(i for i, left in pending.items() if left):
+                            pending[idx] = 0
+                            processed_files += 1
+                            self.log_signal.emit(f"❌ Lỗi với {jobs[idx]['pdf_path']}: "
+                                                 f"{file_errors.get(idx) or str(e) or type(e).__name__}")
+                        self.progress_signal.emit(processed_files, total_files)
+                        break
+                    for future in finished:
+                        idx, reserve = futures.pop(future)
+                        admission.release(reserve)
+                        try:
+                            written, error, chunk_stats = future.result()
+                        except Exception as e:
+                            written, error, chunk_stats = 0, str(e), Counter()
+                        pages_done += written
+                        stats.update(chunk_stats)
+                        self.stage_signal.emit(*stage_utilisation(stats))
+                        if error:
+                            file_errors.setdefault(idx, error)
+                        pending[idx] -= 1
+                        if not pending[idx]:
+                            processed_files += 1
+                            self.progress_signal.emit(processed_files, total_files)
+                            pdf_path = jobs[idx]["pdf_path"]
+                            if idx in file_errors:
+                                self.log_signal.emit(f"❌ Lỗi với {pdf_path}: {file_errors[idx]}")
+                            else:
+                                manifests.for_folder(jobs[idx]["output_dir"]).record(jobs[idx], settings)
+                                manifests.save_if_due()
+                                self.log_signal.emit(f"✅ Đã xử lý: {pdf_path}")
 
-                    elapsed = time.time() - self.start_time
-                    remaining = (elapsed / processed_pdfs) * (total_pdfs - processed_pdfs)
-                    remaining_str = str(datetime.timedelta(seconds=int(remaining)))
-                    self.time_remaining_signal.emit(remaining_str)
+                        self.page_progress_signal.emit(pages_done, total_pages)
+                        elapsed = time.time() - self.start_time
+                        remaining = (elapsed / pages_done) * (total_pages - pages_done) if pages_done else 0
+                        self.time_remaining_signal.emit(str(datetime.timedelta(seconds=int(remaining))))
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+                manifests.save_all()
 
-                    self.log_signal.emit(f"✅ Đã xử lý: {pdf_path}")
-                except Exception as e:
-                    self.log_signal.emit(f"❌ Lỗi với {pdf_path}: {e}")
+        elapsed = time.time() - self.start_time
+        if pages_done:
+            self.log_signal.emit(f"⏱ {pages_done} trang trong {elapsed:.1f} giây "
+                                 f"({pages_done / max(elapsed, 1e-6):.1f} trang/giây).")
+            render_load, write_load, bound = stage_utilisation(stats)
+            self.log_signal.emit(f"⚙ Render bận {render_load:.0f}%, luồng ghi bận {write_load:.0f}% "
+                                 f"- nghẽn ở {bound}.")
+            if admission.deferred:
+                self.log_signal.emit(f"🧠 Đã {admission.deferred} lần hoãn giao việc để giữ bộ nhớ dưới ngân sách "
+                                     f"(đỉnh ước lượng {admission.peak / 1048576:.0f} MB).")
+            if self.options["color"] == "auto":
+                self.log_signal.emit(f"🎨 {stats['rgb']} trang màu, {stats['gray']} trang xám, "
+                                     f"{stats['bilevel']} trang đen trắng (G4).")
+            if stats["banded"]:
+                self.log_signal.emit(f"🧩 {stats['banded']} trang khổ lớn được render và ghi theo từng dải.")
 
 
 class PDFtoTIFFApp(QWidget):
@@ -88,22 +229,100 @@ class PDFtoTIFFApp(QWidget):
         self.choose_output_button.setEnabled(False)
         self.layout.addWidget(self.choose_output_button)
 
-        # Start button
+        # Số tiến trình render song song
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Số tiến trình:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(default_workers())
+        self.workers_spin.setToolTip("Số trang được render cùng lúc, mặc định bằng số nhân CPU trừ một.")
+        workers_layout.addWidget(self.workers_spin)
+        workers_layout.addWidget(QLabel("Luồng ghi:"))
+        self.writers_spin = QSpinBox()
+        self.writers_spin.setRange(1, 16)
+        self.writers_spin.setValue(WRITER_THREADS)
+        self.writers_spin.setToolTip("Số luồng mã hoá và ghi ảnh của mỗi tiến trình, chạy song song với render.\n"
+                                     "Tăng lên khi ghi ra ổ mạng chậm (nghẽn ở ghi).")
+        workers_layout.addWidget(self.writers_spin)
+        workers_layout.addWidget(QLabel("Bộ nhớ tối đa (MB):"))
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(256, 1024 * 1024)
+        self.memory_spin.setSingleStep(256)
+        self.memory_spin.setValue(default_memory_budget() // 1048576)
+        self.memory_spin.setToolTip("Tổng bộ nhớ ước lượng cho các trang đang render cùng lúc; trang khổ lớn\n"
+                                    "chỉ được giao khi còn đủ. Mặc định 70% bộ nhớ còn trống lúc mở công cụ.")
+        workers_layout.addWidget(self.memory_spin)
+        workers_layout.addStretch()
+        self.layout.addLayout(workers_layout)
+
+        # Cách xếp ảnh đầu ra
+        self.output_mode_combo = QComboBox()
+        for key, label in OUTPUT_MODES.items():
+            self.output_mode_combo.addItem(label, key)
+        workers_layout.insertWidget(workers_layout.count() - 1, QLabel("Đầu ra:"))
+        workers_layout.insertWidget(workers_layout.count() - 1, self.output_mode_combo)
+        self.force_checkbox = QCheckBox("Chuyển lại tất cả")
+        self.force_checkbox.setToolTip("Mặc định bỏ qua các file đã chuyển với cùng tuỳ chọn và không thay đổi\n"
+                                       "từ lần trước (theo manifest trong thư mục kết quả).")
+        workers_layout.insertWidget(workers_layout.count() - 1, self.force_checkbox)
+
+        # Chế độ màu và kiểu nén
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Chế độ màu:"))
+        self.color_combo = QComboBox()
+        for key, label in COLOR_MODES.items():
+            self.color_combo.addItem(label, key)
+        self.color_combo.setToolTip("Tự động: trang có màu giữ RGB, trang ảnh xám ghi xám,\n"
+                                    "trang chữ đen trắng ghi 1 bit nén G4.")
+        format_layout.addWidget(self.color_combo)
+        format_layout.addWidget(QLabel("Nén:"))
+        self.compression_combo = QComboBox()
+        for key, (label, _) in COMPRESSIONS.items():
+            self.compression_combo.addItem(label, key)
+        self.compression_combo.setToolTip("Ở chế độ tự động, kiểu nén này dùng cho trang màu/xám.")
+        format_layout.addWidget(self.compression_combo)
+        format_layout.addWidget(QLabel("Ngưỡng đen trắng:"))
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(1, 254)
+        self.threshold_spin.setValue(DEFAULT_OPTIONS["threshold"])
+        self.threshold_spin.setToolTip("Điểm ảnh xám tối hơn ngưỡng này thành đen.")
+        format_layout.addWidget(self.threshold_spin)
+        format_layout.addWidget(QLabel("Chất lượng JPEG:"))
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(10, 100)
+        self.quality_spin.setValue(DEFAULT_OPTIONS["jpeg_quality"])
+        format_layout.addWidget(self.quality_spin)
+        format_layout.addStretch()
+        self.layout.addLayout(format_layout)
+        self.color_combo.currentIndexChanged.connect(self._update_format_controls)
+        self.compression_combo.currentIndexChanged.connect(self._update_format_controls)
+        self._update_format_controls()
+
+        # Start / stop buttons
+        buttons_layout = QHBoxLayout()
         self.start_button = QPushButton("Bắt đầu chuyển đổi")
         self.start_button.clicked.connect(self.start_conversion)
         self.start_button.setEnabled(False)
-        self.layout.addWidget(self.start_button)
+        buttons_layout.addWidget(self.start_button)
+        self.stop_button = QPushButton("Dừng")
+        self.stop_button.clicked.connect(self.stop_conversion)
+        self.stop_button.setEnabled(False)
+        buttons_layout.addWidget(self.stop_button)
+        self.layout.addLayout(buttons_layout)
 
         # Progress and status
         self.progress_bar = QProgressBar()
         self.layout.addWidget(self.progress_bar)
 
-        self.status_label = QLabel("Đã chuyển: 0 / 0")
+        self.status_label = QLabel("Đã chuyển: 0 / 0 file | 0 / 0 trang")
         self.layout.addWidget(self.status_label)
 
         self.time_label = QLabel("Ước tính thời gian còn lại: --:--:--")
         self.layout.addWidget(self.time_label)
 
+        self.stage_label = QLabel("Mức bận: render --% | ghi --%")
+        self.layout.addWidget(self.stage_label)
+
         # Log box
         self.log_box = QTextEdit()
         self.log_box.setReadOnly(True)
@@ -111,6 +330,9 @@ class PDFtoTIFFApp(QWidget):
 
         self.input_folder = None
         self.output_folder = None
+        self.worker = None
+        self.files_done = (0, 0)
+        self.pages_done = (0, 0)
 
     def choose_input_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Chọn thư mục chứa PDF")
@@ -127,21 +349,85 @@ class PDFtoTIFFApp(QWidget):
             self.start_button.setEnabled(True)
 
     def start_conversion(self):
-        self.worker = ConvertWorker(self.input_folder, self.output_folder)
+        if self.worker and self.worker.isRunning():
+            return
+        options = self._options()
+        try:
+            validate_options(options)
+        except ValueError as e:
+            QMessageBox.warning(self, "Tuỳ chọn không hợp lệ", str(e))
+            return
+        self.worker = ConvertWorker(self.input_folder, self.output_folder, self.workers_spin.value(), options,
+                                    self.output_mode_combo.currentData(), self.force_checkbox.isChecked(),
+                                    self.writers_spin.value(), self.memory_spin.value() * 1048576)
         self.worker.log_signal.connect(self.append_log)
         self.worker.progress_signal.connect(self.update_progress)
+        self.worker.page_progress_signal.connect(self.update_page_progress)
         self.worker.time_remaining_signal.connect(self.update_time_remaining)
+        self.worker.stage_signal.connect(self.update_stage_load)
+        self.worker.done_signal.connect(self.on_done)
         self.progress_bar.setValue(0)
         self.log_box.clear()
+        self._set_running(True)
         self.worker.start()
 
+    def _options(self):
+        return {
+            "color": self.color_combo.currentData(),
+            "compression": self.compression_combo.currentData(),
+            "threshold": self.threshold_spin.value(),
+            "jpeg_quality": self.quality_spin.value(),
+        }
+
+    def _update_format_controls(self):
+        self.threshold_spin.setEnabled(self.color_combo.currentData() in ("bilevel", "auto"))
+        self.quality_spin.setEnabled(self.compression_combo.currentData() == "jpeg")
+
+    def stop_conversion(self):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.stop_button.setEnabled(False)
+            self.append_log("⏹ Đang dừng, chờ các trang đang render xong...")
+
+    def _set_running(self, running):
+        for widget in (self.choose_input_button, self.choose_output_button, self.start_button, self.workers_spin,
+                       self.writers_spin, self.memory_spin,
+                       self.output_mode_combo, self.force_checkbox,
+                       self.color_combo, self.compression_combo, self.threshold_spin, self.quality_spin):
+            widget.setEnabled(not running)
+        if not running:
+            self._update_format_controls()
+        self.stop_button.setEnabled(running)
+
+    def on_done(self, cancelled):
+        self._set_running(False)
+        self.append_log("⛔ Đã dừng chuyển đổi." if cancelled else "----- Hoàn thành -----")
+
     def append_log(self, text):
         self.log_box.append(text)
 
     def update_progress(self, done, total):
-        self.progress_bar.setMaximum(total)
+        self.files_done = (done, total)
+        self._update_status()
+
+    def update_page_progress(self, done, total):
+        self.pages_done = (done, total)
+        self.progress_bar.setMaximum(max(total, 1))
         self.progress_bar.setValue(done)
-        self.status_label.setText(f"Đã chuyển: {done} / {total}")
+        self._update_status()
+
+    def _update_status(self):
+        self.status_label.setText(f"Đã chuyển: {self.files_done[0]} / {self.files_done[1]} file | "
+                                  f"{self.pages_done[0]} / {self.pages_done[1]} trang")
 
     def update_time_remaining(self, time_str):
         self.time_label.setText(f"Ước tính thời gian còn lại: {time_str}")
+
+    def update_stage_load(self, render_load, write_load, bound):
+        self.stage_label.setText(f"Mức bận: render {render_load:.0f}% | ghi {write_load:.0f}% → nghẽn ở {bound}")
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        event.accept()
@@ -0,0 +1,108 @@
+"""
+Phân tích gợi ý điểm tách cho PDFSplitterApp.
+
+Ba tín hiệu:
+- Trang trắng (tờ phân cách khi scan hàng loạt): render xám ở dpi thấp rồi đo
+  tỉ lệ điểm ảnh có mực bằng NumPy.
+- Đổi khổ giấy hoặc hướng giấy giữa hai trang liên tiếp.
+- Mục lục (outline) cấp 1 của PDF.
+
+Hàm analyse_chunk chạy trong tiến trình con, dùng tài liệu nguồn mà
+split_engine._init_worker đã mở sẵn.
+"""
+import fitz
+import numpy as np
+
+from tools import split_engine
+
+BLANK_DPI = 24          # đủ để thấy chữ/nét, rất nhanh
+INK_THRESHOLD = 200     # mức xám (0-255) dưới ngưỡng này coi là có mực
+BLANK_INK_RATIO = 0.0002  # dưới 0.02% điểm ảnh có mực thì coi là trang trắng
+MARGIN_RATIO = 0.05     # bỏ viền 5% mỗi cạnh (bóng mép giấy khi scan)
+SIZE_TOLERANCE = 0.03   # chênh lệch kích thước trên 3% coi là đổi khổ
+
+REASON_START = "đầu tài liệu"
+REASON_BLANK = "sau trang trắng"
+REASON_SIZE = "đổi khổ/hướng giấy"
+REASON_OUTLINE = "mục lục"
+
+
+def ink_ratio(page, dpi=BLANK_DPI, threshold=INK_THRESHOLD, margin=MARGIN_RATIO):
+    """Tỉ lệ điểm ảnh có mực trong vùng giữa trang (đã bỏ viền)."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    mh = int(pix.height * margin)
+    mw = int(pix.width * margin)
+    core = img[mh:pix.height - mh, mw:pix.width - mw]
+    if core.size == 0:
+        core = img
+    return float(np.count_nonzero(core < threshold)) / core.size
+
+
+def analyse_chunk(pages, doc=None):
+    """
+    Đo từng trang trong pages. Trả về [(trang gốc, tỉ lệ mực, rộng, cao)].
+    """
+    src = doc if doc is not None else split_engine._source_doc
+    result = []
+    for pno in pages:
+        page = src[pno]
+        rect = page.rect
+        result.append((pno, ink_ratio(page), rect.width, rect.height))
+    return result
+
+
+def outline_starts(doc):
+    """Các trang gốc (đánh số từ 0) được mục lục cấp 1 trỏ tới."""
+    starts = set()
+    for level, _title, page, *_ in doc.get_toc(simple=True):
+        if level == 1 and page >= 1:
+            starts.add(page - 1)
+    return starts
+
+
+def size_changed(prev_size, size, tolerance=SIZE_TOLERANCE):
+    (pw, ph), (w, h) = prev_size, size
+    if (pw > ph) != (w > h):
+        return True
+    return abs(w - pw) > tolerance * pw or abs(h - ph) > tolerance * ph
+
+
+def propose_ranges(kept_pages, page_info, toc_starts=(), use_blank=True, use_size=True,
+                   use_outline=True, blank_ratio=BLANK_INK_RATIO):
+    """
+    Dựng danh sách khoảng trang gốc (start, end, lý do bắt đầu) từ kết quả đo.
+    page_info: {trang gốc: (tỉ lệ mực, rộng, cao)}. Trang trắng không thuộc khoảng nào.
+    """
+    ranges = []
+    start = prev = prev_size = None
+    reason = REASON_START
+
+    for pno in kept_pages:
+        ink, width, height = page_info[pno]
+        if use_blank and ink < blank_ratio:
+            if start is not None:
+                ranges.append((start, prev, reason))
+            start = prev = prev_size = None
+            reason = REASON_BLANK
+            continue
+
+        if start is not None:
+            new_reason = None
+            if use_outline and pno in toc_starts:
+                new_reason = REASON_OUTLINE
+            elif use_size and size_changed(prev_size, (width, height)):
+                new_reason = REASON_SIZE
+            if new_reason:
+                ranges.append((start, prev, reason))
+                start = None
+                reason = new_reason
+
+        if start is None:
+            start = pno
+        prev = pno
+        prev_size = (width, height)
+
+    if start is not None:
+        ranges.append((start, prev, reason))
+    return ranges
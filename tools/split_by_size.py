@@ -0,0 +1,111 @@
+"""
+Chia tài liệu thành các phần có dung lượng không vượt quá một giới hạn.
+
+Bước 1: ước lượng phần đóng góp của từng trang từ độ dài stream nội dung,
+ảnh và font (đọc khóa /Length, không giải nén). Ảnh/font dùng chung chỉ tính
+một lần trong mỗi phần.
+Bước 2: gom tham lam các trang vào phần hiện tại cho tới khi chạm giới hạn.
+Bước 3: kiểm chứng mỗi phần bằng một lần lưu thật trong bộ nhớ (tobytes);
+nếu vượt thì thu ngắn phần theo tỉ lệ rồi thử lại. Không ghi file tạm ra đĩa.
+"""
+import fitz
+
+from tools.split_engine import build_spans
+
+DOC_OVERHEAD = 2048   # trailer, xref, catalog...
+PAGE_OVERHEAD = 512   # từ điển trang và mục xref
+SHRINK_MARGIN = 0.95  # thu ngắn dư một chút để lần thử sau ít khi vượt lại
+
+
+def _stream_length(doc, xref):
+    """Độ dài stream (đã nén) theo khóa /Length, 0 nếu không đọc được."""
+    kind, value = doc.xref_get_key(xref, "Length")
+    try:
+        if kind == "int":
+            return int(value)
+        if kind == "xref":
+            return int(doc.xref_object(int(value.split()[0])).strip())
+    except ValueError:
+        pass
+    return 0
+
+
+def _font_length(doc, xref):
+    try:
+        buffer = doc.extract_font(xref)[3]
+    except Exception:
+        return 0
+    return len(buffer) if buffer else 0
+
+
+def estimate_pages(doc, pages):
+    """
+    Ước lượng từng trang: {trang gốc: (byte riêng, {xref tài nguyên: byte})}.
+    Kích thước tài nguyên được nhớ theo xref nên mỗi font/ảnh chỉ đọc một lần.
+    """
+    resource_cache = {}
+    estimates = {}
+    for pno in pages:
+        page = doc[pno]
+        own = PAGE_OVERHEAD + sum(_stream_length(doc, x) for x in page.get_contents())
+
+        resources = {}
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref not in resource_cache:
+                resource_cache[xref] = _stream_length(doc, xref)
+            resources[xref] = resource_cache[xref]
+        for font in page.get_fonts(full=True):
+            xref = font[0]
+            if xref <= 0 or font[1] == "n/a":
+                continue
+            if xref not in resource_cache:
+                resource_cache[xref] = _font_length(doc, xref)
+            resources[xref] = resource_cache[xref]
+        estimates[pno] = (own, resources)
+    return estimates
+
+
+def take_pages(pages, start, estimates, limit):
+    """Gom tham lam từ pages[start] cho tới khi ước lượng chạm limit (ít nhất một trang)."""
+    size = DOC_OVERHEAD
+    seen = set()
+    end = start
+    while end < len(pages):
+        own, resources = estimates[pages[end]]
+        added = own + sum(v for x, v in resources.items() if x not in seen)
+        if end > start and size + added > limit:
+            break
+        size += added
+        seen.update(resources)
+        end += 1
+    return pages[start:end], size
+
+
+def real_size(doc, pages, garbage=0, deflate=False):
+    """Dung lượng thật của phần gồm pages, đo bằng một lần lưu trong bộ nhớ."""
+    out = fitz.open()
+    try:
+        for from_page, to_page in build_spans(pages):
+            out.insert_pdf(doc, from_page=from_page, to_page=to_page)
+        return len(out.tobytes(garbage=garbage, deflate=deflate))
+    finally:
+        out.close()
+
+
+def iter_size_parts(doc, pages, limit, garbage=0, deflate=False):
+    """
+    Sinh lần lượt (các trang, dung lượng ước lượng, dung lượng thật) của từng phần.
+    Phần chỉ có một trang mà vẫn vượt limit được giữ nguyên để người dùng xử lý.
+    """
+    estimates = estimate_pages(doc, pages)
+    start = 0
+    while start < len(pages):
+        part, estimated = take_pages(pages, start, estimates, limit)
+        actual = real_size(doc, part, garbage, deflate)
+        while actual > limit and len(part) > 1:
+            keep = max(1, min(len(part) - 1, int(len(part) * limit / actual * SHRINK_MARGIN)))
+            part = part[:keep]
+            actual = real_size(doc, part, garbage, deflate)
+        yield part, estimated, actual
+        start += len(part)
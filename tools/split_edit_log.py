@@ -0,0 +1,102 @@
+"""
+Nhật ký thao tác của PDFSplitterApp trên tài liệu gốc bất biến.
+
+Mỗi thao tác (xóa trang, tách thủ công, thay danh sách phần) lưu đủ thông tin
+để hoàn tác và làm lại ngay trong bộ nhớ, không phải mở lại file hay vẽ lại
+thumbnail. Việc áp dụng thao tác lên giao diện do PDFSplitterApp đảm nhiệm;
+module này chỉ giữ dữ liệu và hai ngăn xếp undo/redo.
+"""
+
+
+class DeletePagesOp:
+    """Xóa (hoặc phục hồi nếu restore=True) một nhóm trang gốc."""
+    __slots__ = ("pages", "restore")
+
+    def __init__(self, pages, restore=False):
+        self.pages = list(pages)
+        self.restore = restore
+
+    def describe(self):
+        action = "phục hồi" if self.restore else "xóa"
+        if len(self.pages) == 1:
+            return f"{action} trang gốc {self.pages[0] + 1}"
+        return f"{action} {len(self.pages)} trang"
+
+
+class SplitOp:
+    """Tách thủ công: thêm part vào manifest và đánh dấu các trang đã dùng."""
+    __slots__ = ("part", "pages", "prev_start")
+
+    def __init__(self, part, pages, prev_start):
+        self.part = part
+        self.pages = pages
+        self.prev_start = prev_start
+
+    def describe(self):
+        return f"tách trang gốc {self.pages[0] + 1} → {self.pages[-1] + 1}"
+
+
+class ReplacePartsOp:
+    """
+    Thay toàn bộ danh sách phần chờ lưu (tách theo khoảng, tách từng trang,
+    reset tách). Lưu lại trạng thái tách thủ công cũ để hoàn tác.
+    """
+    __slots__ = ("old_parts", "new_parts", "old_used", "old_next_start", "label")
+
+    def __init__(self, old_parts, new_parts, old_used, old_next_start, label):
+        self.old_parts = list(old_parts)
+        self.new_parts = list(new_parts)
+        self.old_used = bytes(old_used)
+        self.old_next_start = old_next_start
+        self.label = label
+
+    def describe(self):
+        return self.label
+
+
+class CompoundOp:
+    """Nhiều thao tác được hoàn tác/làm lại cùng lúc."""
+    __slots__ = ("ops", "label")
+
+    def __init__(self, ops, label):
+        self.ops = ops
+        self.label = label
+
+    def describe(self):
+        return self.label
+
+
+class EditLog:
+    """Hai ngăn xếp undo/redo. Thao tác mới sẽ xóa nhánh redo."""
+
+    def __init__(self):
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def push(self, op):
+        self.undo_stack.append(op)
+        self.redo_stack.clear()
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        op = self.undo_stack.pop()
+        self.redo_stack.append(op)
+        return op
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        op = self.redo_stack.pop()
+        self.undo_stack.append(op)
+        return op
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
@@ -0,0 +1,247 @@
+"""
+Bộ máy tách PDF dùng chung cho PDFSplitterApp.
+
+Các hàm trong module này không phụ thuộc Qt để có thể chạy trong tiến trình con
+(ProcessPoolExecutor). Mỗi tiến trình con mở file nguồn đúng một lần trong
+initializer, sau đó chỉ nhận danh sách đoạn trang cần chép và đường dẫn đầu ra.
+"""
+import os
+import re
+import shutil
+import time
+import multiprocessing
+from bisect import bisect_left, bisect_right
+
+import fitz
+
+from utilities.page_ranges import resolve_ranges
+
+# Tuỳ chọn khi lưu file đầu ra (tương ứng tham số của fitz.Document.save)
+SAVE_PLAIN = {"garbage": 0, "deflate": False}
+SAVE_COMPACT = {"garbage": 3, "deflate": True}
+
+# Số trang tối đa trong một lát giao cho tiến trình con. Lát nhỏ giúp chia đều
+# việc giữa các nhân và để lệnh hủy có hiệu lực nhanh.
+CHUNK_PAGES = 64
+
+# Tài liệu nguồn của tiến trình con, được mở trong _init_worker
+_source_doc = None
+
+# Thư mục kết quả trùng tên được thêm hậu tố " (n)" (make_unique_dir)
+_OUTPUT_DIR_RE = re.compile(r"^(.*) \(\d+\)$")
+
+
+def default_workers():
+    """Số tiến trình ghi mặc định: chừa lại một nhân cho giao diện."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def process_context():
+    """Luôn dùng 'spawn' để tiến trình con không thừa hưởng trạng thái Qt."""
+    return multiprocessing.get_context("spawn")
+
+
+def build_spans(pages):
+    """
+    Gom danh sách số trang tăng dần thành các đoạn liên tục.
+    Ví dụ: [0, 1, 2, 5, 6, 9] -> [(0, 2), (5, 6), (9, 9)]
+    """
+    spans = []
+    for p in pages:
+        if spans and p == spans[-1][1] + 1:
+            spans[-1][1] = p
+        else:
+            spans.append([p, p])
+    return [(a, b) for a, b in spans]
+
+
+def ranges_to_spans(ranges, kept_pages):
+    """
+    Chuyển danh sách khoảng trang gốc [(start, end), ...] thành danh sách đoạn
+    liên tục cho từng phần, chỉ giữ các trang còn trong kept_pages (đã sắp xếp).
+    Mỗi khoảng chỉ tốn hai lần tìm nhị phân thay vì quét lại toàn bộ danh sách.
+    """
+    parts = []
+    for start, end in ranges:
+        lo = bisect_left(kept_pages, start)
+        hi = bisect_right(kept_pages, end)
+        parts.append(build_spans(kept_pages[lo:hi]))
+    return parts
+
+
+def span_page_count(spans):
+    return sum(b - a + 1 for a, b in spans)
+
+
+def chunk_parts(parts, chunk_pages=CHUNK_PAGES):
+    """
+    Gom các phần liền kề (out_path, spans) thành từng lát khoảng chunk_pages trang.
+    Phần lớn hơn chunk_pages đứng riêng một lát.
+    """
+    chunks = []
+    current, pages = [], 0
+    for part in parts:
+        current.append(part)
+        pages += span_page_count(part[1])
+        if pages >= chunk_pages:
+            chunks.append(current)
+            current, pages = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SplitPart:
+    """Một phần đầu ra: các đoạn trang gốc và file tạm (nếu đã ghi sẵn)."""
+    __slots__ = ("spans", "path")
+
+    def __init__(self, spans, path=None):
+        self.spans = spans
+        self.path = path
+
+    def page_count(self):
+        return span_page_count(self.spans)
+
+
+class SplitManifest:
+    """
+    Danh sách các phần chờ lưu, giữ đúng thứ tự đầu ra trong bộ nhớ.
+    Khi lưu chỉ cần duyệt theo thứ tự này, không phải đoán thứ tự từ tên file.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def add(self, spans, path=None):
+        part = SplitPart(spans, path)
+        self.parts.append(part)
+        return part
+
+    def clear(self):
+        self.parts = []
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __iter__(self):
+        return iter(self.parts)
+
+
+def make_unique_dir(path):
+    """
+    Tạo và trả về thư mục path, hoặc path thêm hậu tố ' (1)', ' (2)', ... nếu đã có.
+    Tạo thẳng rồi bắt FileExistsError nên an toàn khi nhiều tiến trình cùng chọn tên.
+    """
+    counter = 0
+    while True:
+        final_path = f"{path} ({counter})" if counter else path
+        try:
+            os.makedirs(final_path)
+            return final_path
+        except FileExistsError:
+            counter += 1
+
+
+def split_output_dirs(folder, names):
+    """
+    Các thư mục con trong names là kết quả của lần tách trước (do split_file tạo):
+    tên <tên> hoặc <tên> (n) cạnh <tên>.pdf và chỉ chứa <tên>_001.pdf ...
+    """
+    stems = {os.path.splitext(name)[0] for name in os.listdir(folder) if name.lower().endswith(".pdf")}
+    found = []
+    for name in names:
+        # "a (1)" có thể là thư mục của "a (1).pdf" hoặc thư mục thứ hai của "a.pdf"
+        match = _OUTPUT_DIR_RE.match(name)
+        candidates = [stem for stem in (name, match and match.group(1)) if stem in stems]
+        if not candidates:
+            continue
+        entries = os.listdir(os.path.join(folder, name))
+        for stem in candidates:
+            part_re = re.compile(rf"^{re.escape(stem)}_\d{{3,}}\.pdf(\.part)?$")
+            if entries and all(part_re.match(entry) for entry in entries):
+                found.append(name)
+                break
+    return found
+
+
+def _init_worker(src_path):
+    """Initializer của tiến trình con: mở file nguồn một lần duy nhất."""
+    global _source_doc
+    _source_doc = fitz.open(src_path)
+
+
+def write_part(spans, out_path, garbage=0, deflate=False, doc=None):
+    """
+    Ghi một phần gồm các đoạn trang spans ra out_path.
+    Mỗi đoạn liên tục chỉ cần một lần insert_pdf. File được ghi dưới tên tạm
+    rồi đổi tên, nên out_path không bao giờ chứa file ghi dở.
+    Trả về số trang đã ghi.
+    """
+    src = doc if doc is not None else _source_doc
+    tmp_path = out_path + ".part"
+    out = fitz.open()
+    try:
+        for from_page, to_page in spans:
+            out.insert_pdf(src, from_page=from_page, to_page=to_page)
+        out.save(tmp_path, garbage=garbage, deflate=deflate)
+        page_count = out.page_count
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        out.close()
+    os.replace(tmp_path, out_path)
+    return page_count
+
+
+def write_parts(parts, garbage=0, deflate=False, doc=None):
+    """
+    Ghi lần lượt một lát các phần (out_path, spans) từ cùng một tài liệu nguồn.
+    Lỗi của từng phần được gom lại, không làm dừng cả lát.
+    Trả về ([(out_path, số trang)], [(out_path, thông báo lỗi)]).
+    """
+    written, errors = [], []
+    for out_path, spans in parts:
+        try:
+            written.append((out_path, write_part(spans, out_path, garbage, deflate, doc=doc)))
+        except Exception as e:
+            errors.append((out_path, str(e)))
+    return written, errors
+
+
+def split_file(src_path, spec, garbage=0, deflate=False):
+    """
+    Tách một file theo spec khoảng trang (utilities.page_ranges), đặt tên giống
+    PDFSplitterApp.save_results: <thư mục nguồn>/<tên>/<tên>_001.pdf ...
+    Chạy được trong tiến trình con; mọi lỗi được trả về thay vì ném ra.
+    Trả về dict: src, out_dir, parts, pages, seconds, error.
+    """
+    start = time.time()
+    result = {"src": src_path, "out_dir": "", "parts": 0, "pages": 0, "seconds": 0.0, "error": ""}
+    try:
+        with fitz.open(src_path) as doc:
+            if doc.needs_pass:
+                raise ValueError("File được đặt mật khẩu")
+            ranges = resolve_ranges(spec, doc.page_count)
+            if not ranges:
+                raise ValueError(f"Biểu thức không khớp trang nào (file có {doc.page_count} trang)")
+
+            base_name = os.path.splitext(os.path.basename(src_path))[0]
+            out_dir = make_unique_dir(os.path.join(os.path.dirname(src_path), base_name))
+            result["out_dir"] = out_dir
+            for idx, (first, last) in enumerate(ranges, 1):
+                out_path = os.path.join(out_dir, f"{base_name}_{idx:03}.pdf")
+                result["pages"] += write_part([(first, last)], out_path, garbage, deflate, doc=doc)
+                result["parts"] += 1
+    except Exception as e:
+        result["error"] = str(e)
+        # Không để lại thư mục ghi dở
+        if result["out_dir"]:
+            try:
+                shutil.rmtree(result["out_dir"])
+                result.update(out_dir="", parts=0, pages=0)
+            except OSError:
+                result["error"] += f" (các phần đã ghi còn trong {result['out_dir']})"
+    result["seconds"] = time.time() - start
+    return result
@@ -0,0 +1,86 @@
+"""
+Lập lịch tải trước thumbnail cho lưới trang của PDFSplitterApp.
+
+Theo dõi hướng và tốc độ cuộn để quyết định nên render những hàng nào:
+các hàng đang nhìn thấy trước, sau đó là các hàng phía trước theo hướng cuộn
+(càng cuộn nhanh càng tải xa hơn), cuối cùng là vài hàng phía sau.
+Mỗi lần cuộn, hàng đợi được dựng lại nên các trang đã cuộn qua tự bị bỏ.
+Module không phụ thuộc Qt; việc render do widget đảm nhiệm.
+"""
+
+DEFAULT_ROWS_AHEAD = 3
+ROWS_BEHIND = 1
+LOOKAHEAD_SECONDS = 0.5   # tải thêm số hàng sẽ cuộn tới trong khoảng thời gian này
+MAX_EXTRA_ROWS = 30       # giới hạn số hàng tải thêm khi cuộn rất nhanh
+IDLE_SECONDS = 0.3        # không cuộn lâu hơn thì coi như đứng yên
+SMOOTHING = 0.5           # hệ số làm mượt vận tốc (trung bình trượt mũ)
+
+
+class PrefetchScheduler:
+    def __init__(self, rows_ahead=DEFAULT_ROWS_AHEAD, rows_behind=ROWS_BEHIND):
+        self.rows_ahead = rows_ahead
+        self.rows_behind = rows_behind
+        self.direction = 1   # 1: cuộn xuống, -1: cuộn lên
+        self.velocity = 0.0  # px/giây (luôn dương)
+        self._last_value = None
+        self._last_time = None
+
+    def reset(self):
+        self.direction = 1
+        self.velocity = 0.0
+        self._last_value = None
+        self._last_time = None
+
+    def on_scroll(self, value, now):
+        """Cập nhật hướng và vận tốc từ vị trí thanh cuộn tại thời điểm now (giây)."""
+        if self._last_time is not None:
+            dt = now - self._last_time
+            delta = value - self._last_value
+            if dt > IDLE_SECONDS:
+                self.velocity = 0.0
+            elif dt > 0 and delta:
+                speed = abs(delta) / dt
+                self.velocity = SMOOTHING * speed + (1 - SMOOTHING) * self.velocity
+            if delta:
+                self.direction = 1 if delta > 0 else -1
+        self._last_value = value
+        self._last_time = now
+
+    def rows_to_load(self, first_row, last_row, total_rows, row_pitch):
+        """
+        Các hàng cần có thumbnail, theo thứ tự ưu tiên.
+        first_row/last_row: các hàng đang nhìn thấy; row_pitch: chiều cao một hàng (px).
+        """
+        if total_rows <= 0:
+            return []
+        first_row = max(0, min(first_row, total_rows - 1))
+        last_row = max(first_row, min(last_row, total_rows - 1))
+
+        extra = 0
+        if row_pitch > 0:
+            extra = min(MAX_EXTRA_ROWS, int(self.velocity * LOOKAHEAD_SECONDS / row_pitch))
+        ahead = self.rows_ahead + extra
+
+        if self.direction > 0:
+            visible = range(first_row, last_row + 1)
+            forward = range(last_row + 1, min(total_rows, last_row + 1 + ahead))
+            backward = range(first_row - 1, max(-1, first_row - 1 - self.rows_behind), -1)
+        else:
+            visible = range(last_row, first_row - 1, -1)
+            forward = range(first_row - 1, max(-1, first_row - 1 - ahead), -1)
+            backward = range(last_row + 1, min(total_rows, last_row + 1 + self.rows_behind))
+        return [*visible, *forward, *backward]
+
+    def plan(self, grid_pages, cols, first_row, last_row, row_pitch, rendered):
+        """
+        Danh sách trang (theo thứ tự render) còn thiếu thumbnail trong vùng cần tải.
+        grid_pages: các trang theo thứ tự trong lưới; rendered: tập trang đã có thumbnail.
+        """
+        cols = max(1, cols)
+        total_rows = (len(grid_pages) + cols - 1) // cols
+        queue = []
+        for row in self.rows_to_load(first_row, last_row, total_rows, row_pitch):
+            for page in grid_pages[row * cols:(row + 1) * cols]:
+                if page not in rendered:
+                    queue.append(page)
+        return queue
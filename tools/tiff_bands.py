@@ -0,0 +1,190 @@
+"""
+Render trang khổ lớn (bản vẽ A0, A1...) thành TIFF theo từng dải ngang.
+
+Ở 300 dpi một trang A0 RGB hơn 400 MB; get_pixmap cả trang dễ gây MemoryError.
+Ở đây trang được render từng dải bằng clip của fitz, mỗi dải ghi ngay thành một
+strip của TIFF rồi bỏ, nên bộ nhớ đỉnh chỉ khoảng một dải (BAND_BYTES) dù trang
+lớn cỡ nào.
+
+StripTiffWriter ghi TIFF little-endian cơ bản chỉ qua write/seek/tell với vị trí
+tính từ đầu ảnh, nên dùng được cho file thường lẫn AppendingTiffWriter của PIL
+(chế độ TIFF nhiều trang). Strip được ghi không nén hoặc nén Deflate (zlib);
+LZW và JPEG không có bộ mã hoá theo strip nên dùng Deflate thay thế.
+Trang đen trắng (1 bit, nhỏ hơn RGB 24 lần) được ghép từ các dải thành một ảnh
+1 bit rồi ghi bằng PIL để vẫn dùng được G4.
+"""
+import math
+import struct
+import zlib
+
+import fitz
+from PIL import Image
+
+BAND_BYTES = 32 * 1024 * 1024         # dung lượng ảnh của một dải
+LARGE_PAGE_BYTES = 128 * 1024 * 1024  # trang có ảnh lớn hơn mức này thì render theo dải
+
+# Kiểu nén TIFF ghi được theo strip
+_COMPRESSION_TAGS = {"none": 1, "deflate": 8}
+
+# Kiểu dữ liệu của thẻ TIFF
+_SHORT, _LONG, _RATIONAL = 3, 4, 5
+_TYPE_FORMATS = {_SHORT: "H", _LONG: "L", _RATIONAL: "LL"}
+
+
+def pixel_size(width, height, dpi):
+    """Kích thước (rộng, cao) px của khổ trang width x height điểm khi render ở dpi."""
+    zoom = dpi / 72
+    return math.ceil(width * zoom - 1e-3), math.ceil(height * zoom - 1e-3)
+
+
+def page_pixel_size(page, dpi):
+    """Kích thước (rộng, cao) px của trang khi render ở dpi."""
+    return pixel_size(page.rect.width, page.rect.height, dpi)
+
+
+def size_bitmap_bytes(width, height, dpi, color):
+    """Ước lượng dung lượng ảnh của khổ trang (RGB 3 byte/điểm, xám và đen trắng render xám 1 byte/điểm)."""
+    width, height = pixel_size(width, height, dpi)
+    return width * height * (3 if color == "rgb" else 1)
+
+
+def bitmap_bytes(page, dpi, color):
+    return size_bitmap_bytes(page.rect.width, page.rect.height, dpi, color)
+
+
+def is_large_page(page, dpi, color):
+    return bitmap_bytes(page, dpi, color) > LARGE_PAGE_BYTES
+
+
+def band_rows(width, channels, band_bytes=BAND_BYTES):
+    """Số dòng của một dải (mọi dải cao bằng nhau, trừ dải cuối)."""
+    return max(1, band_bytes // (width * channels))
+
+
+def iter_bands(page, dpi, colorspace):
+    """Render trang theo dải ngang. Sinh (số dòng, bytes của dải không có đệm cuối dòng)."""
+    zoom = dpi / 72
+    matrix = fitz.Matrix(zoom, zoom)
+    rect = page.rect
+    width, height = page_pixel_size(page, dpi)
+    rows_per_band = band_rows(width, colorspace.n)
+    # Cả trang theo px; mỗi dải xin rộng thêm nửa điểm ảnh trên/dưới rồi cắt đúng
+    # các dòng cần lấy, để sai số làm tròn của clip không làm lệch dòng giữa các dải.
+    top = math.floor(rect.y0 * zoom + 1e-3)
+    for row in range(0, height, rows_per_band):
+        rows = min(rows_per_band, height - row)
+        clip = fitz.Rect(rect.x0, rect.y0 + (row - 0.5) / zoom, rect.x1, rect.y0 + (row + rows + 0.5) / zoom)
+        pix = page.get_pixmap(matrix=matrix, clip=clip & rect, colorspace=colorspace, alpha=False)
+        first = top + row - pix.y
+        line_bytes = min(pix.width, width) * pix.n
+        data = pix.samples_mv
+        if pix.stride == line_bytes and first == 0 and pix.height == rows:
+            band = bytes(data)
+        else:
+            band = b"".join(data[(first + r) * pix.stride:(first + r) * pix.stride + line_bytes]
+                            for r in range(rows))
+        if pix.width < width:
+            # dải hẹp hơn trang (làm tròn) thì đệm trắng bên phải
+            pad = b"\xff" * ((width - pix.width) * pix.n)
+            band = b"".join(band[r * line_bytes:(r + 1) * line_bytes] + pad for r in range(rows))
+        del pix, data
+        yield rows, band
+
+
+class StripTiffWriter:
+    """Ghi một ảnh TIFF theo từng strip; gọi write_strip theo thứ tự từ trên xuống rồi close()."""
+
+    def __init__(self, fp, width, height, samples, rows_per_strip, compression="none", dpi=None):
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.samples = samples
+        self.rows_per_strip = rows_per_strip
+        self.compression = compression
+        self.dpi = dpi
+        self.offsets = []
+        self.byte_counts = []
+        self.start = fp.tell()
+        fp.write(b"II*\x00" + struct.pack("<L", 0))  # vị trí IFD được ghi lại khi close
+
+    def write_strip(self, data):
+        if self.compression == "deflate":
+            data = zlib.compress(data, 6)
+        self.offsets.append(self.fp.tell() - self.start)
+        self.byte_counts.append(len(data))
+        self.fp.write(data)
+
+    def close(self):
+        entries = [
+            (256, _LONG, [self.width]),
+            (257, _LONG, [self.height]),
+            (258, _SHORT, [8] * self.samples),
+            (259, _SHORT, [_COMPRESSION_TAGS[self.compression]]),
+            (262, _SHORT, [2 if self.samples == 3 else 1]),  # RGB hoặc xám (0 là đen)
+            (273, _LONG, self.offsets),
+            (277, _SHORT, [self.samples]),
+            (278, _LONG, [self.rows_per_strip]),
+            (279, _LONG, self.byte_counts),
+        ]
+        if self.dpi:
+            entries += [
+                (282, _RATIONAL, [(self.dpi, 1)]),
+                (283, _RATIONAL, [(self.dpi, 1)]),
+                (296, _SHORT, [2]),  # đơn vị inch
+            ]
+
+        # IFD ở cuối (căn chẵn), giá trị không vừa 4 byte đặt ngay sau IFD
+        end = self.fp.tell() - self.start
+        if end % 2:
+            self.fp.write(b"\x00")
+            end += 1
+        ifd_offset = end
+        extra_offset = ifd_offset + 2 + 12 * len(entries) + 4
+        ifd = [struct.pack("<H", len(entries))]
+        extra = []
+        for tag, field_type, values in entries:
+            fmt = _TYPE_FORMATS[field_type]
+            flat = [v for value in values for v in (value if isinstance(value, tuple) else (value,))]
+            payload = struct.pack("<" + fmt * len(values), *flat)
+            if len(payload) <= 4:
+                ifd.append(struct.pack("<HHL", tag, field_type, len(values)) + payload.ljust(4, b"\x00"))
+            else:
+                ifd.append(struct.pack("<HHLL", tag, field_type, len(values), extra_offset))
+                extra.append(payload)
+                extra_offset += len(payload) + len(payload) % 2
+                if len(payload) % 2:
+                    extra.append(b"\x00")
+        ifd.append(struct.pack("<L", 0))  # không có IFD tiếp theo
+        self.fp.write(b"".join(ifd) + b"".join(extra))
+
+        # Trỏ header tới IFD
+        self.fp.seek(self.start + 4)
+        self.fp.write(struct.pack("<L", ifd_offset))
+        self.fp.seek(0, 2)
+
+
+def write_banded(page, fp, dpi, color, compression, threshold=128, save_params=None):
+    """
+    Render trang theo dải và ghi vào fp (file đã mở hoặc AppendingTiffWriter).
+    color: "rgb" | "gray" | "bilevel". Trả về kiểu nén thực sự đã dùng.
+    """
+    width, height = page_pixel_size(page, dpi)
+    if color == "bilevel":
+        # Ảnh 1 bit đủ nhỏ để giữ cả trang: ghép các dải rồi ghi bằng PIL (giữ được G4)
+        table = [0 if v < threshold else 255 for v in range(256)]
+        image = Image.new("1", (width, height), 1)
+        top = 0
+        for rows, band in iter_bands(page, dpi, fitz.csGRAY):
+            image.paste(Image.frombytes("L", (width, rows), band).point(table, "1"), (0, top))
+            top += rows
+        image.save(fp, **(save_params or {"format": "TIFF"}))
+        return compression
+
+    colorspace = fitz.csRGB if color == "rgb" else fitz.csGRAY
+    strip_compression = compression if compression in _COMPRESSION_TAGS else "deflate"
+    rows_per_strip = min(band_rows(width, colorspace.n), height)
+    writer = StripTiffWriter(fp, width, height, colorspace.n, rows_per_strip, strip_compression, dpi)
+    for _, band in iter_bands(page, dpi, colorspace):
+        writer.write_strip(band)
+    writer.close()
+    return strip_compression
@@ -0,0 +1,331 @@
+"""
+Bộ máy chuyển PDF sang TIFF dùng chung cho PDFtoTIFFApp.
+
+Không phụ thuộc Qt để chạy được trong tiến trình con (ProcessPoolExecutor).
+Việc được chia theo lát trang chứ không theo file, nên một file rất dài cũng
+được nhiều nhân cùng render. Số thứ tự ảnh (001.tiff, 002.tiff, ...) được tính
+trước khi render: đánh liên tục qua các file PDF trong cùng một thư mục con,
+mỗi thư mục con bắt đầu lại từ 1 - giống hệt cách đánh số tuần tự trước đây.
+
+Ảnh được dựng thẳng từ bộ đệm điểm ảnh của pixmap (Image.frombytes trên
+pix.samples_mv), không mã hoá ra PPM rồi giải mã lại.
+
+Tuỳ chọn ghi (options): chế độ màu (RGB, xám, đen trắng theo ngưỡng, hoặc tự
+động theo từng trang) và kiểu nén. Chế độ tự động render trang ở độ phân giải
+thấp, dùng NumPy phân loại màu/xám/đen trắng; trang đen trắng luôn ghi G4.
+
+Chế độ "multipage" ghi mỗi PDF thành một file TIFF nhiều trang: từng trang
+được render rồi nối ngay vào cuối file (AppendingTiffWriter), nên lúc nào cũng
+chỉ giữ một ảnh trang trong bộ nhớ. Các trang của một file phải ghi theo thứ
+tự nên ở chế độ này mỗi file là một việc (song song giữa các file).
+
+Trang khổ lớn (ảnh vượt LARGE_PAGE_BYTES) được render và ghi theo dải
+(tools/tiff_bands.py) để bộ nhớ đỉnh không phụ thuộc kích thước trang.
+
+Render và ghi là hai giai đoạn tách rời (tools/tiff_pipeline.py): trong mỗi
+tiến trình con luồng chính render, các luồng ghi mã hoá và ghi đĩa song song.
+
+Các file đã chuyển được ghi vào manifest của thư mục đầu ra
+(tools/tiff_manifest.py); outputs_exist kiểm tra ảnh của một file còn đủ không.
+"""
+import os
+from collections import Counter
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+from tools.tiff_bands import is_large_page, write_banded
+from tools.tiff_manifest import source_stat
+from tools.tiff_memory import page_sizes
+from tools.tiff_pipeline import QUEUE_BYTES, WRITER_THREADS, WritePipeline, WriteError, image_bytes
+
+DPI = 300
+
+# Chế độ màu của ảnh ghi ra
+COLOR_MODES = {
+    "rgb": "Màu (RGB)",
+    "gray": "Xám",
+    "bilevel": "Đen trắng (theo ngưỡng)",
+    "auto": "Tự động theo từng trang",
+}
+
+# Kiểu nén -> tham số compression của PIL
+COMPRESSIONS = {
+    "none": ("Không nén", None),
+    "group4": ("CCITT G4 (chỉ đen trắng)", "group4"),
+    "lzw": ("LZW", "tiff_lzw"),
+    "deflate": ("Deflate (ZIP)", "tiff_adobe_deflate"),
+    "jpeg": ("JPEG (không dùng cho đen trắng)", "jpeg"),
+}
+
+# Cách xếp ảnh đầu ra
+OUTPUT_MODES = {
+    "pages": "Mỗi trang một file (001.tiff, 002.tiff...)",
+    "multipage": "Mỗi PDF một file TIFF nhiều trang",
+}
+
+# Mặc định giữ nguyên đầu ra trước đây: RGB không nén
+DEFAULT_OPTIONS = {"color": "rgb", "compression": "none", "threshold": 128, "jpeg_quality": 85}
+
+# Phân loại trang ở chế độ tự động
+DETECT_DPI = 36           # độ phân giải của ảnh dùng để phân loại
+COLOR_TOLERANCE = 40      # chênh lệch giữa các kênh màu lớn hơn mức này thì là điểm màu
+COLOR_FRACTION = 0.002    # tỷ lệ điểm màu tối thiểu để coi là trang màu (con dấu, chữ ký màu...)
+MIDTONE_RANGE = (64, 192)
+GRAY_FRACTION = 0.4       # tỷ lệ điểm trung tính tối thiểu để coi là trang ảnh xám
+
+# Số trang mỗi lát giao cho tiến trình con: đủ nhỏ để chia đều các nhân và
+# để tiến trình/huỷ mượt, đủ lớn để không phải mở lại file quá nhiều lần.
+CHUNK_PAGES = 8
+
+# Tài liệu đang mở trong tiến trình con, giữ lại vì các lát liên tiếp
+# thường thuộc cùng một file
+_open_path = None
+_open_doc = None
+
+
+def plan_files(input_folder, output_folder, manifests=None):
+    """
+    Liệt kê các file PDF và số thứ tự ảnh đầu tiên của từng file.
+    Trả về (jobs, errors): jobs là list dict pdf_path, target_folder, first_number,
+    page_count, page_sizes (khổ trang để ước lượng bộ nhớ), cùng name, output_dir,
+    stat dùng cho manifest; errors là [(pdf_path, lỗi)] cho file không mở được
+    (không chiếm số thứ tự).
+    manifests (ManifestSet): nếu có, file chưa đổi lấy số trang và khổ trang từ
+    manifest thay vì mở lại.
+    """
+    input_folder = Path(input_folder)
+    output_folder = Path(output_folder)
+    all_pdf_paths = sorted(input_folder.rglob("*.pdf"))
+    jobs = []
+    errors = []
+    for subdir in sorted(set(p.parent for p in all_pdf_paths)):
+        counter = 1
+        output_dir = output_folder / subdir.relative_to(input_folder)
+        manifest = manifests.for_folder(output_dir) if manifests is not None else None
+        names = []
+        for pdf_path in sorted(subdir.glob("*.pdf")):
+            try:
+                stat = source_stat(pdf_path)
+                layout = manifest.cached_layout(pdf_path.name, stat) if manifest else None
+                if layout is None:
+                    with fitz.open(str(pdf_path)) as doc:
+                        layout = doc.page_count, page_sizes(doc)
+                page_count, sizes = layout
+            except Exception as e:
+                errors.append((str(pdf_path), str(e)))
+                continue
+            jobs.append({
+                "pdf_path": str(pdf_path),
+                "target_folder": str(output_dir / pdf_path.stem),
+                "first_number": counter,
+                "page_count": page_count,
+                "page_sizes": sizes,
+                "name": pdf_path.name,
+                "output_dir": str(output_dir),
+                "stat": stat,
+            })
+            names.append(pdf_path.name)
+            counter += page_count
+        if manifest:
+            manifest.keep_only(names)
+    return jobs, errors
+
+
+def multipage_path(job):
+    """File TIFF nhiều trang của một PDF: đặt cạnh thư mục ảnh từng trang, cùng tên."""
+    return job["target_folder"] + ".tiff"
+
+
+def outputs_exist(job, output_mode):
+    """Ảnh đầu ra của file còn đủ (đầu và cuối với chế độ từng trang)."""
+    if output_mode == "multipage":
+        return os.path.exists(multipage_path(job))
+    if job["page_count"] == 0:
+        return True
+    last = job["first_number"] + job["page_count"] - 1
+    return all(os.path.exists(os.path.join(job["target_folder"], f"{n:03d}.tiff"))
+               for n in (job["first_number"], last))
+
+
+def iter_chunks(job, chunk_pages=CHUNK_PAGES):
+    """Các lát trang (start, end) của một file, end không tính."""
+    for start in range(0, job["page_count"], chunk_pages):
+        yield start, min(start + chunk_pages, job["page_count"])
+
+
+# Số kênh của pixmap -> chế độ ảnh PIL
+_PIL_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+
+def pixmap_to_image(pix):
+    """
+    Ảnh PIL chép một lần từ bộ đệm của pixmap (tôn trọng stride), không qua định dạng trung gian.
+    Không dùng frombuffer: với ảnh xám PIL sẽ trỏ thẳng vào bộ nhớ của pixmap, và ảnh
+    sống lâu hơn pixmap tạm thì trỏ vào vùng nhớ đã giải phóng.
+    """
+    mode = _PIL_MODES[pix.n]
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+
+def validate_options(options):
+    """Ném ValueError nếu kiểu nén không dùng được với chế độ màu (libtiff sẽ lỗi nặng)."""
+    color, compression = options["color"], options["compression"]
+    if compression == "group4" and color not in ("bilevel", "auto"):
+        raise ValueError("Nén G4 chỉ dùng cho ảnh đen trắng (hoặc chế độ tự động)")
+    if compression == "jpeg" and color == "bilevel":
+        raise ValueError("Nén JPEG không dùng được cho ảnh đen trắng")
+
+
+def classify_page(page):
+    """Phân loại trang: "rgb" (có màu), "gray" (ảnh xám) hoặc "bilevel" (chữ đen trắng)."""
+    pix = page.get_pixmap(dpi=DETECT_DPI, colorspace=fitz.csRGB, alpha=False)
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    rgb = rows[:, :pix.width * 3].reshape(pix.height, pix.width, 3).astype(np.int16)
+    chroma = rgb.max(axis=2) - rgb.min(axis=2)
+    if np.count_nonzero(chroma > COLOR_TOLERANCE) > COLOR_FRACTION * chroma.size:
+        return "rgb"
+    gray = rgb.mean(axis=2)
+    midtones = np.count_nonzero((gray > MIDTONE_RANGE[0]) & (gray < MIDTONE_RANGE[1]))
+    return "gray" if midtones > GRAY_FRACTION * gray.size else "bilevel"
+
+
+def page_format(page, options):
+    """(chế độ màu, kiểu nén) dùng cho trang này."""
+    color, compression = options["color"], options["compression"]
+    if color != "auto":
+        return color, compression
+    color = classify_page(page)
+    if color == "bilevel":
+        return color, "group4"
+    # G4 chỉ áp cho trang đen trắng; trang màu/xám dùng nén không mất dữ liệu
+    return color, "deflate" if compression == "group4" else compression
+
+
+def render_image(page, dpi, color, threshold=128):
+    """Render trang thành ảnh PIL theo chế độ màu (đen trắng = xám rồi lấy ngưỡng)."""
+    if color == "rgb":
+        return pixmap_to_image(page.get_pixmap(dpi=dpi))
+    image = pixmap_to_image(page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False))
+    if color == "bilevel":
+        table = [0 if v < threshold else 255 for v in range(256)]
+        image = image.point(table, "1")
+    return image
+
+
+def save_params(compression, options):
+    """Tham số Image.save cho kiểu nén."""
+    params = {"format": "TIFF", "compression": COMPRESSIONS[compression][1]}
+    if compression == "jpeg":
+        params["quality"] = options["jpeg_quality"]
+    return params
+
+
+def write_page(page, dest, dpi, options, pipeline=None, page_number=None):
+    """
+    Render một trang và ghi TIFF vào dest (đường dẫn hoặc AppendingTiffWriter).
+    Có pipeline thì việc mã hoá và ghi được đưa cho luồng ghi; trang khổ lớn vẫn
+    ghi ngay theo dải (sau khi hàng đợi ghi xong, để giữ thứ tự trong TIFF nhiều trang).
+    Trả về (chế độ màu, có render theo dải hay không).
+    """
+    color, compression = page_format(page, options)
+    params = save_params(compression, options)
+    if is_large_page(page, dpi, color):
+        if isinstance(dest, str):
+            with open(dest, "wb") as f:
+                write_banded(page, f, dpi, color, compression, options["threshold"], params)
+        else:
+            if pipeline is not None:
+                pipeline.drain()
+            write_banded(page, dest, dpi, color, compression, options["threshold"], params)
+        return color, True
+    image = render_image(page, dpi, color, options["threshold"])
+    if pipeline is None:
+        image.save(dest, **params)
+    else:
+        pipeline.submit(lambda: image.save(dest, **params), image_bytes(image), page_number)
+    return color, False
+
+
+def _get_doc(pdf_path):
+    global _open_path, _open_doc
+    if _open_path != pdf_path:
+        if _open_doc is not None:
+            _open_doc.close()
+            _open_doc = None
+        _open_doc = fitz.open(pdf_path)
+        _open_path = pdf_path
+    return _open_doc
+
+
+def render_chunk(pdf_path, target_folder, first_number, start, end, dpi=DPI, options=None,
+                 writers=WRITER_THREADS, queue_bytes=QUEUE_BYTES):
+    """
+    Render trang [start, end) của pdf_path thành TIFF trong target_folder; writers luồng
+    ghi song song, ảnh chờ ghi không quá queue_bytes.
+    Chạy trong tiến trình con. Trả về (số trang đã ghi, lỗi hoặc "", Counter thống kê)
+    với Counter đếm số trang theo chế độ màu, số trang khổ lớn ("banded") và thời gian
+    của từng giai đoạn (xem WritePipeline.stats).
+    """
+    options = options or DEFAULT_OPTIONS
+    stats = Counter()
+    error = ""
+    pno = start
+    pipeline = WritePipeline(writers, queue_bytes)
+    try:
+        Path(target_folder).mkdir(parents=True, exist_ok=True)
+        doc = _get_doc(pdf_path)
+        for pno in range(start, end):
+            color, banded = write_page(doc[pno], str(Path(target_folder) / f"{first_number + pno:03d}.tiff"),
+                                       dpi, options, pipeline, pno + 1)
+            stats[color] += 1
+            stats["banded"] += banded
+    except WriteError:
+        pass
+    except Exception as e:
+        error = f"trang {pno + 1}: {e}"
+    finally:
+        pipeline.close()
+    stats.update(pipeline.stats())
+    return pipeline.pages + stats["banded"], pipeline.error or error, stats
+
+
+def render_multipage(pdf_path, out_path, dpi=DPI, options=None, queue_bytes=QUEUE_BYTES):
+    """
+    Render cả file pdf_path thành một TIFF nhiều trang out_path, nối từng trang ngay
+    khi render xong. Trang phải nối đúng thứ tự nên chỉ có một luồng ghi.
+    Ghi qua file .part rồi đổi tên để file dở dang không bị coi là xong.
+    Chạy trong tiến trình con. Trả về (số trang đã ghi, lỗi hoặc "", Counter thống kê).
+    """
+    options = options or DEFAULT_OPTIONS
+    stats = Counter()
+    error = ""
+    pno = 0
+    tmp_path = out_path + ".part"
+    pipeline = WritePipeline(1, queue_bytes)
+    try:
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        with fitz.open(pdf_path) as doc:
+            with TiffImagePlugin.AppendingTiffWriter(tmp_path, new=True) as tiff:
+                try:
+                    for pno in range(doc.page_count):
+                        color, banded = write_page(doc[pno], tiff, dpi, options, pipeline, pno + 1)
+                        pipeline.submit(tiff.newFrame)
+                        stats[color] += 1
+                        stats["banded"] += banded
+                finally:
+                    pipeline.close()  # ghi xong mọi trang trước khi đóng file
+        if not pipeline.error:
+            os.replace(tmp_path, out_path)
+    except WriteError:
+        pass
+    except Exception as e:
+        error = f"trang {pno + 1}: {e}"
+    finally:
+        pipeline.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    stats.update(pipeline.stats())
+    return pipeline.pages + stats["banded"], pipeline.error or error, stats
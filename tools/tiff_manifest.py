@@ -0,0 +1,126 @@
+"""
+Manifest chuyển đổi PDF -> TIFF, mỗi thư mục đầu ra một file MANIFEST_NAME.
+
+Ghi lại cho từng PDF nguồn (theo tên file): dung lượng, thời điểm sửa, số trang,
+khổ trang, số thứ tự ảnh đầu tiên và tuỳ chọn chuyển đổi. Lần chạy sau bỏ qua các
+file có mục khớp hoàn toàn và ảnh đầu ra vẫn còn; số trang và khổ trang trong
+manifest cũng được dùng lại để không phải mở lại file khi lập kế hoạch.
+
+Số thứ tự ảnh đánh liên tục qua các PDF trong một thư mục, nên khi một file phía
+trước đổi số trang thì first_number của các file sau đổi theo và chúng được
+chuyển lại - đánh số luôn nhất quán.
+"""
+import json
+import os
+import re
+import time
+
+MANIFEST_NAME = "tiff_manifest.json"
+MANIFEST_VERSION = 1
+SAVE_INTERVAL = 5.0  # giây giữa hai lần ghi manifest trong lúc chạy
+
+_PAGE_FILE_RE = re.compile(r"^\d+\.tiff$")
+
+
+def conversion_settings(dpi, options, output_mode):
+    """Các tuỳ chọn ảnh hưởng tới ảnh đầu ra; khác đi thì phải chuyển lại."""
+    return {"dpi": dpi, "output_mode": output_mode, **options}
+
+
+def source_stat(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def remove_page_files(folder):
+    """Xoá ảnh từng trang cũ (001.tiff...) trong thư mục đích trước khi chuyển lại."""
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if _PAGE_FILE_RE.match(name):
+            os.remove(os.path.join(folder, name))
+
+
+class ConversionManifest:
+    def __init__(self, folder):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("sources", {})
+        except (OSError, ValueError, AttributeError):
+            pass  # chưa có hoặc hỏng: coi như chưa chuyển file nào
+
+    def cached_layout(self, name, stat):
+        """(số trang, khổ trang) đã biết nếu file nguồn chưa đổi, ngược lại None."""
+        entry = self.entries.get(name)
+        if (entry and entry["size"] == stat["size"] and entry["mtime"] == stat["mtime"]
+                and "page_sizes" in entry):
+            return entry["pages"], entry["page_sizes"]
+        return None
+
+    def is_current(self, job, settings):
+        entry = self.entries.get(job["name"])
+        return (entry is not None
+                and entry["size"] == job["stat"]["size"]
+                and entry["mtime"] == job["stat"]["mtime"]
+                and entry["pages"] == job["page_count"]
+                and entry["first_number"] == job["first_number"]
+                and entry["settings"] == settings)
+
+    def record(self, job, settings):
+        self.entries[job["name"]] = {**job["stat"], "pages": job["page_count"],
+                                     "page_sizes": job["page_sizes"], "first_number": job["first_number"], "settings": settings}
+        self.dirty = True
+
+    def backfill_layout(self, job):
+        """Thêm khổ trang vào mục còn hợp lệ ghi trước khi manifest lưu page_sizes."""
+        entry = self.entries.get(job["name"])
+        if entry is not None and "page_sizes" not in entry:
+            entry["page_sizes"] = job["page_sizes"]
+            self.dirty = True
+
+    def forget(self, name):
+        if self.entries.pop(name, None) is not None:
+            self.dirty = True
+
+    def keep_only(self, names):
+        """Bỏ mục của các file nguồn không còn trong thư mục đầu vào."""
+        for name in set(self.entries) - set(names):
+            self.forget(name)
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "sources": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class ManifestSet:
+    """Các manifest của mọi thư mục đầu ra trong một lần chạy, nạp khi cần."""
+
+    def __init__(self):
+        self.manifests = {}
+        self._last_save = time.time()
+
+    def for_folder(self, folder):
+        folder = str(folder)
+        if folder not in self.manifests:
+            self.manifests[folder] = ConversionManifest(folder)
+        return self.manifests[folder]
+
+    def save_all(self):
+        for manifest in self.manifests.values():
+            manifest.save()
+        self._last_save = time.time()
+
+    def save_if_due(self):
+        if time.time() - self._last_save >= SAVE_INTERVAL:
+            self.save_all()
@@ -0,0 +1,118 @@
+"""
+Kiểm soát bộ nhớ khi render PDF -> TIFF song song.
+
+Trước khi giao một việc (lát trang hoặc cả file ở chế độ TIFF nhiều trang) cho
+tiến trình con, ước lượng bộ nhớ đỉnh của nó từ khổ trang và dpi - không cần
+render. MemoryAdmission chỉ nhận việc mới khi tổng bộ nhớ của các việc đang chạy
+còn dưới ngân sách; vài trang A0 trộn lẫn trong lô A4 vì thế không bị render
+cùng lúc tới mức hết RAM, còn lô A4 vẫn chạy đủ mọi tiến trình.
+
+Khổ trang được đọc một lần lúc lập kế hoạch (page_sizes) và lưu trong manifest,
+nên việc ước lượng không phải mở lại file PDF.
+
+Ngân sách mặc định là MEMORY_FRACTION bộ nhớ còn trống của máy (MemAvailable
+trong /proc/meminfo; trên Windows là GlobalMemoryStatusEx).
+"""
+import sys
+
+from tools.tiff_bands import BAND_BYTES, LARGE_PAGE_BYTES, size_bitmap_bytes
+
+MEMORY_FRACTION = 0.7                         # phần bộ nhớ còn trống dành cho việc render
+FALLBACK_BUDGET = 2 * 1024 * 1024 * 1024      # khi không đọc được bộ nhớ còn trống
+RENDER_COPIES = 2  # pixmap của MuPDF và ảnh PIL chép từ nó cùng tồn tại lúc dựng ảnh
+
+
+def available_memory():
+    """Bộ nhớ còn trống (byte), hoặc None nếu không xác định được."""
+    if sys.platform == "win32":
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024  # kB
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_memory_budget(fraction=MEMORY_FRACTION):
+    """Ngân sách bộ nhớ mặc định (byte) cho các việc render đang chạy."""
+    available = available_memory()
+    return int(available * fraction) if available else FALLBACK_BUDGET
+
+
+def page_sizes(doc):
+    """
+    Khổ trang (điểm) của tài liệu, gộp các trang liền nhau cùng khổ thành
+    [rộng, cao, số trang]. Đọc một lần khi lập kế hoạch và lưu trong manifest.
+    """
+    runs = []
+    for page in doc:
+        width, height = page.rect.width, page.rect.height
+        if runs and runs[-1][0] == width and runs[-1][1] == height:
+            runs[-1][2] += 1
+        else:
+            runs.append([width, height, 1])
+    return runs
+
+
+def page_memory(width, height, dpi, color):
+    """Ước lượng bộ nhớ đỉnh (byte) để render một trang khổ width x height điểm ở dpi."""
+    color = "rgb" if color == "auto" else color  # chưa phân loại thì tính trường hợp xấu nhất
+    image = size_bitmap_bytes(width, height, dpi, color)
+    if image > LARGE_PAGE_BYTES:
+        # render theo dải; trang đen trắng còn giữ ảnh 1 bit của cả trang
+        return BAND_BYTES * RENDER_COPIES + (image // 8 if color == "bilevel" else 0)
+    return image * RENDER_COPIES
+
+
+def sizes_page_memory(sizes, dpi, color):
+    """Bộ nhớ ước lượng của từng trang từ khổ trang đã ghi (page_sizes), không mở lại file."""
+    memory = []
+    for width, height, count in sizes:
+        memory.extend([page_memory(width, height, dpi, color)] * count)
+    return memory
+
+
+def task_memory(peak_page, writers):
+    """
+    (bộ nhớ giữ chỗ, dung lượng hàng đợi ghi) của một việc có trang lớn nhất cần
+    peak_page byte: một trang đang render cộng các ảnh chờ đủ cho mọi luồng ghi.
+    """
+    queue_bytes = peak_page // RENDER_COPIES * writers
+    return peak_page + queue_bytes, queue_bytes
+
+
+class MemoryAdmission:
+    """Cộng dồn bộ nhớ giữ chỗ của các việc đang chạy so với ngân sách."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.in_use = 0
+        self.peak = 0
+        self.deferred = 0  # số lần phải hoãn việc vì thiếu ngân sách
+
+    def can_admit(self, nbytes):
+        """Nhận nếu còn đủ ngân sách; khi không có việc nào chạy thì luôn nhận (việc lớn hơn ngân sách)."""
+        return not self.in_use or self.in_use + nbytes <= self.budget
+
+    def admit(self, nbytes):
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+
+    def release(self, nbytes):
+        self.in_use -= nbytes
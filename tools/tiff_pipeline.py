@@ -0,0 +1,149 @@
+"""
+Giai đoạn ghi của pipeline PDF -> TIFF.
+
+Trong mỗi tiến trình con, luồng chính chỉ render (MuPDF, phân loại màu, lấy
+ngưỡng) rồi đẩy ảnh vào hàng đợi; một nhóm luồng ghi lấy ra, mã hoá TIFF và ghi
+đĩa. Mã hoá của libtiff và ghi file nhả GIL, nên trang sau được render trong lúc
+trang trước đang ghi - trên ổ mạng chậm CPU không phải đứng chờ.
+
+Hàng đợi giới hạn theo dung lượng ảnh (byte) chứ không theo số trang: trang A4
+đen trắng và trang A0 màu chênh nhau hàng trăm lần, nên số trang chờ ghi tự điều
+chỉnh theo ngân sách bộ nhớ của việc (tools/tiff_memory.py). Hàng đợi rỗng thì
+luôn nhận một trang, để trang lớn hơn cả ngân sách không làm kẹt.
+
+WritePipeline đo thời gian bận của từng giai đoạn; stage_utilisation cho biết
+đang nghẽn ở render (CPU) hay ở ghi (đĩa/mạng).
+"""
+import threading
+import time
+from collections import Counter, deque
+
+WRITER_THREADS = 2                  # số luồng ghi mỗi tiến trình
+QUEUE_BYTES = 256 * 1024 * 1024     # dung lượng hàng đợi ghi mặc định
+
+# Tỷ lệ thời gian luồng render phải chờ hàng đợi ghi vượt mức này thì coi là nghẽn ở ghi
+IO_BOUND_WAIT = 0.2
+
+# Byte mỗi điểm ảnh theo chế độ ảnh PIL
+_BYTES_PER_PIXEL = {"1": 1 / 8, "L": 1, "RGB": 3, "RGBA": 4}
+
+
+class WriteError(Exception):
+    """Lỗi của một việc ghi, thông điệp đã kèm số trang."""
+
+
+def image_bytes(image):
+    return int(image.width * image.height * _BYTES_PER_PIXEL.get(image.mode, 4))
+
+
+def stage_utilisation(stats):
+    """(% bận của render, % bận của luồng ghi, giai đoạn nghẽn) từ thống kê cộng dồn."""
+    wall = stats["wall_s"]
+    if not wall:
+        return 0.0, 0.0, ""
+    render = 100 * stats["render_s"] / wall
+    write = 100 * stats["write_s"] / max(stats["writer_slots_s"], 1e-9)
+    bound = "ghi (đĩa/mạng)" if stats["wait_s"] > IO_BOUND_WAIT * wall else "render (CPU)"
+    return render, write, bound
+
+
+class WritePipeline:
+    """
+    Hàng đợi ghi giới hạn theo byte cùng writers luồng ghi. Việc ghi là hàm không
+    đối số; với một luồng ghi các việc chạy đúng thứ tự đưa vào (TIFF nhiều trang).
+    Luôn gọi close() khi xong (an toàn khi gọi nhiều lần).
+    """
+
+    def __init__(self, writers=WRITER_THREADS, budget_bytes=QUEUE_BYTES):
+        self.writers = max(1, writers)
+        self.budget = budget_bytes
+        self.items = deque()
+        self.queued_bytes = 0  # ảnh đang chờ hoặc đang ghi
+        self.active = 0
+        self.closed = False
+        self.error = ""
+        self.pages = 0         # số trang đã ghi xong
+        self.wait_s = 0.0      # luồng render chờ hàng đợi
+        self.write_s = 0.0     # tổng thời gian bận của các luồng ghi
+        self.render_end = None
+        self.end = None
+        self.started = time.perf_counter()
+        self.cond = threading.Condition()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.writers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task, nbytes=0, page=None):
+        """Đưa việc ghi vào hàng đợi, chờ nếu đã đầy ngân sách. Ném WriteError nếu đã có việc ghi lỗi."""
+        start = time.perf_counter()
+        with self.cond:
+            while not self.error and self.queued_bytes and self.queued_bytes + nbytes > self.budget:
+                self.cond.wait()
+            self.wait_s += time.perf_counter() - start
+            if self.error:
+                raise WriteError(self.error)
+            self.items.append((task, nbytes, page))
+            self.queued_bytes += nbytes
+            self.cond.notify_all()
+
+    def drain(self):
+        """Chờ mọi việc đã đưa vào ghi xong."""
+        start = time.perf_counter()
+        with self.cond:
+            while not self.error and (self.items or self.active):
+                self.cond.wait()
+            self.wait_s += time.perf_counter() - start
+            if self.error:
+                raise WriteError(self.error)
+
+    def close(self):
+        """Ghi nốt hàng đợi rồi dừng các luồng ghi. Lỗi ghi (nếu có) nằm ở self.error."""
+        if self.end is not None:
+            return
+        self.render_end = time.perf_counter()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.end = time.perf_counter()
+
+    def stats(self):
+        """Thống kê thời gian (giây) để cộng dồn vào Counter của lần chạy."""
+        self.close()
+        wall = self.end - self.started
+        return Counter({
+            "render_s": max(0.0, self.render_end - self.started - self.wait_s),
+            "wait_s": self.wait_s,
+            "write_s": self.write_s,
+            "wall_s": wall,
+            "writer_slots_s": wall * self.writers,
+        })
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.items and not self.closed:
+                    self.cond.wait()
+                if not self.items:
+                    return
+                task, nbytes, page = self.items.popleft()
+                self.active += 1
+                skip = bool(self.error)
+            start = time.perf_counter()
+            error = ""
+            if not skip:  # sau lỗi đầu tiên chỉ bỏ hàng đợi cho luồng render dừng
+                try:
+                    task()
+                except Exception as e:
+                    error = f"trang {page}: {e}" if page else str(e)
+            with self.cond:
+                self.write_s += time.perf_counter() - start
+                self.active -= 1
+                self.queued_bytes -= nbytes
+                if error and not self.error:
+                    self.error = error
+                elif not error and not skip and page:
+                    self.pages += 1
+                del task
+                self.cond.notify_all()
@@ -0,0 +1,86 @@
+"""
+Biểu thức khoảng trang dùng chung cho các công cụ PDF.
+
+Cú pháp (số trang đánh số từ 1, không phân biệt hoa thường):
+- "1-3,4-end"  : các khoảng cách nhau bằng dấu phẩy; "end" là trang cuối
+- "5"          : một trang
+- "7-"         : từ trang 7 tới hết
+- "every 2" hoặc "mỗi 2": cứ 2 trang một phần
+
+Biểu thức được phân tích một lần thành spec (tuple, pickle được để gửi sang
+tiến trình con), sau đó resolve_ranges áp vào số trang thực của từng file.
+"""
+import re
+
+END = None  # đánh dấu "tới trang cuối" trong spec
+
+_EVERY_RE = re.compile(r"^(?:every|mỗi)\s+(\d+)(?:\s*(?:pages?|trang))?$")
+_RANGE_RE = re.compile(r"^(\d+|end)?\s*(-)?\s*(\d+|end)?$")
+
+
+def _page_number(token):
+    if token == "end":
+        return END
+    value = int(token)
+    if value < 1:
+        raise ValueError("Số trang phải từ 1 trở lên")
+    return value - 1
+
+
+def parse_expression(expr):
+    """
+    Phân tích biểu thức thành spec:
+    ("every", n) hoặc ("list", ((start, end), ...)) với start/end đánh số từ 0,
+    end có thể là END. Ném ValueError nếu sai cú pháp.
+    """
+    text = expr.strip().lower()
+    if not text:
+        raise ValueError("Biểu thức khoảng trang trống")
+
+    match = _EVERY_RE.match(text)
+    if match:
+        step = int(match.group(1))
+        if step < 1:
+            raise ValueError("Số trang mỗi phần phải từ 1 trở lên")
+        return ("every", step)
+
+    ranges = []
+    for token in text.split(","):
+        token = token.strip()
+        match = _RANGE_RE.match(token)
+        if not token or not match or not (match.group(1) or match.group(3)):
+            raise ValueError(f"Khoảng trang không hợp lệ: '{token}'")
+        first, dash, last = match.groups()
+        if first and last and not dash:  # "1 2": hai số không có dấu gạch
+            raise ValueError(f"Khoảng trang không hợp lệ: '{token}'")
+        if dash:
+            start = _page_number(first) if first else 0
+            end = _page_number(last) if last else END
+        else:
+            start = end = _page_number(first or last)
+        if start is END:
+            if end is not END:
+                raise ValueError(f"Khoảng trang không hợp lệ: '{token}'")
+        elif end is not END and start > end:
+            raise ValueError(f"Trang bắt đầu lớn hơn trang kết thúc: '{token}'")
+        ranges.append((start, end))
+    return ("list", tuple(ranges))
+
+
+def resolve_ranges(spec, page_count):
+    """
+    Áp spec vào tài liệu có page_count trang. Trả về [(start, end)] đánh số từ 0.
+    Khoảng nằm hẳn ngoài tài liệu bị bỏ, khoảng vượt cuối tài liệu bị cắt bớt.
+    """
+    kind, value = spec
+    if kind == "every":
+        return [(s, min(s + value, page_count) - 1) for s in range(0, page_count, value)]
+
+    last_page = page_count - 1
+    result = []
+    for start, end in value:
+        start = last_page if start is END else start
+        end = last_page if end is END else min(end, last_page)
+        if 0 <= start <= end:
+            result.append((start, end))
+    return result